@@ -0,0 +1,116 @@
+"""
+Кэш аннотаций Gemini Vision на диске (SQLite).
+
+Ключ - (вид, SHA-256 содержимого, модель, версия промпта): картинка или схема
+draw.io с теми же байтами при повторной синхронизации Confluence не
+отправляется в Gemini - ни времени, ни расхода API. Контекст страницы в ключ
+не входит: одна и та же картинка на разных страницах описывается один раз.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# БД рядом с confluence_docs/ (kb_billing/), переживает пересинхронизацию JSON
+DEFAULT_PATH = Path(__file__).resolve().parent.parent / "vision_annotation_cache.db"
+
+
+def content_key(data: Union[bytes, str]) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+class AnnotationCache:
+    """Кэш аннотаций: одно подключение SQLite на процесс, доступ под блокировкой"""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path is not None else DEFAULT_PATH
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS annotations (
+                kind TEXT NOT NULL,
+                content_sha256 TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                text TEXT NOT NULL,
+                created REAL NOT NULL,
+                PRIMARY KEY (kind, content_sha256, model, prompt_version)
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, kind: str, data: Union[bytes, str], model: str, prompt_version: str) -> Optional[str]:
+        """Сохраненная аннотация или None"""
+        key = content_key(data)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text FROM annotations WHERE kind = ? AND content_sha256 = ? AND model = ? AND prompt_version = ?",
+                (kind, key, model, prompt_version),
+            ).fetchone()
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return row[0] if row else None
+
+    def put(self, kind: str, data: Union[bytes, str], model: str, prompt_version: str, text: str) -> None:
+        """Сохранить аннотацию (только успешные ответы Gemini)"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO annotations (kind, content_sha256, model, prompt_version, text, created) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, content_key(data), model, prompt_version, text, time.time()),
+            )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        """Счетчики hit/miss процесса и число записей в кэше"""
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM annotations").fetchone()
+            total = self.hits + self.misses
+            return {
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM annotations")
+            self._conn.commit()
+            self.hits = self.misses = 0
+
+
+_cache: Optional[AnnotationCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_annotation_cache() -> Optional[AnnotationCache]:
+    """Общий кэш процесса (VISION_CACHE_PATH).
+    VISION_CACHE=0 - кэш выключен (None); при ошибке открытия БД - тоже None."""
+    global _cache
+    if os.getenv("VISION_CACHE", "1").strip().lower() in ("0", "false", "no", "off"):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            path = os.getenv("VISION_CACHE_PATH") or None
+            try:
+                _cache = AnnotationCache(path)
+            except Exception as exc:
+                logger.warning("Кэш аннотаций Vision недоступен (%s), аннотации без кэша", exc)
+                return None
+        return _cache
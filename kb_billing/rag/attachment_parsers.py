@@ -5,17 +5,29 @@
 - Draw.io: из формата извлекается структура, описание и смысловые блоки — через Gemini.
 - Изображения: только Gemini Vision (описание и смысловые блоки).
 - DOCX: извлечение текста как прежде.
+Содержимое вложения — bytes или memoryview (скачанный во временный файл без копии, см. AttachmentSpool.view).
 """
 import base64
+import hashlib
 import io
 import logging
+import math
+import multiprocessing
+import os
 import re
+import tempfile
+import threading
 import zlib
 import xml.etree.ElementTree as ET
-from typing import Optional, Tuple
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 logger = logging.getLogger(__name__)
 
+BytesLike = Union[bytes, memoryview]
+
 # Расширения и MIME для выбора парсера
 PDF_EXT = (".pdf",)
 PDF_MIME = ("application/pdf",)
@@ -34,6 +46,16 @@ DRAWIO_EXT = (".drawio", ".drawio.xml", ".xml")
 IMAGE_EXT = (".png", ".jpg", ".jpeg", ".gif", ".bmp", ".tiff", ".tif", ".webp")
 IMAGE_MIME = ("image/png", "image/jpeg", "image/gif", "image/bmp", "image/tiff", "image/webp")
 
+# PDF: процессов для извлечения текста и страниц на одну задачу пула
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PAGES_PER_TASK = 16
+# Изображения PDF меньше порога (сторона в пикселях, размер в байтах, энтропия в битах) в Vision не отправляются
+PDF_IMAGE_MIN_SIDE = int(os.getenv("PDF_IMAGE_MIN_SIDE", "48"))
+PDF_IMAGE_MIN_BYTES = int(os.getenv("PDF_IMAGE_MIN_BYTES", "2048"))
+PDF_IMAGE_MIN_ENTROPY = float(os.getenv("PDF_IMAGE_MIN_ENTROPY", "1.0"))
+# Одновременных вызовов Gemini Vision на один PDF
+VISION_MAX_CONCURRENCY = int(os.getenv("VISION_MAX_CONCURRENCY", "4"))
+
 
 def _normalize_ext(filename: str) -> str:
     if not filename:
@@ -42,52 +64,202 @@ def _normalize_ext(filename: str) -> str:
     return filename[p:].lower() if p >= 0 else ""
 
 
+def _pdf_pages(source: Union[str, BytesLike], start: int, end: int) -> List[Tuple[str, List[Tuple[int, int, int]]]]:
+    """
+    Текст страниц [start, end) и изображения на них: [(текст, [(xref, ширина, высота), ...]), ...].
+    source — путь к временному файлу (в процессе пула) или содержимое PDF (в этом процессе — под _fitz_lock).
+    """
+    import fitz  # PyMuPDF
+
+    if isinstance(source, str):
+        doc = fitz.open(source, filetype="pdf")
+    else:
+        doc = fitz.open(stream=source, filetype="pdf")
+    try:
+        result = []
+        for page_num in range(start, min(end, len(doc))):
+            page = doc[page_num]
+            images = [
+                (img[0], img[2], img[3])
+                for img in page.get_images(full=True)
+                if isinstance(img, (list, tuple))
+            ]
+            result.append((page.get_text().strip(), images))
+        return result
+    finally:
+        doc.close()
+
+
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+_pdf_pool_lock = threading.Lock()
+# PyMuPDF не потокобезопасен: вызовы fitz в этом процессе (потоки парсинга вложений) — по одному.
+# Ожидание пула процессов и вызовы Vision идут без блокировки.
+_fitz_lock = threading.Lock()
+
+
+def _pdf_mp_context() -> multiprocessing.context.BaseContext:
+    """
+    Без fork: пул создаётся из потоков обхода Confluence и из Streamlit, fork многопоточного процесса
+    (httpx, sqlite, logging) может зависнуть. forkserver с предзагрузкой этого модуля — процессы
+    пула не импортируют пакет заново; где forkserver нет — spawn.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload([__name__])
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+def _get_pdf_pool() -> Optional[ProcessPoolExecutor]:
+    """Общий пул процессов для текста PDF (PDF_WORKERS, 0/1 — без пула)."""
+    global _pdf_pool
+    if PDF_WORKERS <= 1:
+        return None
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=_pdf_mp_context())
+        return _pdf_pool
+
+
+def _reset_pdf_pool(pool: ProcessPoolExecutor) -> None:
+    """Сломанный пул (процесс пула упал) — следующий вызов _get_pdf_pool создаст новый."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is pool:
+            _pdf_pool = None
+    pool.shutdown(wait=False)
+
+
+def _extract_pdf_pages(data: BytesLike, page_count: int) -> List[Tuple[str, List[Tuple[int, int, int]]]]:
+    """Текст и изображения всех страниц: диапазонами по PDF_PAGES_PER_TASK страниц в пуле процессов."""
+    pool = _get_pdf_pool() if page_count > PDF_PAGES_PER_TASK else None
+    if pool is not None:
+        # PDF пишется во временный файл один раз, задачам передаётся путь, а не копия содержимого
+        path = None
+        try:
+            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+                path = f.name
+                f.write(data)
+            futures = [
+                pool.submit(_pdf_pages, path, start, start + PDF_PAGES_PER_TASK)
+                for start in range(0, page_count, PDF_PAGES_PER_TASK)
+            ]
+            return [page for future in futures for page in future.result()]
+        except BrokenProcessPool as e:
+            logger.warning("Пул процессов PDF сломан (%s), пересоздаётся; страницы обрабатываются последовательно", e)
+            _reset_pdf_pool(pool)
+        except Exception as e:
+            logger.warning("Пул процессов PDF недоступен (%s), страницы обрабатываются последовательно", e)
+        finally:
+            if path:
+                os.unlink(path)
+    with _fitz_lock:
+        return _pdf_pages(data, 0, page_count)
+
+
+def _byte_entropy(samples: bytes) -> float:
+    """Энтропия Шеннона (бит) значений пикселей; заливка/пустая картинка ≈ 0."""
+    if not samples:
+        return 0.0
+    step = max(1, len(samples) // 65536)
+    counts = Counter(samples[::step])
+    total = sum(counts.values())
+    return -sum(c / total * math.log2(c / total) for c in counts.values())
+
+
+def _pdf_images_to_annotate(doc, pages: List[Tuple[str, List[Tuple[int, int, int]]]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Уникальные изображения PDF для Vision: дедупликация по xref и по SHA-256 байтов,
+    без мелких (PDF_IMAGE_MIN_SIDE, PDF_IMAGE_MIN_BYTES) и однотонных (PDF_IMAGE_MIN_ENTROPY).
+    Возвращает {sha256: {"bytes", "mime", "pages": [номера страниц с 1]}} в порядке первого появления.
+    """
+    import fitz  # PyMuPDF
+
+    unique: Dict[str, Dict[str, Any]] = {}
+    by_xref: Dict[int, Optional[str]] = {}
+    for page_num, (_, images) in enumerate(pages, start=1):
+        for xref, width, height in images:
+            if xref not in by_xref:
+                by_xref[xref] = None
+                if width < PDF_IMAGE_MIN_SIDE or height < PDF_IMAGE_MIN_SIDE:
+                    continue
+                try:
+                    img_info = doc.extract_image(xref)
+                    img_bytes = img_info.get("image")
+                    if not img_bytes or len(img_bytes) < PDF_IMAGE_MIN_BYTES:
+                        continue
+                    if _byte_entropy(fitz.Pixmap(doc, xref).samples) < PDF_IMAGE_MIN_ENTROPY:
+                        continue
+                except Exception as e:
+                    logger.debug("Извлечение изображения из PDF: %s", e)
+                    continue
+                key = hashlib.sha256(img_bytes).hexdigest()
+                by_xref[xref] = key
+                if key not in unique:
+                    ext = (img_info.get("ext") or "png").lower()
+                    mime = "image/png" if ext == "png" else "image/jpeg"
+                    if ext == "webp":
+                        mime = "image/webp"
+                    unique[key] = {"bytes": img_bytes, "mime": mime, "pages": []}
+            key = by_xref[xref]
+            if key and page_num not in unique[key]["pages"]:
+                unique[key]["pages"].append(page_num)
+    return unique
+
+
 def extract_text_from_pdf(
-    data: bytes,
+    data: BytesLike,
     filename: str = "",
     context_text: Optional[str] = None,
 ) -> Tuple[str, Optional[str]]:
     """
     PDF: извлечь текст страниц и картинки. Картинки описываются через Gemini Vision;
     текст страниц остаётся как есть.
+    Текст страниц извлекается параллельно (пул процессов по диапазонам страниц); каждое уникальное
+    изображение описывается один раз (логотип на всех страницах — один вызов Vision), мелкие и
+    однотонные пропускаются, вызовы Vision идут параллельно (не более VISION_MAX_CONCURRENCY).
     """
     try:
         import fitz  # PyMuPDF
     except ImportError:
         return "", "PyMuPDF не установлен: pip install pymupdf"
     try:
-        doc = fitz.open(stream=data, filetype="pdf")
-        parts: list = []
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            page_text = page.get_text().strip()
-            if page_text:
-                parts.append("Стр. %s:\n%s" % (page_num + 1, page_text))
-            # Картинки на странице — описание через Gemini Vision
+        with _fitz_lock:
+            doc = fitz.open(stream=data, filetype="pdf")
+            page_count = len(doc)
+        try:
+            pages = _extract_pdf_pages(data, page_count)
+            descriptions: Dict[int, List[str]] = {}
             try:
                 from kb_billing.rag.vision_annotation import describe_image, is_vision_available
                 if is_vision_available():
-                    for xref in page.get_images():
-                        if not isinstance(xref, (list, tuple)):
+                    with _fitz_lock:
+                        images = _pdf_images_to_annotate(doc, pages)
+
+                    def annotate(image: Dict[str, Any]) -> Optional[str]:
+                        ctx = (context_text or "") + " PDF: %s, стр. %s" % (filename or "?", image["pages"][0])
+                        return describe_image(image["bytes"], mime_type=image["mime"], context_text=ctx.strip())
+
+                    with ThreadPoolExecutor(VISION_MAX_CONCURRENCY, thread_name_prefix="pdf-vision") as pool:
+                        annotated = list(zip(images.values(), pool.map(annotate, images.values())))
+                    for image, desc in annotated:
+                        if not desc:
                             continue
-                        img_xref = xref[0]
-                        try:
-                            img_info = doc.extract_image(img_xref)
-                            img_bytes = img_info.get("image")
-                            ext = (img_info.get("ext") or "png").lower()
-                            mime = "image/png" if ext == "png" else "image/jpeg"
-                            if ext == "webp":
-                                mime = "image/webp"
-                            if img_bytes:
-                                ctx = (context_text or "") + " PDF: %s, стр. %s" % (filename or "?", page_num + 1)
-                                desc = describe_image(img_bytes, mime_type=mime, context_text=ctx.strip())
-                                if desc:
-                                    parts.append("Изображение на стр. %s:\n%s" % (page_num + 1, desc))
-                        except Exception as e:
-                            logger.debug("Извлечение изображения из PDF: %s", e)
+                        first, *others = image["pages"]
+                        header = "Изображение на стр. %s" % first
+                        if others:
+                            header += " (повторяется ещё на %s стр.)" % len(others)
+                        descriptions.setdefault(first, []).append("%s:\n%s" % (header, desc))
             except Exception as e:
                 logger.warning("Vision для PDF-изображений не удался: %s", e)
-        doc.close()
+        finally:
+            with _fitz_lock:
+                doc.close()
+        parts: list = []
+        for page_num, (page_text, _) in enumerate(pages, start=1):
+            if page_text:
+                parts.append("Стр. %s:\n%s" % (page_num, page_text))
+            parts.extend(descriptions.get(page_num, []))
         text = "\n\n".join(parts) if parts else "(документ без текста и без описанных изображений)"
         return text.strip(), None
     except Exception as e:
@@ -95,7 +267,7 @@ def extract_text_from_pdf(
         return "", str(e)
 
 
-def extract_text_from_xls(data: bytes, filename: str = "") -> Tuple[str, Optional[str]]:
+def extract_text_from_xls(data: BytesLike, filename: str = "") -> Tuple[str, Optional[str]]:
     """
     Извлечь текст из XLS (Excel 97–2003): названия листов и содержимое ячеек.
     Для контекста в KB — списки устройств, конфигурации, таблицы.
@@ -105,7 +277,7 @@ def extract_text_from_xls(data: bytes, filename: str = "") -> Tuple[str, Optiona
     except ImportError:
         return "", "xlrd не установлен: pip install xlrd"
     try:
-        book = xlrd.open_workbook(file_contents=data)
+        book = xlrd.open_workbook(file_contents=bytes(data))
     except Exception as e:
         logger.warning("XLS open %s: %s", filename or "?", e)
         return "", str(e)
@@ -146,7 +318,7 @@ def extract_text_from_xls(data: bytes, filename: str = "") -> Tuple[str, Optiona
     return text, None
 
 
-def extract_text_from_xlsx(data: bytes, filename: str = "") -> Tuple[str, Optional[str]]:
+def extract_text_from_xlsx(data: BytesLike, filename: str = "") -> Tuple[str, Optional[str]]:
     """
     Извлечь текст из XLSX (Excel 2007+). Аналогично XLS — листы и ячейки для контекста KB.
     """
@@ -181,7 +353,7 @@ def extract_text_from_xlsx(data: bytes, filename: str = "") -> Tuple[str, Option
     return text, None
 
 
-def extract_text_from_docx(data: bytes, filename: str = "") -> Tuple[str, Optional[str]]:
+def extract_text_from_docx(data: BytesLike, filename: str = "") -> Tuple[str, Optional[str]]:
     """
     Извлечь текст из DOCX. Возвращает (plain_text, error_message).
     """
@@ -228,7 +400,7 @@ def _drawio_decompress(diagram_content: str) -> Optional[str]:
 
 
 def extract_text_from_drawio(
-    data: bytes,
+    data: BytesLike,
     filename: str = "",
     context_text: Optional[str] = None,
 ) -> Tuple[str, Optional[str]]:
@@ -237,7 +409,7 @@ def extract_text_from_drawio(
     Если Gemini недоступен — возвращается сырой извлечённый текст.
     """
     try:
-        text = data.decode("utf-8", errors="replace")
+        text = str(data, "utf-8", errors="replace")
     except Exception as e:
         return "", f"Ошибка декодирования: {e}"
     text = text.strip()
@@ -313,7 +485,7 @@ def extract_text_from_drawio(
     return raw_text, None
 
 
-def _mime_for_image(filename: str, data: bytes) -> str:
+def _mime_for_image(filename: str, data: BytesLike) -> str:
     """Определить MIME по имени или по magic bytes."""
     ext = (filename or "").lower()
     if ext.endswith(".png"):
@@ -336,7 +508,7 @@ def _mime_for_image(filename: str, data: bytes) -> str:
 
 
 def extract_text_from_image(
-    data: bytes,
+    data: BytesLike,
     filename: str = "",
     context_text: Optional[str] = None,
 ) -> Tuple[str, Optional[str]]:
@@ -364,7 +536,7 @@ def extract_text_from_image(
 
 
 def parse_attachment(
-    data: bytes,
+    data: BytesLike,
     filename: str,
     content_type: Optional[str] = None,
     *,
@@ -394,7 +566,7 @@ def parse_attachment(
     if (not ext or ext == ".xml") and (
         "xml" in ct or "octet-stream" in ct or not ct
     ):
-        peek = (data[: 2048] if len(data) > 2048 else data).decode("utf-8", errors="ignore")
+        peek = bytes(data[:2048]).decode("utf-8", errors="ignore")
         if "<mxfile" in peek or "<mxGraphModel" in peek or (peek.lstrip().startswith("<?xml") and "mxfile" in peek):
             return extract_text_from_drawio(data, filename, context_text=context_text)
     if ext in IMAGE_EXT or (ct and ct.startswith("image/")):
@@ -406,12 +578,12 @@ def parse_attachment(
     # Текстовые типы — как есть (если в будущем добавим)
     if ct.startswith("text/"):
         try:
-            return data.decode("utf-8", errors="replace").strip(), None
+            return str(data, "utf-8", errors="replace").strip(), None
         except Exception:
             pass
     # Последняя попытка: по содержимому draw.io без расширения и без подходящего mediaType
     if len(data) >= 50:
-        peek = (data[: 2048] if len(data) > 2048 else data).decode("utf-8", errors="ignore")
+        peek = bytes(data[:2048]).decode("utf-8", errors="ignore")
         if "<mxfile" in peek or "<mxGraphModel" in peek:
             return extract_text_from_drawio(data, filename, context_text=context_text)
     return "", f"Неподдерживаемый тип вложения: {filename} ({content_type or '?'})"
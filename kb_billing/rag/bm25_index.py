@@ -0,0 +1,157 @@
+"""
+BM25-индекс KB в памяти процесса и слияние с векторным поиском (RRF).
+
+Векторный поиск плохо находит точные идентификаторы (BM_INVOICE_ITEM, коды
+тарифов, SUB-...). Индекс строится одним scroll по всем точкам коллекции
+(Q/A примеры, таблицы, представления, Confluence) и перечитывается вместе
+с индексом таблиц (table_index.invalidate() после загрузки KB, TTL).
+"""
+from __future__ import annotations
+
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from kb_billing.rag import table_index
+
+logger = logging.getLogger(__name__)
+
+# Идентификаторы целиком (bm_invoice_item, sub-1234) и их части
+_TOKEN_RE = re.compile(r"[0-9a-zа-яё]+(?:[_\-.][0-9a-zа-яё]+)*")
+_PART_RE = re.compile(r"[0-9a-zа-яё]+")
+
+RRF_K = 60
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in _TOKEN_RE.findall((text or "").lower()):
+        tokens.append(token)
+        parts = _PART_RE.findall(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+def document_text(payload: Dict[str, Any]) -> str:
+    """Текст точки для BM25 (вопрос + SQL, имя таблицы + документация, заголовки + текст Confluence)."""
+    fields = ("question", "sql", "table_name", "view_name", "title", "section_title", "content")
+    if payload.get("type") == "qa_example":
+        # content примера = вопрос + SQL
+        fields = ("question", "sql", "category")
+    return "\n".join(str(payload.get(f) or "") for f in fields)
+
+
+class BM25Index:
+    """Okapi BM25 по payload точек коллекции (postings: термин -> [(номер документа, tf)])"""
+
+    def __init__(self, client, collection_name: str, ttl: int = table_index.TABLE_INDEX_TTL,
+                 k1: float = 1.5, b: float = 0.75):
+        self.client = client
+        self.collection_name = collection_name
+        self.ttl = ttl
+        self.k1 = k1
+        self.b = b
+        # (документы, postings, нормировки длины) - заменяется целиком, поиск читает один снимок
+        self._state: Optional[Tuple[list, dict, list]] = None
+        self._loaded_at = 0.0
+        self._generation = -1
+        self._lock = threading.Lock()
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._state is not None
+            and self._generation == table_index.generation()
+            and time.monotonic() - self._loaded_at < self.ttl
+        )
+
+    def _scroll_all(self) -> Iterable[Any]:
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=1000,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False,
+            )
+            yield from points
+            if offset is None:
+                return
+
+    def build(self, points: Iterable[Tuple[Any, Dict[str, Any]]], generation: Optional[int] = None) -> None:
+        """Построить индекс по (id, payload); generation - поколение KB на момент чтения точек."""
+        docs, lengths = [], []
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        for point_id, payload in points:
+            tokens = tokenize(document_text(payload))
+            idx = len(docs)
+            docs.append((point_id, payload))
+            lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings[term].append((idx, tf))
+        avg_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+        # k1 * (1 - b + b * |d| / avgdl) для каждого документа - считается один раз
+        norms = [self.k1 * (1 - self.b + self.b * length / (avg_length or 1)) for length in lengths]
+        self._state = (docs, dict(postings), norms)
+        self._generation = table_index.generation() if generation is None else generation
+        self._loaded_at = time.monotonic()
+
+    def _ensure_loaded(self) -> None:
+        if self._is_fresh():
+            return
+        with self._lock:
+            if self._is_fresh():
+                return
+            generation = table_index.generation()
+            started = time.perf_counter()
+            self.build(((p.id, p.payload or {}) for p in self._scroll_all()), generation)
+            logger.info(
+                "BM25-индекс KB: %s документов, %s терминов за %.2f с",
+                len(self._state[0]), len(self._state[1]), time.perf_counter() - started
+            )
+
+    def search(
+        self,
+        query: str,
+        limit: int,
+        types: Optional[Sequence[str]] = None,
+        match: Optional[Dict[str, Any]] = None,
+    ) -> List[Tuple[Any, Dict[str, Any], float]]:
+        """Лучшие документы по BM25: [(id, payload, score)]. types/match - те же ограничения, что у фильтра Qdrant."""
+        self._ensure_loaded()
+        docs, all_postings, norms = self._state
+        n = len(docs)
+        k1_plus_1 = self.k1 + 1
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = all_postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for idx, tf in postings:
+                scores[idx] += idf * tf * k1_plus_1 / (tf + norms[idx])
+        results = []
+        for idx, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+            point_id, payload = docs[idx]
+            if types and payload.get("type") not in types:
+                continue
+            if match and any(str(payload.get(k)) != str(v) for k, v in match.items()):
+                continue
+            results.append((point_id, payload, score))
+            if len(results) >= limit:
+                break
+        return results
+
+
+def rrf_fuse(rankings: Sequence[Sequence[Any]], k: int = RRF_K) -> List[Tuple[Any, float]]:
+    """Reciprocal Rank Fusion: score(id) = сумма 1 / (k + ранг) по всем спискам (ранг с 1)."""
+    scores: Dict[Any, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, point_id in enumerate(ranking, 1):
+            scores[point_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
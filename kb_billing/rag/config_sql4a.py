@@ -61,9 +61,15 @@ class SQL4AConfig:
     # ========== Настройки поиска (как в sql4A) ==========
     DEFAULT_SEARCH_LIMIT = int(os.getenv("DEFAULT_SEARCH_LIMIT", "5"))
     SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.7"))
+    # Поиск по KB: "vector" - только вектор, "hybrid" - вектор + BM25 (слияние RRF).
+    # В hybrid порядок - по рангу RRF, у найденных только BM25 similarity = 0.0; включать после
+    # сравнения режимов бенчмарком (retrieval_benchmark) и проверки порогов по similarity
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector")
     
     # ========== Настройки генерации эмбеддингов (как в sql4A) ==========
     BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+    # Процессов для эмбеддингов при загрузке KB (0/1 - в текущем процессе)
+    EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "0"))
     NORMALIZE_EMBEDDINGS = True  # Как в sql4A
     
     # ========== Пути к KB ==========
@@ -109,6 +115,9 @@ class SQL4AConfig:
         cls.ORACLE_SERVICE = os.getenv("ORACLE_SERVICE") or os.getenv("ORACLE_SID", cls.ORACLE_SERVICE)
         cls.ORACLE_SCHEMA = os.getenv("ORACLE_SCHEMA", cls.ORACLE_SCHEMA)
         cls.EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", cls.EMBEDDING_MODEL)
+        cls.RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", cls.RETRIEVAL_MODE)
+        cls.BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", str(cls.BATCH_SIZE)))
+        cls.EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", str(cls.EMBEDDING_WORKERS)))
     
     @classmethod
     def get_config_summary(cls) -> dict:
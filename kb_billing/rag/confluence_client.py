@@ -4,32 +4,154 @@
 Используется для интеграции docs.steccom.ru и других Confluence в базу знаний биллинга/спутниковых систем.
 Аутентификация: Bearer (Personal Access Token).
 """
+import io
 import os
 import logging
+import mmap
+import threading
+import time
+from contextlib import contextmanager
+from tempfile import TemporaryFile
 from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
 
 import requests
 
 logger = logging.getLogger(__name__)
 
+# Вложение до этого размера скачивается в память, больше — во временный файл на диске
+ATTACHMENT_SPOOL_SIZE = 8 * 1024 * 1024
+_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class AttachmentTooLarge(Exception):
+    """Вложение больше лимита: скачивание прервано, не дочитав тело."""
+
+    def __init__(self, title: str, size: int, limit: int):
+        super().__init__(f"{title}: {size} байт > {limit}")
+        self.size = size
+        self.limit = limit
+
+
+class AttachmentSpool:
+    """
+    Скачанное вложение: в io.BytesIO, пока не больше max_size байт, дальше — во временном файле на диске.
+    Закрывается вызывающим (with spool: ...).
+    """
+
+    def __init__(self, max_size: Optional[int] = None):
+        self.max_size = ATTACHMENT_SPOOL_SIZE if max_size is None else max_size
+        self.size = 0
+        self._buffer: Optional[io.BytesIO] = io.BytesIO()
+        self._file = None
+
+    @property
+    def on_disk(self) -> bool:
+        return self._file is not None
+
+    def write(self, data: bytes) -> None:
+        if self._file is None and self.size + len(data) > self.max_size:
+            self._file = TemporaryFile()
+            self._file.write(self._buffer.getbuffer())
+            self._buffer.close()
+            self._buffer = None
+        (self._file or self._buffer).write(data)
+        self.size += len(data)
+
+    def read(self) -> bytes:
+        f = self._file or self._buffer
+        f.seek(0)
+        return f.read()
+
+    @contextmanager
+    def view(self) -> Iterator[memoryview]:
+        """
+        Содержимое без копии в bytes: буфер BytesIO или mmap временного файла.
+        Срезы view не должны жить дольше блока with.
+        """
+        if self._file is None:
+            view = self._buffer.getbuffer()
+            try:
+                yield view
+            finally:
+                view.release()
+            return
+        self._file.flush()
+        with mmap.mmap(self._file.fileno(), self.size, access=mmap.ACCESS_READ) as m:
+            view = memoryview(m)
+            try:
+                yield view
+            finally:
+                view.release()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        if self._buffer is not None:
+            self._buffer.close()
+
+    def __enter__(self) -> "AttachmentSpool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class HostRateLimiter:
+    """Не более max_per_second запросов в секунду к одному хосту (общий для всех потоков обхода)."""
+
+    def __init__(self, max_per_second: float = 0):
+        self.interval = 1.0 / max_per_second if max_per_second and max_per_second > 0 else 0.0
+        self._next: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str) -> None:
+        if not self.interval:
+            return
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, 0.0))
+            self._next[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
 
 class ConfluenceClient:
-    """Клиент к Confluence REST API (Bearer token)."""
+    """Клиент к Confluence REST API (Bearer token). Потокобезопасен: своя requests.Session на поток."""
 
     def __init__(
         self,
         base_url: Optional[str] = None,
         token: Optional[str] = None,
         timeout: int = 30,
+        max_requests_per_second: Optional[float] = None,
     ):
         self.base_url = (base_url or os.getenv("CONFLUENCE_URL", "")).rstrip("/")
         self.token = token or os.getenv("CONFLUENCE_TOKEN", "")
         self.timeout = timeout
-        self.session = requests.Session()
-        if self.token:
-            self.session.headers["Authorization"] = f"Bearer {self.token}"
-        self.session.headers.setdefault("Accept", "application/json")
-        self.session.headers.setdefault("Content-Type", "application/json")
+        if max_requests_per_second is None:
+            max_requests_per_second = float(os.getenv("CONFLUENCE_MAX_RPS", "10"))
+        self.rate_limiter = HostRateLimiter(max_requests_per_second)
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        """Сессия текущего потока (параллельный обход в ConfluenceKBGenerator)."""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            if self.token:
+                session.headers["Authorization"] = f"Bearer {self.token}"
+            session.headers.setdefault("Accept", "application/json")
+            session.headers.setdefault("Content-Type", "application/json")
+            self._local.session = session
+        return session
+
+    def _get(self, url: str, **kwargs) -> requests.Response:
+        """GET с ограничением частоты запросов к хосту (CONFLUENCE_MAX_RPS, 0 - без ограничения)."""
+        self.rate_limiter.wait(url)
+        return self.session.get(url, **kwargs)
 
     def _url(self, path: str) -> str:
         if path.startswith("/"):
@@ -48,7 +170,7 @@ class ConfluenceClient:
             return False, "CONFLUENCE_TOKEN не задан"
         try:
             # Запрос текущего пользователя или корневой страницы
-            r = self.session.get(
+            r = self._get(
                 f"{self.base_url}/rest/api/user/current",
                 timeout=self.timeout,
             )
@@ -69,7 +191,7 @@ class ConfluenceClient:
         result = []
         start = 0
         while True:
-            r = self.session.get(
+            r = self._get(
                 f"{self.base_url}/rest/api/space",
                 params={"limit": limit, "start": start},
                 timeout=self.timeout,
@@ -92,7 +214,7 @@ class ConfluenceClient:
         if not space_key:
             return None
         try:
-            r = self.session.get(
+            r = self._get(
                 f"{self.base_url}/rest/api/space/{space_key}",
                 timeout=self.timeout,
             )
@@ -118,7 +240,7 @@ class ConfluenceClient:
             return
         start = 0
         while True:
-            r = self.session.get(
+            r = self._get(
                 f"{self.base_url}/rest/api/content",
                 params={
                     "spaceKey": space_key,
@@ -155,14 +277,14 @@ class ConfluenceClient:
         while True:
             params = {"cql": cql, "limit": limit_per_page, "start": start, "expand": expand}
             # Пробуем endpoint search (Confluence Server/Cloud)
-            r = self.session.get(
+            r = self._get(
                 f"{self.base_url}/rest/api/content/search",
                 params=params,
                 timeout=self.timeout,
             )
             if r.status_code != 200:
                 # Fallback: часть серверов использует /rest/api/content с cql
-                r = self.session.get(
+                r = self._get(
                     f"{self.base_url}/rest/api/content",
                     params=params,
                     timeout=self.timeout,
@@ -188,7 +310,7 @@ class ConfluenceClient:
         result: List[str] = []
         start = 0
         while True:
-            r = self.session.get(
+            r = self._get(
                 f"{self.base_url}/rest/api/content/{page_id}/child/page",
                 params={"limit": min(limit, 50), "start": start},
                 timeout=self.timeout,
@@ -213,7 +335,7 @@ class ConfluenceClient:
         expand: str = "body.storage,version",
     ) -> Dict[str, Any]:
         """Получить страницу по ID с телом в формате storage."""
-        r = self.session.get(
+        r = self._get(
             f"{self.base_url}/rest/api/content/{page_id}",
             params={"expand": expand},
             timeout=self.timeout,
@@ -232,6 +354,11 @@ class ConfluenceClient:
         version = page.get("version") or {}
         return version.get("when")
 
+    def get_page_version_number(self, page: Dict[str, Any]) -> Optional[int]:
+        """Номер версии страницы или вложения (version.number)."""
+        version = page.get("version") or {}
+        return version.get("number")
+
     def get_page_attachments(self, page_id: str, limit: int = 100) -> List[Dict[str, Any]]:
         """
         Список вложений страницы (Confluence Server/DC: child/attachment).
@@ -240,7 +367,7 @@ class ConfluenceClient:
         result: List[Dict[str, Any]] = []
         start = 0
         while True:
-            r = self.session.get(
+            r = self._get(
                 f"{self.base_url}/rest/api/content/{page_id}/child/attachment",
                 params={"limit": min(limit, 50), "start": start, "expand": "version"},
                 timeout=self.timeout,
@@ -256,21 +383,57 @@ class ConfluenceClient:
             start += len(results)
         return result[:limit]
 
-    def download_attachment(self, attachment: Dict[str, Any]) -> Optional[bytes]:
-        """
-        Скачать содержимое вложения. attachment — элемент из get_page_attachments.
-        Возвращает bytes или None при ошибке.
-        """
+    def _attachment_url(self, attachment: Dict[str, Any]) -> Optional[str]:
         links = attachment.get("_links") or {}
         download_path = links.get("download")
         if not download_path:
             logger.warning("Нет _links.download у вложения %s", attachment.get("title"))
             return None
-        url = self.base_url + download_path if download_path.startswith("/") else f"{self.base_url}/{download_path}"
+        return self.base_url + download_path if download_path.startswith("/") else f"{self.base_url}/{download_path}"
+
+    def download_attachment_file(
+        self,
+        attachment: Dict[str, Any],
+        max_size: Optional[int] = None,
+    ) -> Optional[AttachmentSpool]:
+        """
+        Потоковое скачивание вложения в AttachmentSpool (до ATTACHMENT_SPOOL_SIZE в памяти, дальше на диске).
+        Больше max_size байт — AttachmentTooLarge: по Content-Length до чтения тела, иначе как только
+        прочитанное превысит лимит. Возвращает AttachmentSpool (закрывает вызывающий) или None при ошибке.
+        """
+        url = self._attachment_url(attachment)
+        if not url:
+            return None
+        title = attachment.get("title")
+        spool = AttachmentSpool()
         try:
-            r = self.session.get(url, timeout=self.timeout)
-            r.raise_for_status()
-            return r.content
+            with self._get(url, timeout=self.timeout, stream=True) as r:
+                r.raise_for_status()
+                length = int(r.headers.get("Content-Length") or 0)
+                if max_size and length > max_size:
+                    raise AttachmentTooLarge(title, length, max_size)
+                size = 0
+                for chunk in r.iter_content(_DOWNLOAD_CHUNK_SIZE):
+                    size += len(chunk)
+                    if max_size and size > max_size:
+                        raise AttachmentTooLarge(title, size, max_size)
+                    spool.write(chunk)
+            return spool
+        except AttachmentTooLarge:
+            spool.close()
+            raise
         except Exception as e:
-            logger.warning("Ошибка скачивания %s: %s", attachment.get("title"), e)
+            spool.close()
+            logger.warning("Ошибка скачивания %s: %s", title, e)
+            return None
+
+    def download_attachment(self, attachment: Dict[str, Any]) -> Optional[bytes]:
+        """
+        Скачать содержимое вложения. attachment — элемент из get_page_attachments.
+        Возвращает bytes или None при ошибке. Для больших файлов — download_attachment_file.
+        """
+        f = self.download_attachment_file(attachment)
+        if f is None:
             return None
+        with f:
+            return f.read()
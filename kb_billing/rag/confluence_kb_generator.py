@@ -5,13 +5,17 @@
 """
 import json
 import logging
+import os
 import re
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 
 from bs4 import BeautifulSoup
 
-from kb_billing.rag.confluence_client import ConfluenceClient
+from kb_billing.rag.confluence_client import AttachmentSpool, AttachmentTooLarge, ConfluenceClient
 from kb_billing.rag.attachment_parsers import parse_attachment
 
 logger = logging.getLogger(__name__)
@@ -22,6 +26,24 @@ DEFAULT_MAX_ATTACHMENT_SIZE = 50 * 1024 * 1024
 DEFAULT_MAX_ATTACHMENT_TEXT_LENGTH = 500_000
 # Служебные/временные форматы Confluence — не скачивать и не индексировать
 ATTACHMENT_SKIP_EXTENSIONS = {".tmp", ".render", ".tfss"}
+# Параллельность обхода: потоков на каждую стадию (страницы, скачивание, парсинг)
+DEFAULT_MAX_WORKERS = int(os.getenv("CONFLUENCE_WORKERS", "4"))
+
+# (секция для content[] или None, запись для attachments_processed)
+AttachmentResult = Tuple[Optional[Dict[str, Any]], Dict[str, Any]]
+# Результат стадии скачивания: файл, превышение лимита или None (ошибка)
+Downloaded = Union[AttachmentSpool, AttachmentTooLarge, None]
+
+
+def _attachment_section(title: str, text: str) -> Dict[str, Any]:
+    return {"title": f"Вложение: {title}", "text": text, "subsections": []}
+
+
+def _completed(value: Any) -> Future:
+    """Готовый Future — чтобы неизменённые страницы шли в общий упорядоченный список результатов."""
+    future: Future = Future()
+    future.set_result(value)
+    return future
 
 
 def _strip_html_to_text(html: str) -> str:
@@ -126,6 +148,7 @@ class ConfluenceKBGenerator:
         index_attachments: bool = True,
         max_attachment_size: int = DEFAULT_MAX_ATTACHMENT_SIZE,
         max_attachment_text_length: int = DEFAULT_MAX_ATTACHMENT_TEXT_LENGTH,
+        max_workers: int = DEFAULT_MAX_WORKERS,
     ):
         self.client = client or ConfluenceClient()
         self.output_dir = Path(output_dir) if output_dir else Path(__file__).parent.parent / "confluence_docs"
@@ -135,14 +158,109 @@ class ConfluenceKBGenerator:
         self.index_attachments = index_attachments
         self.max_attachment_size = max_attachment_size
         self.max_attachment_text_length = max_attachment_text_length
+        self.max_workers = max(1, max_workers)
+        self._download_pool: Optional[ThreadPoolExecutor] = None
+        self._parse_pool: Optional[ThreadPoolExecutor] = None
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
+    @contextmanager
+    def _crawl_pools(self) -> Iterator[ThreadPoolExecutor]:
+        """
+        Пулы обхода: страницы, скачивание вложений, парсинг вложений — отдельные стадии,
+        каждая не более max_workers потоков. Возвращает пул страниц.
+        Вне контекста (update_docs_by_page_ids) вложения обрабатываются последовательно.
+        """
+        with ThreadPoolExecutor(self.max_workers, thread_name_prefix="confluence-page") as pages, \
+                ThreadPoolExecutor(self.max_workers, thread_name_prefix="confluence-download") as downloads, \
+                ThreadPoolExecutor(self.max_workers, thread_name_prefix="confluence-parse") as parsers:
+            self._download_pool, self._parse_pool = downloads, parsers
+            try:
+                yield pages
+            finally:
+                self._download_pool = self._parse_pool = None
+
+    def _check_attachment(self, att: Dict[str, Any]) -> Optional[AttachmentResult]:
+        """Проверки до скачивания: служебный формат, размер из метаданных. None — вложение нужно скачать."""
+        title_att = att.get("title") or "вложение"
+        _ext_match = re.search(r"\.[a-z0-9]+$", (title_att or "").lower())
+        ext = _ext_match.group(0) if _ext_match else ""
+        if ext in ATTACHMENT_SKIP_EXTENSIONS:
+            return None, {"filename": title_att, "status": "skipped", "reason": "служебный формат Confluence"}
+        size = att.get("extensions", {}).get("fileSize") or 0
+        if size and size > self.max_attachment_size:
+            logger.info("Пропуск вложения %s: размер %s > %s", title_att, size, self.max_attachment_size)
+            return (
+                _attachment_section(title_att, f"[Файл не индексирован: размер {size} байт превышает лимит]"),
+                {"filename": title_att, "status": "skipped", "reason": "размер превышает лимит"},
+            )
+        return None
+
+    def _download(self, att: Dict[str, Any]) -> Downloaded:
+        """Стадия скачивания: потоково во временный файл, с обрывом по max_attachment_size."""
+        try:
+            return self.client.download_attachment_file(att, max_size=self.max_attachment_size)
+        except AttachmentTooLarge as e:
+            return e
+
+    def _parse_downloaded(
+        self, att: Dict[str, Any], downloaded: Downloaded, page_title: Optional[str]
+    ) -> AttachmentResult:
+        """Извлечение текста из скачанного вложения (стадия парсинга); временный файл закрывается здесь."""
+        title_att = att.get("title") or "вложение"
+        if isinstance(downloaded, AttachmentTooLarge):
+            logger.info("Пропуск индексации %s: скачивание прервано, %s", title_att, downloaded)
+            return (
+                _attachment_section(title_att, f"[Файл не индексирован: размер более {downloaded.limit} байт превышает лимит]"),
+                {"filename": title_att, "status": "skipped", "reason": "размер превышает лимит"},
+            )
+        if downloaded is None:
+            return (
+                _attachment_section(title_att, "[Не удалось скачать файл]"),
+                {"filename": title_att, "status": "error", "reason": "не удалось скачать"},
+            )
+        content_type = (att.get("extensions") or {}).get("mediaType") or ""
+        with downloaded, downloaded.view() as data:
+            if not data:
+                return (
+                    _attachment_section(title_att, "[Не удалось скачать файл]"),
+                    {"filename": title_att, "status": "error", "reason": "не удалось скачать"},
+                )
+            text, err = parse_attachment(
+                data, title_att, content_type, context_text=page_title
+            )
+        if err:
+            return (
+                _attachment_section(title_att, f"[Ошибка извлечения текста: {err}]"),
+                {"filename": title_att, "status": "error", "reason": err},
+            )
+        if len(text) > self.max_attachment_text_length:
+            text = text[: self.max_attachment_text_length] + "\n\n[... текст обрезан по лимиту ...]"
+        return _attachment_section(title_att, text), {"filename": title_att, "status": "indexed", "text_length": len(text)}
+
+    @staticmethod
+    def _previous_attachments(previous: Optional[Dict[str, Any]]) -> Dict[str, AttachmentResult]:
+        """Проиндексированные вложения прежней версии документа: filename → (секция, запись с version)."""
+        if not previous:
+            return {}
+        sections = {s.get("title"): s for s in previous.get("content") or []}
+        result: Dict[str, AttachmentResult] = {}
+        for entry in previous.get("attachments_processed") or []:
+            section = sections.get(f"Вложение: {entry.get('filename')}")
+            if entry.get("status") == "indexed" and entry.get("version") is not None and section:
+                result[entry["filename"]] = (section, entry)
+        return result
+
     def _process_attachments(
-        self, page_id: str, page_title: Optional[str] = None
+        self,
+        page_id: str,
+        page_title: Optional[str] = None,
+        previous: Optional[Dict[str, Any]] = None,
     ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
         """
         Скачать вложения страницы, извлечь текст парсерами (PDF, DOCX, Draw.io, изображения OCR + Gemini Vision).
         page_title передаётся в vision-аннотацию изображений как контекст.
+        previous — прежний документ страницы: вложения с той же version.number берутся из него без скачивания.
+        Внутри _crawl_pools скачивание и парсинг идут в своих пулах; порядок секций — порядок вложений.
         Возвращает (список секций для content[], список записей для attachments_processed).
         """
         sections: List[Dict[str, Any]] = []
@@ -154,73 +272,55 @@ class ConfluenceKBGenerator:
         except Exception as e:
             logger.warning("Не удалось получить вложения страницы %s: %s", page_id, e)
             return sections, processed
-        for att in attachments:
-            title_att = att.get("title") or "вложение"
-            _ext_match = re.search(r"\.[a-z0-9]+$", (title_att or "").lower())
-            ext = _ext_match.group(0) if _ext_match else ""
-            if ext in ATTACHMENT_SKIP_EXTENSIONS:
-                processed.append({"filename": title_att, "status": "skipped", "reason": "служебный формат Confluence"})
-                continue
-            size = att.get("extensions", {}).get("fileSize") or 0
-            if size and size > self.max_attachment_size:
-                logger.info("Пропуск вложения %s: размер %s > %s", title_att, size, self.max_attachment_size)
-                sections.append({
-                    "title": f"Вложение: {title_att}",
-                    "text": f"[Файл не индексирован: размер {size} байт превышает лимит]",
-                    "subsections": [],
-                })
-                processed.append({"filename": title_att, "status": "skipped", "reason": "размер превышает лимит"})
-                continue
-            data = self.client.download_attachment(att)
-            if not data:
-                sections.append({
-                    "title": f"Вложение: {title_att}",
-                    "text": "[Не удалось скачать файл]",
-                    "subsections": [],
-                })
-                processed.append({"filename": title_att, "status": "error", "reason": "не удалось скачать"})
-                continue
-            if len(data) > self.max_attachment_size:
-                logger.info("Пропуск индексации %s: размер после скачивания %s", title_att, len(data))
-                sections.append({
-                    "title": f"Вложение: {title_att}",
-                    "text": f"[Файл не индексирован: размер {len(data)} байт превышает лимит]",
-                    "subsections": [],
-                })
-                processed.append({"filename": title_att, "status": "skipped", "reason": "размер превышает лимит"})
-                continue
-            content_type = (att.get("extensions") or {}).get("mediaType") or ""
-            text, err = parse_attachment(
-                data, title_att, content_type, context_text=page_title
-            )
-            if err:
-                sections.append({
-                    "title": f"Вложение: {title_att}",
-                    "text": f"[Ошибка извлечения текста: {err}]",
-                    "subsections": [],
-                })
-                processed.append({"filename": title_att, "status": "error", "reason": err})
-                continue
-            if len(text) > self.max_attachment_text_length:
-                text = text[: self.max_attachment_text_length] + "\n\n[... текст обрезан по лимиту ...]"
-            sections.append({
-                "title": f"Вложение: {title_att}",
-                "text": text,
-                "subsections": [],
-            })
-            processed.append({"filename": title_att, "status": "indexed", "text_length": len(text)})
+        download_pool, parse_pool = self._download_pool, self._parse_pool
+        reusable = self._previous_attachments(previous)
+        versions = [self.client.get_page_version_number(att) for att in attachments]
+        # Стадия 1: проверки и постановка скачиваний в очередь
+        staged: List[Union[AttachmentResult, "Future[Downloaded]"]] = []
+        for att, version in zip(attachments, versions):
+            ready = reusable.get(att.get("title") or "вложение")
+            if ready is not None and (version is None or ready[1]["version"] != version):
+                ready = None
+            if ready is None:
+                ready = self._check_attachment(att)
+            if ready is None:
+                if download_pool is None:
+                    ready = self._parse_downloaded(att, self._download(att), page_title)
+                else:
+                    ready = download_pool.submit(self._download, att)
+            staged.append(ready)
+        # Стадия 2: парсинг по мере готовности скачиваний
+        for i, (att, item) in enumerate(zip(attachments, staged)):
+            if isinstance(item, Future):
+                staged[i] = parse_pool.submit(self._parse_downloaded, att, item.result(), page_title)
+        for item, version in zip(staged, versions):
+            section, entry = item.result() if isinstance(item, Future) else item
+            if section:
+                sections.append(section)
+            if version is not None:
+                entry = {**entry, "version": version}
+            processed.append(entry)
         return sections, processed
 
-    def page_to_kb_doc(self, page: Dict[str, Any], base_url: str) -> Dict[str, Any]:
-        """Преобразование одной страницы Confluence в документ формата KB (тело страницы + вложения)."""
+    def page_to_kb_doc(
+        self,
+        page: Dict[str, Any],
+        base_url: str,
+        previous: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Преобразование одной страницы Confluence в документ формата KB (тело страницы + вложения).
+        previous — прежний документ этой страницы (инкрементальная синхронизация), см. _process_attachments.
+        """
         page_id = str(page.get("id", "") or "").strip()
         title = page.get("title", "Без названия")
         storage = self.client.get_page_content_storage(page)
         version_date = self.client.get_page_version_date(page)
+        version_number = self.client.get_page_version_number(page)
         link = f"{base_url}/pages/viewpage.action?pageId={page_id}" if base_url else ""
         content = _parse_storage_to_content(storage)
         attachment_sections, attachments_processed = self._process_attachments(
-            page_id, page_title=title
+            page_id, page_title=title, previous=previous
         )
         if attachment_sections:
             content = content + attachment_sections
@@ -237,36 +337,103 @@ class ConfluenceKBGenerator:
                 "last_updated": version_date,
             },
         }
+        if version_number is not None:
+            doc["source"]["version"] = version_number
         if attachments_processed:
             doc["attachments_processed"] = attachments_processed
         return doc
 
+    @staticmethod
+    def _collect_docs(futures: List[Tuple[Any, "Future[Dict[str, Any]]"]]) -> List[Dict[str, Any]]:
+        """Результаты в порядке постановки (порядок страниц в JSON не зависит от порядка завершения)."""
+        docs: List[Dict[str, Any]] = []
+        for page_id, future in futures:
+            try:
+                docs.append(future.result())
+            except Exception as e:
+                logger.warning("Ошибка обработки страницы %s: %s", page_id, e)
+        return docs
+
+    def _load_docs_by_page_id(self, path: Path) -> Dict[str, Dict[str, Any]]:
+        """Документы ранее сохранённого JSON по page_id (пустой словарь, если файла нет или он битый)."""
+        if not path.exists():
+            return {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                docs = json.load(f)
+        except Exception as e:
+            logger.warning("Не удалось прочитать %s, полная синхронизация: %s", path, e)
+            return {}
+        if not isinstance(docs, list):
+            return {}
+        return {str((d.get("source") or {}).get("page_id", "")): d for d in docs if isinstance(d, dict)}
+
+    def _is_unchanged(self, doc: Dict[str, Any], page: Dict[str, Any]) -> bool:
+        """Версия страницы в Confluence совпадает с сохранённой (version.number, иначе version.when)."""
+        source = doc.get("source") or {}
+        number = self.client.get_page_version_number(page)
+        if number is not None and source.get("version") is not None:
+            return source["version"] == number
+        when = self.client.get_page_version_date(page)
+        return bool(when) and source.get("last_updated") == when
+
+    def _refresh_page(self, page_id: str, base_url: str, previous: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Заново забрать изменённую страницу; при ошибке оставить прежний документ, если он есть."""
+        try:
+            return self.page_to_kb_doc(self.client.get_page_by_id(page_id), base_url, previous=previous)
+        except Exception as e:
+            if previous is None:
+                raise
+            logger.warning("Не удалось обновить страницу %s, оставлена прежняя версия: %s", page_id, e)
+            return previous
+
     def sync_space(
         self,
         space_key: str,
         base_url: Optional[str] = None,
         limit: Optional[int] = None,
+        incremental: bool = False,
     ) -> List[Dict[str, Any]]:
         """
         Синхронизация пространства: скачать страницы, преобразовать в KB, сохранить в JSON.
+        incremental=True: список страниц запрашивается только с version, тело и вложения забираются
+        лишь для страниц, чья версия отличается от сохранённой в confluence_<space>.json (вложения —
+        лишь с изменённой версией); страницы, которых больше нет в пространстве, удаляются.
         Возвращает список созданных документов KB.
         """
         space_key = (space_key or "").strip()
         if not space_key:
             return []
         base_url = base_url or self.client.base_url
-        docs: List[Dict[str, Any]] = []
-        count = 0
-        for page in self.client.get_pages_in_space(space_key):
-            try:
-                doc = self.page_to_kb_doc(page, base_url)
-                docs.append(doc)
-                count += 1
-                if limit is not None and count >= limit:
-                    break
-            except Exception as e:
-                logger.warning("Ошибка обработки страницы %s: %s", page.get("id"), e)
         out_file = self.output_dir / f"confluence_{space_key}.json"
+        previous = self._load_docs_by_page_id(out_file) if incremental else {}
+        if incremental:
+            pages = self.client.get_pages_in_space(space_key, expand="version")
+        else:
+            pages = self.client.get_pages_in_space(space_key)
+        if limit is not None:
+            pages = islice(pages, limit)
+        unchanged = 0
+        with self._crawl_pools() as pool:
+            futures: List[Tuple[Any, Future]] = []
+            for page in pages:
+                page_id = str(page.get("id", "") or "").strip()
+                if not incremental:
+                    futures.append((page_id, pool.submit(self.page_to_kb_doc, page, base_url)))
+                    continue
+                old = previous.get(page_id)
+                if old is not None and self._is_unchanged(old, page):
+                    unchanged += 1
+                    futures.append((page_id, _completed(old)))
+                else:
+                    futures.append((page_id, pool.submit(self._refresh_page, page_id, base_url, old)))
+            docs = self._collect_docs(futures)
+        if incremental:
+            listed = {page_id for page_id, _ in futures}
+            logger.info(
+                "Пространство %s: без изменений %s, обновлено/добавлено %s, удалено %s",
+                space_key, unchanged, len(futures) - unchanged, len(set(previous) - listed),
+            )
         with open(out_file, "w", encoding="utf-8") as f:
             json.dump(docs, f, ensure_ascii=False, indent=2)
         logger.info("Сохранено %s документов в %s", len(docs), out_file)
@@ -326,16 +493,16 @@ class ConfluenceKBGenerator:
             if page_id not in seen:
                 seen.add(page_id)
                 unique_list.append((page_id, desc))
-        docs: List[Dict[str, Any]] = []
-        for page_id, engineer_comment in unique_list:
-            try:
-                page = self.client.get_page_by_id(page_id)
-                doc = self.page_to_kb_doc(page, base_url)
-                if engineer_comment:
-                    (doc.setdefault("source", {}))["engineer_comment"] = engineer_comment
-                docs.append(doc)
-            except Exception as e:
-                logger.warning("Ошибка обработки страницы %s: %s", page_id, e)
+        def fetch(page_id: str, engineer_comment: Optional[str]) -> Dict[str, Any]:
+            page = self.client.get_page_by_id(page_id)
+            doc = self.page_to_kb_doc(page, base_url)
+            if engineer_comment:
+                (doc.setdefault("source", {}))["engineer_comment"] = engineer_comment
+            return doc
+
+        with self._crawl_pools() as pool:
+            futures = [(page_id, pool.submit(fetch, page_id, desc)) for page_id, desc in unique_list]
+            docs = self._collect_docs(futures)
         out_file = self.output_dir / f"confluence_{output_suffix}.json"
         with open(out_file, "w", encoding="utf-8") as f:
             json.dump(docs, f, ensure_ascii=False, indent=2)
@@ -109,10 +109,12 @@ def sync_spaces(
     limit: Optional[int] = 50,
     output_dir: Optional[Path] = None,
     client: Optional[Any] = None,
+    incremental: bool = False,
 ) -> Dict[str, Path]:
     """
     Синхронизация одного или нескольких пространств Confluence в KB.
     Для каждого пространства создаётся файл confluence_{space_key}.json.
+    incremental=True — забирать только страницы и вложения с изменённой версией (см. ConfluenceKBGenerator.sync_space).
 
     Returns:
         Словарь {space_key: path_to_json}.
@@ -124,7 +126,7 @@ def sync_spaces(
         if not key:
             continue
         try:
-            docs = gen.sync_space(key, limit=limit)
+            docs = gen.sync_space(key, limit=limit, incremental=incremental)
             result[key] = gen.output_dir / f"confluence_{key}.json"
             logger.info("Пространство %s: сохранено %s документов в %s", key, len(docs), result[key])
         except Exception as e:
@@ -138,6 +140,7 @@ def sync_all_spaces(
     client: Optional[Any] = None,
     exclude_keys: Optional[List[str]] = None,
     include_only_personal: bool = False,
+    incremental: bool = False,
 ) -> Dict[str, Path]:
     """
     Синхронизация всех пространств Confluence в KB (по списку из API).
@@ -149,6 +152,7 @@ def sync_all_spaces(
         client: ConfluenceClient (по умолчанию из get_client()).
         exclude_keys: ключи пространств, которые пропускать (например ["DEMO", "TEST"]).
         include_only_personal: если True — синхронизировать только личные пространства (type=personal).
+        incremental: если True — обновлять только изменённые страницы, удалять исчезнувшие.
 
     Returns:
         Словарь {space_key: path_to_json}.
@@ -176,6 +180,7 @@ def sync_all_spaces(
         limit=limit_per_space,
         output_dir=output_dir,
         client=client,
+        incremental=incremental,
     )
 
 
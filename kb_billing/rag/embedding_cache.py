@@ -0,0 +1,183 @@
+"""
+Кэш эмбеддингов на диске (SQLite, векторы float32).
+
+Ключ - (модель, normalize_embeddings, SHA-1 текста): повторные вопросы
+ассистента и неизменившиеся документы KB при перезагрузке не пересчитываются
+моделью. Вытеснение LRU по времени последнего обращения, счетчики hit/miss.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# БД рядом с модулем, как satellite_chat.db
+DEFAULT_PATH = Path(__file__).resolve().parent / "embedding_cache.db"
+DEFAULT_MAX_ENTRIES = 200_000
+
+# Ограничение числа переменных в одном SELECT ... IN (...) SQLite
+_CHUNK = 500
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Кэш эмбеддингов: одно подключение SQLite на процесс, доступ под блокировкой"""
+
+    def __init__(self, path: Optional[Path] = None, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = Path(path) if path is not None else DEFAULT_PATH
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        # WAL: чтение из Streamlit не блокируется загрузкой KB в другом процессе
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                normalize INTEGER NOT NULL,
+                text_sha1 TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, normalize, text_sha1)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+
+    def get_many(self, model: str, normalize: bool, texts: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Найденные в кэше векторы: SHA-1 текста -> вектор (обновляет last_used)"""
+        keys = list({text_key(t) for t in texts})
+        found = {}
+        now = time.time()
+        with self._lock:
+            for i in range(0, len(keys), _CHUNK):
+                chunk = keys[i:i + _CHUNK]
+                rows = self._conn.execute(
+                    f"SELECT text_sha1, vector FROM embeddings WHERE model = ? AND normalize = ? "
+                    f"AND text_sha1 IN ({', '.join('?' * len(chunk))})",
+                    [model, int(normalize), *chunk],
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+            if found:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND normalize = ? AND text_sha1 = ?",
+                    [(now, model, int(normalize), key) for key in found],
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(self, model: str, normalize: bool, texts: Sequence[str], vectors) -> None:
+        """Сохранить векторы (float32) и вытеснить давно не использованные сверх max_entries"""
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            vector = np.asarray(vector, dtype=np.float32)
+            rows.append((model, int(normalize), text_key(text), vector.shape[0], vector.tobytes(), now))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, normalize, text_sha1, dim, vector, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN "
+                "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+            logger.info("Кэш эмбеддингов: вытеснено %s записей (LRU)", excess)
+
+    def encode(
+        self,
+        model: str,
+        normalize: bool,
+        texts: Sequence[str],
+        compute: Callable[[List[str]], "np.ndarray"],
+    ) -> np.ndarray:
+        """Эмбеддинги texts: из кэша, отсутствующие - одним вызовом compute(список текстов)
+
+        Returns:
+            np.ndarray float32 len(texts) x dim (в порядке texts)
+        """
+        texts = list(texts)
+        found = self.get_many(model, normalize, texts)
+        missing = []
+        seen = set()
+        for text in texts:
+            key = text_key(text)
+            if key not in found and key not in seen:
+                seen.add(key)
+                missing.append(text)
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        if missing:
+            computed = np.asarray(compute(missing), dtype=np.float32)
+            self.put_many(model, normalize, missing, computed)
+            for text, vector in zip(missing, computed):
+                found[text_key(text)] = vector
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack([found[text_key(t)] for t in texts])
+
+    def stats(self) -> Dict[str, float]:
+        """Счетчики hit/miss процесса и число записей в кэше"""
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            total = self.hits + self.misses
+            return {
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self.hits = self.misses = 0
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Общий кэш процесса (EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES).
+    EMBEDDING_CACHE=0 - кэш выключен (None); при ошибке открытия БД - тоже None."""
+    global _cache
+    if os.getenv("EMBEDDING_CACHE", "1").strip().lower() in ("0", "false", "no", "off"):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            path = os.getenv("EMBEDDING_CACHE_PATH") or None
+            max_entries = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", str(DEFAULT_MAX_ENTRIES)))
+            try:
+                _cache = EmbeddingCache(path, max_entries=max_entries)
+            except Exception as exc:
+                logger.warning("Кэш эмбеддингов недоступен (%s), эмбеддинги без кэша", exc)
+                return None
+        return _cache
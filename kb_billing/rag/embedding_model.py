@@ -3,17 +3,31 @@ from __future__ import annotations
 
 import logging
 import os
+import threading
+from typing import Dict
 
 from sentence_transformers import SentenceTransformer
 
 logger = logging.getLogger(__name__)
 
+# Модель на процесс: KBLoader и RAGAssistant в одном процессе (Streamlit, бенчмарк) делят один экземпляр
+_models: Dict[str, SentenceTransformer] = {}
+_models_lock = threading.Lock()
+
 
 def _truthy(name: str) -> bool:
     return os.getenv(name, "").strip().lower() in ("1", "true", "yes", "on")
 
 
 def load_sentence_transformer(model_name: str) -> SentenceTransformer:
+    """Модель эмбеддингов процесса: загружается один раз на имя модели."""
+    with _models_lock:
+        if model_name not in _models:
+            _models[model_name] = _load(model_name)
+        return _models[model_name]
+
+
+def _load(model_name: str) -> SentenceTransformer:
     """Загрузить модель эмбеддингов; при HF_HUB_OFFLINE или сбое сети — только локальный кэш."""
     if _truthy("HF_HUB_OFFLINE") or _truthy("TRANSFORMERS_OFFLINE"):
         os.environ.setdefault("HF_HUB_OFFLINE", "1")
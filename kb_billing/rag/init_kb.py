@@ -48,6 +48,18 @@ def main():
         action="store_true",
         help="Перезагрузить только Q/A примеры (sql_examples + user_added_examples), без таблиц/представлений/Confluence. Быстро, без полной перестройки KB."
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=None,
+        help="Размер батча эмбеддингов (по умолчанию: EMBEDDING_BATCH_SIZE или 32)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Процессов для эмбеддингов (по умолчанию: EMBEDDING_WORKERS или 1)"
+    )
     
     args = parser.parse_args()
     
@@ -67,7 +79,9 @@ def main():
             qdrant_host=args.host,
             qdrant_port=args.port,
             collection_name=args.collection,
-            embedding_model=args.model
+            embedding_model=args.model,
+            embedding_batch_size=args.batch_size,
+            embedding_workers=args.workers
         )
         
         if args.only_examples:
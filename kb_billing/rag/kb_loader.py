@@ -6,14 +6,23 @@ import os
 # Исправление проблемы с protobuf - должно быть ДО импорта transformers
 os.environ['PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION'] = 'python'
 
+import hashlib
 import json
+import time
+import uuid
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Union
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, PointIdsList, Filter, FieldCondition, MatchValue,
+    PayloadSchemaType, TextIndexParams, TokenizerType,
+)
 import logging
 
 from kb_billing.rag.embedding_model import load_sentence_transformer
+from kb_billing.rag.embedding_cache import get_embedding_cache
+from kb_billing.rag import table_index
 
 # Импорт конфигурации sql4A
 try:
@@ -26,10 +35,30 @@ except ImportError:
         QDRANT_HOST = "localhost"
         QDRANT_PORT = 6333
         QDRANT_COLLECTION = "kb_billing"
+        BATCH_SIZE = 32
+        EMBEDDING_WORKERS = 0
+        NORMALIZE_EMBEDDINGS = True
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Точка до эмбеддинга: (id, текст для эмбеддинга, payload)
+PendingPoint = Tuple[Union[int, str], str, Dict[str, Any]]
+
+# Пространство имен UUIDv5 для id чанков Confluence (id не зависят от процесса, в отличие от hash())
+CONFLUENCE_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "kb_billing/confluence_section")
+
+
+def confluence_point_id(page_key: str, idx: int, section_title: str) -> str:
+    """Детерминированный id точки секции Confluence: UUIDv5(page_id, номер секции, заголовок)"""
+    return str(uuid.uuid5(CONFLUENCE_NAMESPACE, f"{page_key}\n{idx}\n{section_title}"))
+
+
+def content_hash(text: str, payload: Dict[str, Any]) -> str:
+    """SHA-256 текста для эмбеддинга и payload (content_hash): секция с тем же хэшем не пересчитывается"""
+    data = json.dumps([text, payload], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
 
 class KBLoader:
     """Класс для загрузки KB_billing в Qdrant (совместим с sql4A)"""
@@ -41,6 +70,9 @@ class KBLoader:
         collection_name: Optional[str] = None,
         embedding_model: Optional[str] = None,
         kb_dir: Optional[Path] = None,
+        embedding_batch_size: Optional[int] = None,
+        embedding_workers: Optional[int] = None,
+        client: Optional[QdrantClient] = None,
     ):
         """
         Инициализация загрузчика KB (использует настройки sql4A)
@@ -51,11 +83,14 @@ class KBLoader:
             collection_name: Имя коллекции в Qdrant (по умолчанию из SQL4AConfig)
             embedding_model: Модель для генерации эмбеддингов (по умолчанию из SQL4AConfig)
             kb_dir: Каталог kb_billing (training_data, tables, confluence_docs). Если не задан — от __file__ (мог разъехаться с путём в UI при разделении доменов).
+            embedding_batch_size: Размер батча encode (по умолчанию SQL4AConfig.BATCH_SIZE)
+            embedding_workers: Процессов для эмбеддингов (>1 - пул sentence-transformers, по умолчанию SQL4AConfig.EMBEDDING_WORKERS)
+            client: Готовый клиент Qdrant (например QdrantClient(":memory:") в офлайн-бенчмарке) вместо host/port
         """
         # Используем настройки из sql4A конфигурации
         self.qdrant_host = qdrant_host or SQL4AConfig.QDRANT_HOST
         self.qdrant_port = qdrant_port or SQL4AConfig.QDRANT_PORT
-        self.client = QdrantClient(
+        self.client = client if client is not None else QdrantClient(
             host=self.qdrant_host,
             port=self.qdrant_port,
             check_compatibility=False,
@@ -64,6 +99,12 @@ class KBLoader:
         self.embedding_model = embedding_model or SQL4AConfig.EMBEDDING_MODEL
         self.model = load_sentence_transformer(self.embedding_model)
         self.vector_size = self.model.get_sentence_embedding_dimension()
+        self.embedding_batch_size = embedding_batch_size or SQL4AConfig.BATCH_SIZE
+        self.embedding_workers = SQL4AConfig.EMBEDDING_WORKERS if embedding_workers is None else embedding_workers
+        self._encode_pool = None
+        self.embedding_cache = get_embedding_cache()
+        # Итог последней reload_confluence_only: unchanged / upserted / deleted
+        self.last_confluence_sync: Dict[str, int] = {}
         
         # Путь к директории KB: явный kb_dir (как в UI) или от расположения модуля
         self.kb_dir = Path(kb_dir) if kb_dir is not None else Path(__file__).parent.parent
@@ -74,6 +115,7 @@ class KBLoader:
         logger.info(f"  - kb_dir: {self.kb_dir.resolve()}")
         logger.info(f"  - Модель эмбеддингов: {self.embedding_model}")
         logger.info(f"  - Размерность векторов: {self.vector_size}")
+        logger.info(f"  - Батч эмбеддингов: {self.embedding_batch_size}, процессов: {max(self.embedding_workers, 1)}")
         
     def create_collection(self, recreate: bool = False):
         """Создание коллекции в Qdrant"""
@@ -88,6 +130,7 @@ class KBLoader:
                     self.client.delete_collection(self.collection_name)
                 else:
                     logger.info(f"Коллекция {self.collection_name} уже существует")
+                    self._ensure_payload_indexes()
                     return
             
             logger.info(f"Создание коллекции {self.collection_name} с размерностью {self.vector_size}")
@@ -99,27 +142,112 @@ class KBLoader:
                 )
             )
             logger.info(f"Коллекция {self.collection_name} создана успешно")
+            self._ensure_payload_indexes()
         except Exception as e:
             logger.error(f"Ошибка при создании коллекции: {e}")
             raise
+
+    def _ensure_payload_indexes(self):
+        """Индексы payload для фильтров на сервере: type и page_id (keyword), section_title (полнотекстовый,
+        префиксы слов без учета регистра). Поиск чанков Confluence по странице/заголовку - O(совпадений)."""
+        indexes = {
+            "type": PayloadSchemaType.KEYWORD,
+            "page_id": PayloadSchemaType.KEYWORD,
+            "section_title": TextIndexParams(
+                type="text",
+                tokenizer=TokenizerType.PREFIX,
+                min_token_len=2,
+                max_token_len=40,
+                lowercase=True,
+            ),
+        }
+        try:
+            existing = self.client.get_collection(self.collection_name).payload_schema or {}
+        except Exception:
+            existing = {}
+        for field_name, schema in indexes.items():
+            if field_name in existing:
+                continue
+            try:
+                self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field_name,
+                    field_schema=schema,
+                )
+                logger.info(f"Создан индекс payload {field_name} в {self.collection_name}")
+            except Exception as e:
+                logger.warning(f"Не удалось создать индекс payload {field_name}: {e}")
     
-    def _qa_examples_to_points(self, examples: List[Dict[str, Any]], id_offset: int = 0) -> List[PointStruct]:
-        """Преобразование списка примеров Q/A в точки для Qdrant."""
-        points = []
+    @contextmanager
+    def _embedding_pool(self):
+        """Пул процессов sentence-transformers на время загрузки (если embedding_workers > 1)"""
+        if self.embedding_workers <= 1 or self._encode_pool is not None:
+            yield
+            return
+        logger.info("Запуск пула эмбеддингов: %s процессов", self.embedding_workers)
+        self._encode_pool = self.model.start_multi_process_pool(["cpu"] * self.embedding_workers)
+        try:
+            yield
+        finally:
+            self.model.stop_multi_process_pool(self._encode_pool)
+            self._encode_pool = None
+
+    def _encode_texts(self, texts: List[str]):
+        """Эмбеддинги списка текстов батчами (numpy-массив len(texts) x vector_size).
+        Неизменившиеся тексты берутся из кэша эмбеддингов, моделью считаются только остальные."""
+        if self.embedding_cache is None:
+            return self._encode_uncached(texts)
+        return self.embedding_cache.encode(
+            self.embedding_model, SQL4AConfig.NORMALIZE_EMBEDDINGS, texts, self._encode_uncached
+        )
+
+    def _encode_uncached(self, texts: List[str]):
+        if self._encode_pool is not None:
+            return self.model.encode_multi_process(
+                texts,
+                self._encode_pool,
+                batch_size=self.embedding_batch_size,
+                normalize_embeddings=SQL4AConfig.NORMALIZE_EMBEDDINGS,
+            )
+        return self.model.encode(
+            texts,
+            batch_size=self.embedding_batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=SQL4AConfig.NORMALIZE_EMBEDDINGS,
+            show_progress_bar=False,
+        )
+
+    def _build_points(self, pending: List[PendingPoint], source: str) -> List[PointStruct]:
+        """Эмбеддинги для всех текстов источника одним батчевым encode и сборка PointStruct"""
+        if not pending:
+            return []
+        started = time.perf_counter()
+        vectors = self._encode_texts([text for _, text, _ in pending])
+        elapsed = time.perf_counter() - started
+        logger.info(
+            "Эмбеддинги %s: %s текстов за %.2f с (%.1f текстов/с)",
+            source, len(pending), elapsed, len(pending) / elapsed if elapsed else 0.0
+        )
+        if self.embedding_cache is not None:
+            logger.info("Кэш эмбеддингов: %s", self.embedding_cache.stats())
+        return [
+            PointStruct(id=point_id, vector=vector.tolist(), payload=payload)
+            for (point_id, _, payload), vector in zip(pending, vectors)
+        ]
+
+    def _qa_examples_to_pending(self, examples: List[Dict[str, Any]], id_offset: int = 0) -> List[PendingPoint]:
+        """Преобразование списка примеров Q/A в точки для Qdrant (без эмбеддингов)."""
+        pending = []
         for i, example in enumerate(examples):
             question = example.get('question', '')
             if not question or not example.get('sql', '').strip():
                 continue
-            embedding = self.model.encode(
-                question,
-                normalize_embeddings=SQL4AConfig.NORMALIZE_EMBEDDINGS
-            ).tolist()
             sql = example.get('sql', '')
             table_names = self._extract_table_names(sql)
-            point = PointStruct(
-                id=id_offset + i,
-                vector=embedding,
-                payload={
+            pending.append((
+                id_offset + i,
+                question,
+                {
                     "type": "qa_example",
                     "question": question,
                     "sql": sql,
@@ -130,12 +258,14 @@ class KBLoader:
                     "table_names": table_names,
                     "content": f"Вопрос: {question}\n\nSQL: {sql}"
                 }
-            )
-            points.append(point)
-        return points
+            ))
+        return pending
 
     def load_qa_examples(self) -> List[PointStruct]:
         """Загрузка Q/A примеров из training_data/sql_examples.json и user_added_examples.json (если есть)."""
+        return self._build_points(self._collect_qa_examples(), "Q/A примеров")
+
+    def _collect_qa_examples(self) -> List[PendingPoint]:
         points = []
         qa_file = self.kb_dir / "training_data" / "sql_examples.json"
         if qa_file.exists():
@@ -144,7 +274,7 @@ class KBLoader:
                 examples = json.load(f)
             if not isinstance(examples, list):
                 examples = [examples]
-            points.extend(self._qa_examples_to_points(examples, id_offset=0))
+            points.extend(self._qa_examples_to_pending(examples, id_offset=0))
         else:
             logger.warning(f"Файл {qa_file} не найден")
 
@@ -157,7 +287,7 @@ class KBLoader:
                 if not isinstance(user_examples, list):
                     user_examples = [user_examples]
                 id_offset = 1_000_000
-                points.extend(self._qa_examples_to_points(user_examples, id_offset=id_offset))
+                points.extend(self._qa_examples_to_pending(user_examples, id_offset=id_offset))
             except Exception as e:
                 logger.warning(f"Не удалось загрузить {user_file}: {e}")
 
@@ -174,7 +304,8 @@ class KBLoader:
             points_selector=Filter(should=[FieldCondition(key="type", match=MatchValue(value="qa_example"))]),
         )
         logger.info("Удалены старые Q/A примеры из коллекции")
-        points = self.load_qa_examples()
+        with self._embedding_pool():
+            points = self.load_qa_examples()
         if not points:
             logger.warning("Нет Q/A примеров для загрузки")
             return 0
@@ -183,35 +314,76 @@ class KBLoader:
             batch = points[i : i + batch_size]
             self.client.upsert(collection_name=self.collection_name, points=batch)
         logger.info("Загружено %s Q/A примеров (без перестройки остальной KB)", len(points))
+        table_index.invalidate()
         return len(points)
 
     def reload_confluence_only(self) -> int:
         """Перезагрузить в Qdrant только документы Confluence (confluence_docs/*.json, в т.ч. manual_notes).
-        Удаляет точки с type=confluence_section и загружает их заново. Остальная KB (биллинг: Q/A, таблицы, представления) не трогается.
-        Возвращает количество загруженных точек."""
+        Дельта по content_hash: эмбеддинги считаются и загружаются только для новых и изменившихся секций,
+        секции, которых больше нет (в т.ч. страницы из outdated.txt), удаляются. Остальная KB (биллинг: Q/A,
+        таблицы, представления) не трогается. Итог - в self.last_confluence_sync.
+        Возвращает количество чанков Confluence в коллекции после перезагрузки."""
         self.create_collection(recreate=False)
-        self.client.delete(
-            collection_name=self.collection_name,
-            points_selector=Filter(
-                should=[
-                    FieldCondition(key="type", match=MatchValue(value="confluence_section")),
-                ]
-            ),
-        )
-        logger.info("Удалены старые чанки Confluence из коллекции")
-        points = self.load_confluence_docs()
-        if not points:
-            logger.info("Нет документов Confluence для загрузки (confluence_docs/ пуста или только outdated)")
-            return 0
+        pending = {point_id: (point_id, text, payload) for point_id, text, payload in self._collect_confluence_docs()}
+        existing = self._get_confluence_hashes()
+
+        stale_ids = [point_id for point_id in existing if point_id not in pending]
+        if stale_ids:
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=PointIdsList(points=stale_ids),
+            )
+        changed = [
+            item for point_id, item in pending.items()
+            if existing.get(point_id) != item[2]["content_hash"]
+        ]
+        with self._embedding_pool():
+            points = self._build_points(changed, "Confluence (изменившиеся секции)")
         batch_size = 100
         for i in range(0, len(points), batch_size):
             batch = points[i : i + batch_size]
             self.client.upsert(collection_name=self.collection_name, points=batch)
-        logger.info("Загружено %s чанков Confluence (без перестройки биллинг KB)", len(points))
-        return len(points)
+
+        self.last_confluence_sync = {
+            "unchanged": len(pending) - len(changed),
+            "upserted": len(points),
+            "deleted": len(stale_ids),
+        }
+        logger.info(
+            "Confluence: без изменений %s, загружено %s, удалено %s чанков (без перестройки биллинг KB)",
+            self.last_confluence_sync["unchanged"], len(points), len(stale_ids)
+        )
+        if stale_ids or points:
+            table_index.invalidate()
+        if not pending:
+            logger.info("Нет документов Confluence для загрузки (confluence_docs/ пуста или только outdated)")
+        return len(pending)
+
+    def _get_confluence_hashes(self) -> Dict[Union[int, str], Optional[str]]:
+        """id -> content_hash всех точек type=confluence_section в коллекции (без векторов)"""
+        hashes = {}
+        offset = None
+        while True:
+            result, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=Filter(
+                    must=[FieldCondition(key="type", match=MatchValue(value="confluence_section"))]
+                ),
+                limit=1000,
+                offset=offset,
+                with_payload=["content_hash"],
+                with_vectors=False,
+            )
+            for point in result:
+                hashes[point.id] = (point.payload or {}).get("content_hash")
+            if offset is None:
+                return hashes
 
     def load_table_documentation(self) -> List[PointStruct]:
         """Загрузка документации таблиц из tables/*.json"""
+        return self._build_points(self._collect_table_documentation(), "таблиц")
+
+    def _collect_table_documentation(self) -> List[PendingPoint]:
         tables_dir = self.kb_dir / "tables"
         
         if not tables_dir.exists():
@@ -232,37 +404,26 @@ class KBLoader:
             # Формируем текст документации
             doc_text = self._format_table_documentation(table_data)
             
-            # Генерация эмбеддинга (как в sql4A - с нормализацией)
-            embedding = self.model.encode(
-                doc_text, 
-                normalize_embeddings=SQL4AConfig.NORMALIZE_EMBEDDINGS
-            ).tolist()
-            
             # DDL
             ddl = table_data.get('ddl', '')
             if ddl:
-                ddl_embedding = self.model.encode(
-                    ddl, 
-                    normalize_embeddings=SQL4AConfig.NORMALIZE_EMBEDDINGS
-                ).tolist()
-                ddl_point = PointStruct(
-                    id=hash(f"ddl_{table_name}") & 0x7FFFFFFFFFFFFFFF,
-                    vector=ddl_embedding,
-                    payload={
+                points.append((
+                    hash(f"ddl_{table_name}") & 0x7FFFFFFFFFFFFFFF,
+                    ddl,
+                    {
                         "type": "ddl",
                         "table_name": table_name,
                         "content": ddl,
                         "schema": table_data.get('schema', 'billing'),
                         "database": table_data.get('database', 'Oracle')
                     }
-                )
-                points.append(ddl_point)
+                ))
             
             # Документация
-            doc_point = PointStruct(
-                id=hash(f"doc_{table_name}") & 0x7FFFFFFFFFFFFFFF,
-                vector=embedding,
-                payload={
+            points.append((
+                hash(f"doc_{table_name}") & 0x7FFFFFFFFFFFFFFF,
+                doc_text,
+                {
                     "type": "documentation",
                     "table_name": table_name,
                     "content": doc_text,
@@ -272,14 +433,16 @@ class KBLoader:
                     "relationships": table_data.get('relationships', []),
                     "usage_notes": table_data.get('usage_notes', [])
                 }
-            )
-            points.append(doc_point)
+            ))
         
         logger.info(f"Загружено {len(points)} точек документации таблиц")
         return points
     
     def load_view_documentation(self) -> List[PointStruct]:
         """Загрузка документации представлений из views/*.json"""
+        return self._build_points(self._collect_view_documentation(), "представлений")
+
+    def _collect_view_documentation(self) -> List[PendingPoint]:
         views_dir = self.kb_dir / "views"
         
         if not views_dir.exists():
@@ -300,16 +463,10 @@ class KBLoader:
             # Формируем текст документации
             doc_text = self._format_view_documentation(view_data)
             
-            # Генерация эмбеддинга (как в sql4A - с нормализацией)
-            embedding = self.model.encode(
-                doc_text, 
-                normalize_embeddings=SQL4AConfig.NORMALIZE_EMBEDDINGS
-            ).tolist()
-            
-            point = PointStruct(
-                id=hash(f"view_{view_name}") & 0x7FFFFFFFFFFFFFFF,
-                vector=embedding,
-                payload={
+            points.append((
+                hash(f"view_{view_name}") & 0x7FFFFFFFFFFFFFFF,
+                doc_text,
+                {
                     "type": "view",
                     "view_name": view_name,
                     "content": doc_text,
@@ -317,14 +474,16 @@ class KBLoader:
                     "columns": view_data.get('columns', {}),
                     "usage_notes": view_data.get('usage_notes', [])
                 }
-            )
-            points.append(point)
+            ))
         
         logger.info(f"Загружено {len(points)} точек документации представлений")
         return points
     
     def load_metadata(self) -> List[PointStruct]:
         """Загрузка метаданных схемы из metadata.json"""
+        return self._build_points(self._collect_metadata(), "метаданных")
+
+    def _collect_metadata(self) -> List[PendingPoint]:
         metadata_file = self.kb_dir / "metadata.json"
         
         if not metadata_file.exists():
@@ -339,16 +498,10 @@ class KBLoader:
         # Формируем текст метаданных
         metadata_text = self._format_metadata(metadata)
         
-        # Генерация эмбеддинга (как в sql4A - с нормализацией)
-        embedding = self.model.encode(
-            metadata_text, 
-            normalize_embeddings=SQL4AConfig.NORMALIZE_EMBEDDINGS
-        ).tolist()
-        
-        point = PointStruct(
-            id=hash("metadata_schema") & 0x7FFFFFFFFFFFFFFF,
-            vector=embedding,
-            payload={
+        point = (
+            hash("metadata_schema") & 0x7FFFFFFFFFFFFFFF,
+            metadata_text,
+            {
                 "type": "metadata",
                 "content": metadata_text,
                 "database": metadata.get('database', ''),
@@ -400,6 +553,9 @@ class KBLoader:
         загружается отдельной точкой (confluence_section), чтобы поиск возвращал релевантные фрагменты,
         а не целую страницу. domain='satellite'.
         """
+        return self._build_points(self._collect_confluence_docs(), "Confluence")
+
+    def _collect_confluence_docs(self) -> List[PendingPoint]:
         confluence_docs_dir = self.get_confluence_docs_dir()
         if not confluence_docs_dir.exists():
             logger.info("Директория confluence_docs не найдена — документы Confluence не загружаются: %s", confluence_docs_dir.resolve())
@@ -427,6 +583,7 @@ class KBLoader:
                 docs = [docs]
             for doc in docs:
                 source = doc.get("source") or {}
+                # page_id всегда строкой (keyword-индекс, фильтр MatchValue по строке)
                 page_id = source.get("page_id", "")
                 page_id = str(page_id).strip() if page_id else ""
                 if page_id and page_id in outdated_ids:
@@ -454,11 +611,8 @@ class KBLoader:
                     text_for_embed = f"{page_title}\n\n{section_title}\n\n{doc_annotation}{section_text}".strip()
                     if len(text_for_embed) > 15000:
                         text_for_embed = text_for_embed[:15000] + "\n\n[... обрезано ...]"
-                    embedding = self.model.encode(
-                        text_for_embed,
-                        normalize_embeddings=SQL4AConfig.NORMALIZE_EMBEDDINGS,
-                    ).tolist()
-                    point_id = hash(f"confluence_{page_id}_{idx}_{section_title or idx}") & 0x7FFFFFFFFFFFFFFF
+                    # Без page_id (ручные заметки) - ключ по файлу и названию документа
+                    point_id = confluence_point_id(page_id or f"{json_file.name}:{page_title}", idx, section_title)
                     payload = {
                         "type": "confluence_section",
                         "domain": "satellite",
@@ -472,7 +626,8 @@ class KBLoader:
                     }
                     if source.get("engineer_comment"):
                         payload["engineer_comment"] = source["engineer_comment"]
-                    points.append(PointStruct(id=point_id, vector=embedding, payload=payload))
+                    payload["content_hash"] = content_hash(text_for_embed, payload)
+                    points.append((point_id, text_for_embed, payload))
         logger.info("Загружено %s чанков Confluence (сектор спутниковых систем)", len(points))
         return points
 
@@ -481,28 +636,29 @@ class KBLoader:
         # Создаем коллекцию
         self.create_collection(recreate=recreate)
         
-        # Загружаем все типы данных
-        all_points = []
-        
-        # Q/A примеры
-        qa_points = self.load_qa_examples()
-        all_points.extend(qa_points)
-        
-        # Документация таблиц
-        table_points = self.load_table_documentation()
-        all_points.extend(table_points)
-        
-        # Документация представлений
-        view_points = self.load_view_documentation()
-        all_points.extend(view_points)
+        # Сначала тексты из всех источников (чтение файлов), затем эмбеддинги
+        # батчами по источникам - вместо model.encode на каждый документ
+        sources = [
+            ("Q/A примеров", self._collect_qa_examples),
+            ("таблиц", self._collect_table_documentation),
+            ("представлений", self._collect_view_documentation),
+            ("метаданных", self._collect_metadata),
+            # Документы Confluence (схемы сети, документация спутниковых инженеров) — расширение единой KB
+            ("Confluence", self._collect_confluence_docs),
+        ]
+        collected = []
+        for source, collect in sources:
+            started = time.perf_counter()
+            pending = collect()
+            logger.info("Тексты %s: %s за %.2f с", source, len(pending), time.perf_counter() - started)
+            collected.append((source, pending))
         
-        # Метаданные
-        metadata_points = self.load_metadata()
-        all_points.extend(metadata_points)
-
-        # Документы Confluence (схемы сети, документация спутниковых инженеров) — расширение единой KB
-        confluence_points = self.load_confluence_docs()
-        all_points.extend(confluence_points)
+        all_points = []
+        started = time.perf_counter()
+        with self._embedding_pool():
+            for source, pending in collected:
+                all_points.extend(self._build_points(pending, source))
+        logger.info(f"Эмбеддинги всех источников: {len(all_points)} точек за {time.perf_counter() - started:.2f} с")
         
         # Загружаем в Qdrant батчами
         batch_size = 100
@@ -519,6 +675,8 @@ class KBLoader:
             logger.info(f"Загружено {min(i + batch_size, total)}/{total} точек")
         
         logger.info(f"Загрузка завершена. Всего загружено {total} точек")
+        # KB перезагружена - индексы RAGAssistant процесса (таблицы, BM25) перечитаются
+        table_index.invalidate()
         
         # Статистика
         collection_info = self.client.get_collection(self.collection_name)
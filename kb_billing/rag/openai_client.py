@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 import os
-from typing import Any, Optional
+from typing import Any, Iterator, Optional
 
 
 def _api_proxy() -> Optional[str]:
@@ -42,3 +42,13 @@ def build_openai_client(
         kwargs["http_client"] = httpx.Client(proxy=proxy, timeout=timeout)
 
     return OpenAI(**kwargs)
+
+
+def iter_chat_completion_text(client: Any, **kwargs: Any) -> Iterator[str]:
+    """Текст ответа chat.completions по частям по мере генерации (stream=True)."""
+    for chunk in client.chat.completions.create(stream=True, **kwargs):
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
@@ -6,12 +6,16 @@ import os
 # Исправление проблемы с protobuf - должно быть ДО импорта transformers
 os.environ['PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION'] = 'python'
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from qdrant_client import QdrantClient
-from qdrant_client.models import Filter, FieldCondition, MatchValue
+from qdrant_client.models import Filter, FieldCondition, MatchValue, MatchText
 import logging
 
 from kb_billing.rag.embedding_model import load_sentence_transformer
+from kb_billing.rag.embedding_cache import get_embedding_cache
+from kb_billing.rag.table_index import TableIndex
+from kb_billing.rag.bm25_index import BM25Index, rrf_fuse
+from kb_billing.rag.sql_answer_cache import get_sql_answer_cache, question_key
 
 # Импорт конфигурации sql4A
 try:
@@ -26,6 +30,8 @@ except ImportError:
         QDRANT_COLLECTION = "kb_billing"
         DEFAULT_SEARCH_LIMIT = 5
         SIMILARITY_THRESHOLD = 0.7
+        NORMALIZE_EMBEDDINGS = True
+        RETRIEVAL_MODE = "vector"
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -163,7 +169,8 @@ class RAGAssistant:
         qdrant_host: Optional[str] = None,
         qdrant_port: Optional[int] = None,
         collection_name: Optional[str] = None,
-        embedding_model: Optional[str] = None
+        embedding_model: Optional[str] = None,
+        client: Optional[QdrantClient] = None
     ):
         """
         Инициализация RAG ассистента (использует настройки sql4A)
@@ -173,11 +180,12 @@ class RAGAssistant:
             qdrant_port: Порт Qdrant сервера (по умолчанию из SQL4AConfig)
             collection_name: Имя коллекции в Qdrant (по умолчанию из SQL4AConfig)
             embedding_model: Модель для генерации эмбеддингов (по умолчанию из SQL4AConfig)
+            client: Готовый клиент Qdrant (например QdrantClient(":memory:") в офлайн-бенчмарке) вместо host/port
         """
         # Используем настройки из sql4A конфигурации
         self.qdrant_host = qdrant_host or SQL4AConfig.QDRANT_HOST
         self.qdrant_port = qdrant_port or SQL4AConfig.QDRANT_PORT
-        self.client = QdrantClient(
+        self.client = client if client is not None else QdrantClient(
             host=self.qdrant_host,
             port=self.qdrant_port,
             check_compatibility=False,
@@ -185,12 +193,28 @@ class RAGAssistant:
         self.collection_name = collection_name or SQL4AConfig.QDRANT_COLLECTION
         self.embedding_model = embedding_model or SQL4AConfig.EMBEDDING_MODEL
         self.model = load_sentence_transformer(self.embedding_model)
+        self.embedding_cache = get_embedding_cache()
+        self.table_index = TableIndex(self.client, self.collection_name)
+        self.bm25_index = BM25Index(self.client, self.collection_name)
         
         logger.info(f"Инициализация RAGAssistant:")
         logger.info(f"  - Qdrant: {self.qdrant_host}:{self.qdrant_port}")
         logger.info(f"  - Коллекция: {self.collection_name}")
         logger.info(f"  - Модель эмбеддингов: {self.embedding_model}")
 
+    def _embed_query(self, text: str) -> List[float]:
+        """Эмбеддинг запроса (как в sql4A - с нормализацией); повторный вопрос - из кэша эмбеддингов"""
+        normalize = SQL4AConfig.NORMALIZE_EMBEDDINGS
+        if self.embedding_cache is None:
+            return self.model.encode(text, normalize_embeddings=normalize).tolist()
+        vectors = self.embedding_cache.encode(
+            self.embedding_model,
+            normalize,
+            [text],
+            lambda texts: self.model.encode(texts, normalize_embeddings=normalize, convert_to_numpy=True),
+        )
+        return vectors[0].tolist()
+
     def _vector_search(
         self,
         query_vector: List[float],
@@ -223,12 +247,55 @@ class RAGAssistant:
         raise RuntimeError(
             "Qdrant client не поддерживает ни search, ни query_points. Обновите qdrant-client."
         )
+
+    def _retrieve(
+        self,
+        query: str,
+        query_filter: Optional[Filter],
+        limit: int,
+        mode: Optional[str] = None,
+        types: Optional[List[str]] = None,
+        match: Optional[Dict[str, Any]] = None,
+        query_vector: Optional[List[float]] = None,
+    ) -> List[tuple]:
+        """Поиск по KB: [(payload, similarity)].
+
+        mode: "vector" - только векторный поиск; "hybrid" - вектор + BM25 по тем же
+        ограничениям (types/match = фильтр query_filter), слияние рангов RRF.
+        similarity - косинусная близость (0.0 для найденных только по BM25).
+        query_vector - готовый эмбеддинг query (иначе считается здесь).
+        """
+        mode = (mode or SQL4AConfig.RETRIEVAL_MODE or "vector").lower()
+        if mode not in ("vector", "hybrid"):
+            raise ValueError(f"Неизвестный режим поиска: {mode} (vector или hybrid)")
+        if query_vector is None:
+            query_vector = self._embed_query(query)
+        if mode == "vector":
+            return [(r.payload, r.score) for r in self._vector_search(query_vector, query_filter, limit)]
+
+        candidates = max(limit * 3, 20)
+        vector_results = list(self._vector_search(query_vector, query_filter, candidates))
+        try:
+            bm25_results = self.bm25_index.search(query, candidates, types=types, match=match)
+        except Exception as e:
+            logger.warning(f"BM25-поиск недоступен, только векторный поиск: {e}")
+            return [(r.payload, r.score) for r in vector_results[:limit]]
+        found = {r.id: (r.payload, r.score) for r in vector_results}
+        for point_id, payload, _ in bm25_results:
+            found.setdefault(point_id, (payload, 0.0))
+        fused = rrf_fuse([
+            [r.id for r in vector_results],
+            [point_id for point_id, _, _ in bm25_results],
+        ])
+        return [found[point_id] for point_id, _ in fused[:limit]]
         
     def search_similar_examples(
         self,
         question: str,
         category: Optional[str] = None,
-        limit: Optional[int] = None
+        limit: Optional[int] = None,
+        mode: Optional[str] = None,
+        query_vector: Optional[List[float]] = None
     ) -> List[Dict[str, Any]]:
         """
         Поиск похожих Q/A примеров
@@ -237,6 +304,8 @@ class RAGAssistant:
             question: Вопрос финансиста
             category: Категория для фильтрации (опционально)
             limit: Количество результатов (по умолчанию из SQL4AConfig)
+            mode: "vector" или "hybrid" (по умолчанию SQL4AConfig.RETRIEVAL_MODE)
+            query_vector: Готовый эмбеддинг вопроса (бенчмарк замеряет эмбеддинг и поиск отдельно)
         
         Returns:
             Список похожих примеров с SQL запросами
@@ -244,12 +313,6 @@ class RAGAssistant:
         # Используем настройки из sql4A
         limit = limit or SQL4AConfig.DEFAULT_SEARCH_LIMIT
         
-        # Генерация эмбеддинга для вопроса (как в sql4A - с нормализацией)
-        query_embedding = self.model.encode(
-            question, 
-            normalize_embeddings=SQL4AConfig.NORMALIZE_EMBEDDINGS
-        ).tolist()
-        
         # Построение фильтра
         filter_conditions = [
             FieldCondition(key="type", match=MatchValue(value="qa_example"))
@@ -262,19 +325,23 @@ class RAGAssistant:
         
         query_filter = Filter(must=filter_conditions) if filter_conditions else None
         
-        # Поиск в Qdrant (совместимость: search в старых версиях, query_points в новых)
+        # Поиск в Qdrant (совместимость: search в старых версиях, query_points в новых) + BM25 в режиме hybrid
         try:
-            results = self._vector_search(query_embedding, query_filter, limit)
+            results = self._retrieve(
+                question, query_filter, limit, mode,
+                types=["qa_example"], match={"category": category} if category else None,
+                query_vector=query_vector,
+            )
             # Форматирование результатов
             examples = []
-            for result in results:
+            for payload, score in results:
                 examples.append({
-                    "question": result.payload.get("question", ""),
-                    "sql": result.payload.get("sql", ""),
-                    "category": result.payload.get("category", ""),
-                    "complexity": result.payload.get("complexity", 1),
-                    "similarity": result.score,
-                    "context": result.payload.get("context", "")
+                    "question": payload.get("question", ""),
+                    "sql": payload.get("sql", ""),
+                    "category": payload.get("category", ""),
+                    "complexity": payload.get("complexity", 1),
+                    "similarity": score,
+                    "context": payload.get("context", "")
                 })
             
             return examples
@@ -297,6 +364,22 @@ class RAGAssistant:
         Returns:
             Информация о таблице
         """
+        # Индекс таблиц в памяти (один scroll на процесс), при ошибке - поиск в Qdrant по таблице
+        try:
+            entry = self.table_index.get(table_name)
+        except Exception as e:
+            logger.warning(f"Индекс таблиц недоступен, поиск в Qdrant: {e}")
+            return self._search_table_info_qdrant(table_name, info_type)
+        if not entry:
+            return None
+        ddl_result = entry.get("ddl") if info_type in ["ddl", "both"] else None
+        doc_result = None
+        if info_type in ["documentation", "both"]:
+            doc_result = entry.get("documentation") or entry.get("view")
+        return self._table_info_result(ddl_result, doc_result)
+
+    def _search_table_info_qdrant(self, table_name: str, info_type: str) -> Optional[Dict[str, Any]]:
+        """Поиск DDL и документации таблицы отдельными scroll в Qdrant"""
         try:
             # Поиск DDL
             ddl_result = None
@@ -332,19 +415,22 @@ class RAGAssistant:
                 if doc_results[0]:
                     doc_result = doc_results[0][0].payload if doc_results[0] else None
             
-            result = {}
-            if ddl_result:
-                result["ddl"] = ddl_result.get("content", "")
-            if doc_result:
-                result["documentation"] = doc_result.get("content", "")
-                result["key_columns"] = doc_result.get("key_columns", {})
-                result["business_rules"] = doc_result.get("business_rules", [])
-                result["relationships"] = doc_result.get("relationships", [])
-            
-            return result if result else None
+            return self._table_info_result(ddl_result, doc_result)
         except Exception as e:
             logger.error(f"Ошибка при поиске информации о таблице: {e}")
             return None
+
+    @staticmethod
+    def _table_info_result(ddl_result: Optional[Dict], doc_result: Optional[Dict]) -> Optional[Dict[str, Any]]:
+        result = {}
+        if ddl_result:
+            result["ddl"] = ddl_result.get("content", "")
+        if doc_result:
+            result["documentation"] = doc_result.get("content", "")
+            result["key_columns"] = doc_result.get("key_columns", {})
+            result["business_rules"] = doc_result.get("business_rules", [])
+            result["relationships"] = doc_result.get("relationships", [])
+        return result if result else None
     
     def search_semantic(
         self,
@@ -352,16 +438,14 @@ class RAGAssistant:
         content_type: Optional[str] = None,
         limit: Optional[int] = None,
         page_id: Optional[str] = None,
+        mode: Optional[str] = None,
     ) -> List[Dict[str, Any]]:
         """
         Семантический поиск по KB.
         page_id: для confluence_section — только чанки с этой страницы (удобно для запросов по ссылке на вложение).
+        mode: "vector" или "hybrid" (вектор + BM25, по умолчанию SQL4AConfig.RETRIEVAL_MODE).
         """
         limit = limit or SQL4AConfig.DEFAULT_SEARCH_LIMIT
-        query_embedding = self.model.encode(
-            query,
-            normalize_embeddings=SQL4AConfig.NORMALIZE_EMBEDDINGS
-        ).tolist()
         filter_conditions = []
         if content_type:
             filter_conditions.append(
@@ -373,37 +457,41 @@ class RAGAssistant:
             )
         query_filter = Filter(must=filter_conditions) if filter_conditions else None
         
-        # Поиск (совместимость: search / query_points)
+        # Поиск (совместимость: search / query_points) + BM25 в режиме hybrid
         try:
-            results = self._vector_search(query_embedding, query_filter, limit)
+            results = self._retrieve(
+                query, query_filter, limit, mode,
+                types=[content_type] if content_type else None,
+                match={"page_id": str(page_id)} if page_id else None,
+            )
             # Форматирование результатов
             documents = []
-            for result in results:
+            for payload, score in results:
                 doc = {
-                    "type": result.payload.get("type", ""),
-                    "content": result.payload.get("content", ""),
-                    "similarity": result.score
+                    "type": payload.get("type", ""),
+                    "content": payload.get("content", ""),
+                    "similarity": score
                 }
                 
                 # Добавляем специфичные поля в зависимости от типа
                 if doc["type"] == "qa_example":
-                    doc["question"] = result.payload.get("question", "")
-                    doc["sql"] = result.payload.get("sql", "")
-                    doc["category"] = result.payload.get("category", "")
+                    doc["question"] = payload.get("question", "")
+                    doc["sql"] = payload.get("sql", "")
+                    doc["category"] = payload.get("category", "")
                 elif doc["type"] == "documentation":
-                    doc["table_name"] = result.payload.get("table_name", "")
-                    doc["description"] = result.payload.get("description", "")
+                    doc["table_name"] = payload.get("table_name", "")
+                    doc["description"] = payload.get("description", "")
                 elif doc["type"] == "ddl":
-                    doc["table_name"] = result.payload.get("table_name", "")
+                    doc["table_name"] = payload.get("table_name", "")
                 elif doc["type"] == "confluence_doc":
-                    doc["title"] = result.payload.get("title", "")
-                    doc["source_url"] = result.payload.get("source_url", "")
-                    doc["page_id"] = result.payload.get("page_id", "")
+                    doc["title"] = payload.get("title", "")
+                    doc["source_url"] = payload.get("source_url", "")
+                    doc["page_id"] = payload.get("page_id", "")
                 elif doc["type"] == "confluence_section":
-                    doc["title"] = result.payload.get("title", "")
-                    doc["section_title"] = result.payload.get("section_title", "")
-                    doc["source_url"] = result.payload.get("source_url", "")
-                    doc["page_id"] = result.payload.get("page_id", "")
+                    doc["title"] = payload.get("title", "")
+                    doc["section_title"] = payload.get("section_title", "")
+                    doc["source_url"] = payload.get("source_url", "")
+                    doc["page_id"] = payload.get("page_id", "")
 
                 documents.append(doc)
             
@@ -434,68 +522,50 @@ class RAGAssistant:
             logger.error("get_confluence_page_ids: %s", e)
             return []
 
+    @staticmethod
+    def _confluence_chunk(payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "type": "confluence_section",
+            "content": payload.get("content", ""),
+            "similarity": 1.0,
+            "title": payload.get("title", ""),
+            "section_title": payload.get("section_title", ""),
+            "source_url": payload.get("source_url", ""),
+            "page_id": payload.get("page_id", ""),
+        }
+
+    def _scroll_confluence(self, condition: FieldCondition, limit: int) -> List[Dict[str, Any]]:
+        """Чанки Confluence по условию - фильтр на сервере Qdrant (индексы payload из KBLoader.create_collection)."""
+        result, _ = self.client.scroll(
+            collection_name=self.collection_name,
+            scroll_filter=Filter(
+                must=[
+                    FieldCondition(key="type", match=MatchValue(value="confluence_section")),
+                    condition,
+                ]
+            ),
+            limit=limit,
+            with_payload=True,
+            with_vectors=False,
+        )
+        return [self._confluence_chunk(point.payload or {}) for point in result]
+
     def get_confluence_chunks_by_page_id(
         self, page_id: str, limit: int = 20
     ) -> List[Dict[str, Any]]:
-        """Чанки Confluence по page_id. Сначала фильтр в Qdrant (type + page_id), иначе scroll всего и фильтр в коде."""
+        """Чанки Confluence по page_id: фильтр type + page_id в Qdrant (keyword-индекс)."""
         page_id = str(page_id).strip()
         try:
-            # Пробуем фильтр по page_id в Qdrant (данные после перезагрузки — строка)
-            result, _ = self.client.scroll(
-                collection_name=self.collection_name,
-                scroll_filter=Filter(
-                    must=[
-                        FieldCondition(key="type", match=MatchValue(value="confluence_section")),
-                        FieldCondition(key="page_id", match=MatchValue(value=page_id)),
-                    ]
-                ),
-                limit=limit,
-                with_payload=True,
-                with_vectors=False,
+            # KBLoader пишет page_id строкой
+            documents = self._scroll_confluence(
+                FieldCondition(key="page_id", match=MatchValue(value=page_id)), limit
             )
-            documents = []
-            for point in result:
-                payload = point.payload or {}
-                documents.append({
-                    "type": "confluence_section",
-                    "content": payload.get("content", ""),
-                    "similarity": 1.0,
-                    "title": payload.get("title", ""),
-                    "section_title": payload.get("section_title", ""),
-                    "source_url": payload.get("source_url", ""),
-                    "page_id": payload.get("page_id", ""),
-                })
-            if documents:
+            if documents or not page_id.isdigit():
                 return documents
-            # Запасной вариант: scroll без фильтра по page_id, фильтр в коде (если в payload page_id был int)
-            result, _ = self.client.scroll(
-                collection_name=self.collection_name,
-                scroll_filter=Filter(
-                    must=[FieldCondition(key="type", match=MatchValue(value="confluence_section"))]
-                ),
-                limit=5000,
-                with_payload=True,
-                with_vectors=False,
+            # Точки, загруженные до нормализации (page_id числом) - тоже фильтром на сервере
+            return self._scroll_confluence(
+                FieldCondition(key="page_id", match=MatchValue(value=int(page_id))), limit
             )
-            for point in result:
-                payload = point.payload or {}
-                pid = payload.get("page_id")
-                if pid is None:
-                    continue
-                if str(pid).strip() != page_id:
-                    continue
-                documents.append({
-                    "type": "confluence_section",
-                    "content": payload.get("content", ""),
-                    "similarity": 1.0,
-                    "title": payload.get("title", ""),
-                    "section_title": payload.get("section_title", ""),
-                    "source_url": payload.get("source_url", ""),
-                    "page_id": payload.get("page_id", ""),
-                })
-                if len(documents) >= limit:
-                    break
-            return documents
         except Exception as e:
             logger.error("get_confluence_chunks_by_page_id: %s", e)
             return []
@@ -503,7 +573,8 @@ class RAGAssistant:
     def get_confluence_chunks_by_section_title_contains(
         self, substring: str, limit: int = 15
     ) -> List[Dict[str, Any]]:
-        """Чанки Confluence, у которых в section_title встречается substring (для запросов «опишите документ X»)."""
+        """Чанки Confluence, у которых в section_title встречается substring (для запросов «опишите документ X»).
+        Кандидаты - полнотекстовым фильтром в Qdrant (MatchText по индексу section_title), затем проверка подстроки."""
         if not (substring or "").strip():
             return []
         substring = substring.strip()
@@ -517,33 +588,11 @@ class RAGAssistant:
             return s
         sub_norm = _norm(substring)
         try:
-            result, _ = self.client.scroll(
-                collection_name=self.collection_name,
-                scroll_filter=Filter(
-                    must=[FieldCondition(key="type", match=MatchValue(value="confluence_section"))]
-                ),
-                limit=500,
-                with_payload=True,
-                with_vectors=False,
+            candidates = self._scroll_confluence(
+                FieldCondition(key="section_title", match=MatchText(text=substring)), max(limit * 4, 50)
             )
-            documents = []
-            for point in result:
-                payload = point.payload or {}
-                stitle = (payload.get("section_title") or "")
-                if not sub_norm or sub_norm not in _norm(stitle):
-                    continue
-                documents.append({
-                    "type": "confluence_section",
-                    "content": payload.get("content", ""),
-                    "similarity": 1.0,
-                    "title": payload.get("title", ""),
-                    "section_title": stitle,
-                    "source_url": payload.get("source_url", ""),
-                    "page_id": payload.get("page_id", ""),
-                })
-                if len(documents) >= limit:
-                    break
-            return documents
+            documents = [d for d in candidates if sub_norm in _norm(d["section_title"])]
+            return documents[:limit]
         except Exception as e:
             logger.error("get_confluence_chunks_by_section_title_contains: %s", e)
             return []
@@ -648,7 +697,8 @@ class RAGAssistant:
         context: Optional[Dict[str, Any]] = None,
         model: str = "gpt-3.5-turbo",
         api_key: Optional[str] = None,
-        api_base: Optional[str] = None
+        api_base: Optional[str] = None,
+        use_cache: bool = True
     ) -> Optional[str]:
         """
         Генерация SQL запроса через LLM (OpenAI API)
@@ -659,17 +709,66 @@ class RAGAssistant:
             model: Модель LLM (по умолчанию gpt-3.5-turbo)
             api_key: API ключ OpenAI (если None, берется из OPENAI_API_KEY)
             api_base: Базовый URL API (для прокси, например https://api.proxyapi.ru/openai/v1)
+            use_cache: Брать SQL похожего вопроса из семантического кэша (период и топ-N подставляются)
         
         Returns:
             Сгенерированный SQL запрос или None при ошибке
         """
+        for kind, value in self._iter_sql_generation(question, context, model, api_key, api_base, use_cache, stream=False):
+            if kind == "sql":
+                return value
+        return None
+
+    def stream_sql_with_llm(
+        self,
+        question: str,
+        context: Optional[Dict[str, Any]] = None,
+        model: str = "gpt-3.5-turbo",
+        api_key: Optional[str] = None,
+        api_base: Optional[str] = None,
+        use_cache: bool = True
+    ) -> Iterator[Tuple[str, Optional[str]]]:
+        """
+        Генерация SQL через LLM с потоковой выдачей ответа (параметры как у generate_sql_with_llm)
+        
+        Yields:
+            ("delta", текст) - части ответа LLM по мере генерации;
+            последним - ("sql", SQL после извлечения и проверок или None)
+        """
+        return self._iter_sql_generation(question, context, model, api_key, api_base, use_cache, stream=True)
+
+    def _iter_sql_generation(
+        self,
+        question: str,
+        context: Optional[Dict[str, Any]],
+        model: str,
+        api_key: Optional[str],
+        api_base: Optional[str],
+        use_cache: bool,
+        stream: bool
+    ) -> Iterator[Tuple[str, Optional[str]]]:
+        """Общий ход generate_sql_with_llm / stream_sql_with_llm: события ("delta", текст) и ("sql", SQL)"""
         try:
+            model_to_use = os.getenv("OPENAI_MODEL", model)
+
+            # Семантический кэш: тот же отчет за другой период / с другим N - без RAG и LLM
+            answer_cache = get_sql_answer_cache() if use_cache else None
+            if answer_cache is not None:
+                cache_scope = f"{self.collection_name}:{model_to_use}"
+                cache_key = question_key(question, extract_top_n_from_question(question))
+                cache_vector = self._embed_query(cache_key.text)
+                cached_sql = answer_cache.lookup(cache_scope, cache_vector, cache_key)
+                if cached_sql:
+                    yield ("sql", cached_sql)
+                    return
+
             # Импорт OpenAI (опционально)
             try:
                 from kb_billing.rag.openai_client import build_openai_client
             except ImportError:
                 logger.warning("OpenAI библиотека не установлена. Установите: pip install openai")
-                return None
+                yield ("sql", None)
+                return
             
             # Получение контекста, если не передан
             if context is None:
@@ -684,9 +783,10 @@ class RAGAssistant:
             
             if not api_key:
                 logger.warning("OPENAI_API_KEY не установлен. Генерация SQL через LLM недоступна.")
-                return None
+                yield ("sql", None)
+                return
             
-            from kb_billing.rag.openai_client import build_openai_client
+            from kb_billing.rag.openai_client import build_openai_client, iter_chat_completion_text
 
             client = build_openai_client(api_key=api_key, api_base=api_base)
             
@@ -1058,19 +1158,28 @@ class RAGAssistant:
             
             # Получение температуры из конфигурации
             temperature = float(os.getenv("OPENAI_TEMPERATURE", "0.2"))
-            model_to_use = os.getenv("OPENAI_MODEL", model)
             
             # Генерация через LLM
+            completion_kwargs = dict(
+                model=model_to_use,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                temperature=temperature,
+                max_tokens=2000
+            )
             try:
-                response = client.chat.completions.create(
-                    model=model_to_use,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    temperature=temperature,
-                    max_tokens=2000
-                )
+                if stream:
+                    # Пользователь видит ответ с первого токена, SQL извлекается после завершения
+                    parts = []
+                    for delta in iter_chat_completion_text(client, **completion_kwargs):
+                        parts.append(delta)
+                        yield ("delta", delta)
+                    original_response = "".join(parts).strip()
+                else:
+                    response = client.chat.completions.create(**completion_kwargs)
+                    original_response = response.choices[0].message.content.strip()
             except Exception as api_error:
                 error_str = str(api_error)
                 # Проверка на ошибку 402 (недостаточно средств)
@@ -1085,7 +1194,6 @@ class RAGAssistant:
                     raise
             
             # Извлечение SQL из ответа
-            original_response = response.choices[0].message.content.strip()
             sql = original_response
             
             # Очистка SQL от markdown форматирования, если есть
@@ -1334,7 +1442,9 @@ class RAGAssistant:
             logger.info(f"Сгенерирован SQL через LLM: {sql[:100]}...")
             sql = ensure_fetch_limit(sql, question)
             sql = optimize_revenue_topn_query(sql, question)
-            return sql
+            if answer_cache is not None:
+                answer_cache.store(cache_scope, cache_vector, cache_key, sql)
+            yield ("sql", sql)
             
         except Exception as e:
             logger.error(f"Ошибка при генерации SQL через LLM: {e}")
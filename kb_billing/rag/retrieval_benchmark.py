@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Офлайн-бенчмарк поиска по KB_billing: качество (recall@k, MRR) и задержки (p50/p95).
+
+Вопросы training_data/sql_examples.json делятся детерминированно (SHA-1 вопроса)
+на обучающие и отложенные. KB строится тем же KBLoader.load_all в Qdrant в памяти
+процесса (без сервера и сети, модель эмбеддингов - из локального кэша HF) без
+отложенных примеров, затем каждый отложенный вопрос ищется через
+RAGAssistant.search_similar_examples в режимах vector / hybrid.
+
+Релевантный пример - обучающий пример, SQL которого обращается к тому же набору
+таблиц/представлений, что и эталонный SQL отложенного вопроса. Вопросы, для которых
+в обучающей части нет релевантных примеров, в recall/MRR не входят.
+
+Опционально (--sample-db) эталонный SQL и SQL лучшего найденного примера выполняются
+в SQLite с выборкой данных (файл .db или каталог CSV - таблица на файл) и
+сравниваются наборы строк, как в benchmark_oracle_example.compare_oracle_results.
+
+Запуск из корня проекта:
+  python -m kb_billing.rag.retrieval_benchmark --k 1 3 5 --modes vector hybrid
+  python -m kb_billing.rag.retrieval_benchmark --sample-db sample_data/ --json bench.json
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+project_root = Path(__file__).parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+logger = logging.getLogger(__name__)
+
+KB_DIR = Path(__file__).parent.parent
+COLLECTION = "kb_billing_benchmark"
+
+_TABLE_RE = re.compile(r"\b(?:FROM|JOIN)\s+([A-Za-z_][A-Za-z0-9_$#]*(?:\.[A-Za-z_][A-Za-z0-9_$#]*)?)", re.IGNORECASE)
+_CTE_RE = re.compile(r"(?:\bWITH|,)\s*([A-Za-z_][A-Za-z0-9_]*)\s+AS\s*\(", re.IGNORECASE)
+
+
+def split_examples(
+    examples: Sequence[Dict[str, Any]],
+    holdout_fraction: float = 0.2,
+    seed: str = "",
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """(обучающие, отложенные): доля отложенных ~holdout_fraction, разбиение не зависит от порядка примеров"""
+    train, holdout = [], []
+    for example in examples:
+        digest = hashlib.sha1((seed + (example.get("question") or "").strip()).encode("utf-8")).hexdigest()
+        bucket = int(digest[:8], 16) / 0xFFFFFFFF
+        (holdout if bucket < holdout_fraction else train).append(example)
+    return train, holdout
+
+
+def sql_tables(sql: str) -> FrozenSet[str]:
+    """Таблицы и представления SQL (FROM/JOIN, без схемы, CTE и DUAL) в верхнем регистре"""
+    ctes = {name.upper() for name in _CTE_RE.findall(sql or "")}
+    tables = set()
+    for name in _TABLE_RE.findall(sql or ""):
+        name = name.split(".")[-1].upper()
+        if name not in ctes and name != "DUAL":
+            tables.add(name)
+    return frozenset(tables)
+
+
+def first_relevant_rank(retrieved_sqls: Sequence[str], gold_tables: FrozenSet[str]) -> Optional[int]:
+    """Ранг (с 1) первого найденного примера с тем же набором таблиц, что у эталона"""
+    for rank, sql in enumerate(retrieved_sqls, 1):
+        if sql_tables(sql) == gold_tables:
+            return rank
+    return None
+
+
+def percentile_ms(seconds: Sequence[float], p: float) -> float:
+    return round(float(np.percentile(np.asarray(seconds) * 1000.0, p)), 2) if seconds else 0.0
+
+
+def quality_metrics(ranks: Sequence[Optional[int]], k_values: Sequence[int]) -> Dict[str, float]:
+    """recall@k (доля вопросов с релевантным примером в top-k) и MRR"""
+    if not ranks:
+        return {**{f"recall@{k}": 0.0 for k in k_values}, "mrr": 0.0}
+    metrics = {
+        f"recall@{k}": round(sum(1 for r in ranks if r is not None and r <= k) / len(ranks), 3)
+        for k in k_values
+    }
+    metrics["mrr"] = round(sum(1.0 / r for r in ranks if r is not None) / len(ranks), 3)
+    return metrics
+
+
+# --- Сравнение наборов строк в SQLite с выборкой данных ---
+
+def oracle_to_sqlite(sql: str) -> str:
+    """Минимальная адаптация Oracle SQL для SQLite (FETCH FIRST, NVL); остальное выполняется как есть"""
+    sql = (sql or "").strip().rstrip(";").strip()
+    sql = re.sub(r"\bFETCH\s+(?:FIRST|NEXT)\s+(\d+)\s+ROWS?\s+ONLY\b", r"LIMIT \1", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\bNVL\s*\(", "IFNULL(", sql, flags=re.IGNORECASE)
+    return sql
+
+
+def load_sample_db(path: Path) -> sqlite3.Connection:
+    """SQLite с выборкой данных: файл БД или каталог CSV (имя файла - имя таблицы, первая строка - колонки)"""
+    path = Path(path)
+    if path.is_file():
+        return sqlite3.connect(str(path))
+    conn = sqlite3.connect(":memory:")
+    for csv_file in sorted(path.glob("*.csv")):
+        with open(csv_file, "r", encoding="utf-8", newline="") as f:
+            rows = list(csv.reader(f))
+        if not rows:
+            continue
+        columns = ", ".join(f'"{c}"' for c in rows[0])
+        conn.execute(f'CREATE TABLE "{csv_file.stem.upper()}" ({columns})')
+        conn.executemany(
+            f'INSERT INTO "{csv_file.stem.upper()}" VALUES ({", ".join("?" * len(rows[0]))})',
+            rows[1:],
+        )
+    conn.commit()
+    return conn
+
+
+def compare_result_sets(conn: sqlite3.Connection, expected_sql: str, actual_sql: str) -> Optional[bool]:
+    """True/False - наборы строк (без учета порядка) совпали/нет; None - SQL не выполняется в SQLite"""
+    try:
+        expected = conn.execute(oracle_to_sqlite(expected_sql)).fetchall()
+        actual = conn.execute(oracle_to_sqlite(actual_sql)).fetchall()
+    except sqlite3.Error as e:
+        logger.debug("SQL не выполняется в SQLite: %s", e)
+        return None
+    return sorted(tuple(str(v) for v in row) for row in expected) == sorted(tuple(str(v) for v in row) for row in actual)
+
+
+# --- Прогон ---
+
+def run_benchmark(
+    assistant,
+    holdout: Sequence[Dict[str, Any]],
+    k_values: Sequence[int] = (1, 3, 5),
+    modes: Sequence[str] = ("vector", "hybrid"),
+    sample_db: Optional[sqlite3.Connection] = None,
+    train: Optional[Sequence[Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    """Метрики по режимам поиска: {mode: {recall@k, mrr, латентности, ...}}
+
+    assistant - RAGAssistant (или совместимый объект: _embed_query, search_similar_examples);
+    train - обучающие примеры: вопросы без релевантных среди них не оцениваются
+    """
+    limit = max(k_values)
+    train_tables = {sql_tables(e.get("sql") or "") for e in train} if train is not None else None
+    report: Dict[str, Any] = {}
+    for mode in modes:
+        # Первый поиск строит BM25-индекс - в задержки не входит
+        if holdout:
+            assistant.search_similar_examples(holdout[0]["question"], limit=limit, mode=mode)
+        ranks: List[Optional[int]] = []
+        embed_times, search_times = [], []
+        no_relevant = 0
+        equivalence = {"equal": 0, "different": 0, "not_executable": 0}
+        for example in holdout:
+            question = example["question"]
+            started = time.perf_counter()
+            query_vector = assistant._embed_query(question)
+            embedded = time.perf_counter()
+            found = assistant.search_similar_examples(question, limit=limit, mode=mode, query_vector=query_vector)
+            searched = time.perf_counter()
+            embed_times.append(embedded - started)
+            search_times.append(searched - embedded)
+
+            retrieved_sqls = [e.get("sql") or "" for e in found]
+            gold_tables = sql_tables(example.get("sql") or "")
+            if not gold_tables or (train_tables is not None and gold_tables not in train_tables):
+                no_relevant += 1
+            else:
+                ranks.append(first_relevant_rank(retrieved_sqls, gold_tables))
+            if sample_db is not None and retrieved_sqls:
+                same = compare_result_sets(sample_db, example.get("sql") or "", retrieved_sqls[0])
+                equivalence["not_executable" if same is None else ("equal" if same else "different")] += 1
+
+        result = quality_metrics(ranks, k_values)
+        result.update({
+            "questions": len(holdout),
+            "evaluated": len(ranks),
+            "no_relevant": no_relevant,
+            "embed_p50_ms": percentile_ms(embed_times, 50),
+            "embed_p95_ms": percentile_ms(embed_times, 95),
+            "search_p50_ms": percentile_ms(search_times, 50),
+            "search_p95_ms": percentile_ms(search_times, 95),
+        })
+        if sample_db is not None:
+            result["result_set_top1"] = equivalence
+        report[mode] = result
+    return report
+
+
+def prepare_kb_dir(kb_dir: Path, train: Sequence[Dict[str, Any]], work_dir: Path, with_confluence: bool = False) -> Path:
+    """Копия KB для загрузки: таблицы, представления, метаданные и только обучающие Q/A примеры"""
+    (work_dir / "training_data").mkdir(parents=True, exist_ok=True)
+    with open(work_dir / "training_data" / "sql_examples.json", "w", encoding="utf-8") as f:
+        json.dump(list(train), f, ensure_ascii=False)
+    dirs = ["tables", "views"] + (["confluence_docs"] if with_confluence else [])
+    for name in dirs:
+        if (kb_dir / name).is_dir():
+            shutil.copytree(kb_dir / name, work_dir / name)
+    if (kb_dir / "metadata.json").exists():
+        shutil.copy(kb_dir / "metadata.json", work_dir / "metadata.json")
+    return work_dir
+
+
+def print_report(report: Dict[str, Any], k_values: Sequence[int]) -> None:
+    columns = [f"recall@{k}" for k in k_values] + [
+        "mrr", "embed_p50_ms", "embed_p95_ms", "search_p50_ms", "search_p95_ms",
+    ]
+    print(f"{'режим':<8} " + " ".join(f"{c:>14}" for c in columns))
+    for mode, metrics in report.items():
+        print(f"{mode:<8} " + " ".join(f"{metrics[c]:>14}" for c in columns))
+    for mode, metrics in report.items():
+        line = f"{mode}: вопросов {metrics['questions']}, оценено {metrics['evaluated']}"
+        if "result_set_top1" in metrics:
+            line += f", наборы строк top-1: {metrics['result_set_top1']}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк поиска по KB_billing (Qdrant в памяти)")
+    parser.add_argument("--kb-dir", type=Path, default=KB_DIR, help="Каталог kb_billing (по умолчанию: рядом с модулем)")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Доля отложенных вопросов (по умолчанию: 0.2)")
+    parser.add_argument("--seed", default="", help="Соль разбиения на обучающие/отложенные")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5], help="Значения k для recall@k")
+    parser.add_argument("--modes", nargs="+", default=["vector", "hybrid"], choices=["vector", "hybrid"])
+    parser.add_argument("--model", default=None, help="Модель эмбеддингов (по умолчанию SQL4AConfig.EMBEDDING_MODEL)")
+    parser.add_argument("--sample-db", type=Path, default=None, help="SQLite-файл или каталог CSV для сравнения наборов строк")
+    parser.add_argument("--with-confluence", action="store_true", help="Загружать и confluence_docs (медленнее)")
+    parser.add_argument("--json", type=Path, default=None, help="Сохранить метрики в JSON")
+    args = parser.parse_args()
+
+    # Без сети: модель только из локального кэша; эмбеддинги вопросов не из кэша - замеряется модель
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    logging.basicConfig(level=logging.WARNING)
+
+    from qdrant_client import QdrantClient
+    from kb_billing.rag.kb_loader import KBLoader
+    from kb_billing.rag.rag_assistant import RAGAssistant
+
+    with open(args.kb_dir / "training_data" / "sql_examples.json", "r", encoding="utf-8") as f:
+        examples = json.load(f)
+    train, holdout = split_examples(examples, args.holdout, args.seed)
+    print(f"Примеров: {len(examples)}, обучающих {len(train)}, отложенных {len(holdout)}")
+
+    client = QdrantClient(":memory:")
+    with tempfile.TemporaryDirectory(prefix="kb_benchmark_") as tmp:
+        kb_dir = prepare_kb_dir(args.kb_dir, train, Path(tmp), args.with_confluence)
+        started = time.perf_counter()
+        loader = KBLoader(client=client, collection_name=COLLECTION, embedding_model=args.model, kb_dir=kb_dir)
+        loader.load_all(recreate=True)
+        print(f"KB загружена в Qdrant (в памяти) за {time.perf_counter() - started:.1f} с")
+
+    assistant = RAGAssistant(client=client, collection_name=COLLECTION, embedding_model=args.model)
+    assistant.embedding_cache = None
+    sample_db = load_sample_db(args.sample_db) if args.sample_db else None
+    report = run_benchmark(assistant, holdout, args.k, args.modes, sample_db, train)
+    print_report(report, args.k)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Метрики сохранены в {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,8 +10,9 @@
 - GEMINI_BASE_URL — по умолчанию https://api.proxyapi.ru/google
 """
 import os
+import json
 import logging
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -112,9 +113,7 @@ class SatelliteLibrarianAgent:
             )
         return self._http_client
 
-    def _ask_via_rest(self, full_prompt: str, system_instruction: Optional[str] = None) -> str:
-        """Вызов generateContent через REST (ProxyAPI.ru). system_instruction переопределяет self.system_prompt при необходимости."""
-        client = self._get_http_client()
+    def _rest_request_data(self, full_prompt: str, system_instruction: Optional[str] = None) -> Dict[str, Any]:
         request_data: Dict[str, Any] = {
             "contents": [{"parts": [{"text": full_prompt}]}],
             "generationConfig": {
@@ -123,6 +122,12 @@ class SatelliteLibrarianAgent:
             },
         }
         request_data["systemInstruction"] = {"parts": [{"text": (system_instruction or self.system_prompt)}]}
+        return request_data
+
+    def _ask_via_rest(self, full_prompt: str, system_instruction: Optional[str] = None) -> str:
+        """Вызов generateContent через REST (ProxyAPI.ru). system_instruction переопределяет self.system_prompt при необходимости."""
+        client = self._get_http_client()
+        request_data = self._rest_request_data(full_prompt, system_instruction)
         endpoint = f"/v1beta/models/{self.model}:generateContent"
         try:
             response = client.post(endpoint, json=request_data)
@@ -141,6 +146,32 @@ class SatelliteLibrarianAgent:
         text = (parts[0].get("text") or "").strip()
         return text or "Пустой ответ модели."
 
+    def _stream_via_rest(self, full_prompt: str, system_instruction: Optional[str] = None) -> Iterator[str]:
+        """streamGenerateContent через REST (SSE, alt=sse): текст ответа по частям."""
+        client = self._get_http_client()
+        request_data = self._rest_request_data(full_prompt, system_instruction)
+        endpoint = f"/v1beta/models/{self.model}:streamGenerateContent"
+        received = False
+        try:
+            with client.stream("POST", endpoint, params={"alt": "sse"}, json=request_data) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = json.loads(line[5:].strip() or "{}")
+                    for candidate in data.get("candidates", []) or []:
+                        for part in (candidate.get("content", {}) or {}).get("parts", []) or []:
+                            text = part.get("text")
+                            if text:
+                                received = True
+                                yield text
+        except Exception as e:
+            logger.exception("Ошибка вызова Gemini (REST, stream): %s", e)
+            yield f"Ошибка при обращении к модели: {e}"
+            return
+        if not received:
+            yield "Пустой ответ модели. Попробуйте переформулировать вопрос."
+
     def _get_client_sdk(self):
         """Ленивая инициализация клиента google-genai (только если не используем REST)."""
         try:
@@ -268,17 +299,14 @@ class SatelliteLibrarianAgent:
             parts.append(head + content)
         return "\n\n---\n\n".join(parts)
 
-    def ask(
+    def _build_prompt(
         self,
         user_message: str,
         use_rag: bool = True,
         rag_query: Optional[str] = None,
         history: Optional[List[Tuple[str, str]]] = None,
     ) -> str:
-        """
-        Задать вопрос библиотекарю. При use_rag=True в контекст подмешиваются релевантные чанки из KB.
-        history: список пар (role, text), role — "user" (инженер) или "model" (библиотекарь), для многократного обмена уточнениями.
-        """
+        """Промпт для Gemini: фрагменты KB, история диалога и сообщение инженера."""
         context_parts = []
 
         if use_rag and self.rag_assistant:
@@ -310,21 +338,38 @@ class SatelliteLibrarianAgent:
             "[Конец системной инструкции. Далее — контекст и очередное сообщение пользователя.]\n\n"
             + user_content
         )
+        return full_prompt
+
+    def _sdk_kwargs(self, full_prompt: str) -> Dict[str, Any]:
+        kwargs = {"model": self.model, "contents": full_prompt}
+        try:
+            from google.genai import types
+            kwargs["config"] = types.GenerateContentConfig(
+                temperature=0.3,
+                max_output_tokens=4096,
+            )
+        except (ImportError, AttributeError):
+            pass
+        return kwargs
+
+    def ask(
+        self,
+        user_message: str,
+        use_rag: bool = True,
+        rag_query: Optional[str] = None,
+        history: Optional[List[Tuple[str, str]]] = None,
+    ) -> str:
+        """
+        Задать вопрос библиотекарю. При use_rag=True в контекст подмешиваются релевантные чанки из KB.
+        history: список пар (role, text), role — "user" (инженер) или "model" (библиотекарь), для многократного обмена уточнениями.
+        """
+        full_prompt = self._build_prompt(user_message, use_rag=use_rag, rag_query=rag_query, history=history)
         # По умолчанию используем ProxyAPI.ru через REST (как в brats)
         if self.base_url and httpx:
             return self._ask_via_rest(full_prompt)
         try:
             client = self._get_client_sdk()
-            kwargs = {"model": self.model, "contents": full_prompt}
-            try:
-                from google.genai import types
-                kwargs["config"] = types.GenerateContentConfig(
-                    temperature=0.3,
-                    max_output_tokens=4096,
-                )
-            except (ImportError, AttributeError):
-                pass
-            response = client.models.generate_content(**kwargs)
+            response = client.models.generate_content(**self._sdk_kwargs(full_prompt))
         except Exception as e:
             logger.exception("Ошибка вызова Gemini: %s", e)
             return f"Ошибка при обращении к модели: {e}"
@@ -339,6 +384,36 @@ class SatelliteLibrarianAgent:
                 return (getattr(p, "text", None) or str(p)).strip()
         return "Пустой ответ модели."
 
+    def ask_stream(
+        self,
+        user_message: str,
+        use_rag: bool = True,
+        rag_query: Optional[str] = None,
+        history: Optional[List[Tuple[str, str]]] = None,
+    ) -> Iterator[str]:
+        """
+        То же, что ask, но текст ответа отдается частями по мере генерации (для SSE в voice_chat).
+        Ошибки модели, как и в ask, приходят текстом ответа.
+        """
+        full_prompt = self._build_prompt(user_message, use_rag=use_rag, rag_query=rag_query, history=history)
+        if self.base_url and httpx:
+            yield from self._stream_via_rest(full_prompt)
+            return
+        received = False
+        try:
+            client = self._get_client_sdk()
+            for chunk in client.models.generate_content_stream(**self._sdk_kwargs(full_prompt)):
+                text = getattr(chunk, "text", None)
+                if text:
+                    received = True
+                    yield text
+        except Exception as e:
+            logger.exception("Ошибка вызова Gemini (stream): %s", e)
+            yield f"Ошибка при обращении к модели: {e}"
+            return
+        if not received:
+            yield "Пустой ответ модели."
+
     def suggest_what_to_index(self, space_or_pages_description: str) -> str:
         """Рекомендации: что имеет смысл индексировать в KB для заданного пространства или списка страниц."""
         prompt = (
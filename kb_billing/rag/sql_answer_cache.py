@@ -0,0 +1,253 @@
+"""
+Семантический кэш ответов generate_sql_with_llm.
+
+Ежемесячные отчеты («топ-5 IMEI по доходу за октябрь 2025») отличаются только
+периодом и N. Вопрос нормализуется (период и топ-N заменяются метками), его
+эмбеддинг сравнивается с сохраненными; при сходстве не ниже порога и
+подставляемых параметрах SQL берется из кэша с новым периодом и N - без RAG
+и LLM. Записи живут SQL_CACHE_TTL секунд и сбрасываются после загрузки KB -
+в этом процессе или в другом (init_kb, kb_expansion_agent): table_index.kb_version().
+Счетчики hit/miss - в stats().
+"""
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from kb_billing.rag import table_index
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIMILARITY = 0.97
+DEFAULT_TTL = 24 * 3600
+DEFAULT_MAX_ENTRIES = 500
+
+# Только падежные формы месяцев: «майнинг», «маяк», «мартовский» - не период
+_SOFT = r"(?:[ьяею]|[её]м)"
+_MONTHS = (
+    ("январ" + _SOFT, "01"), ("феврал" + _SOFT, "02"), ("март(?:[ауе]|ом)?", "03"), ("апрел" + _SOFT, "04"),
+    ("ма(?:[йяею]|ем)", "05"), ("июн" + _SOFT, "06"), ("июл" + _SOFT, "07"), ("август(?:[ауе]|ом)?", "08"),
+    ("сентябр" + _SOFT, "09"), ("октябр" + _SOFT, "10"), ("ноябр" + _SOFT, "11"), ("декабр" + _SOFT, "12"),
+)
+_MONTH_RE = re.compile(r"\b(?:" + "|".join(form for form, _ in _MONTHS) + r")\b", re.IGNORECASE)
+_YEAR_RE = re.compile(r"(?<!\d)(20\d{2})(?![\d-])")
+_ISO_PERIOD_RE = re.compile(r"(?<!\d)(20\d{2})-(0[1-9]|1[0-2])(?!\d)")
+# Числа и порядковые слова вне параметров должны совпадать точно («Q3 2024» != «Q3 2025»)
+_LITERAL_RE = re.compile(r"\d+|\b(?:перв|втор|трет|четв[её]рт|полуго)[а-яё]*", re.IGNORECASE)
+# Год в SQL вне подставляемого литерала периода - период задан еще где-то (TO_DATE, BETWEEN ...)
+_SQL_YEAR_RE = re.compile(r"(?<!\d)(?:19|20)\d{2}(?!\d)")
+
+_PERIOD_MARK = "\x00period\x00"
+_TOP_N_MARK = "\x00top_n\x00"
+
+
+class QuestionKey(NamedTuple):
+    """Нормализованный вопрос, параметры (period 'YYYY-MM', top_n) и литералы вне параметров"""
+    text: str
+    params: Dict[str, Any]
+    literals: Tuple[str, ...]
+
+
+def _month_number(word: str) -> str:
+    for form, number in _MONTHS:
+        if re.fullmatch(form, word, re.IGNORECASE):
+            return number
+    raise ValueError(word)
+
+
+def question_key(question: str, top_n: Optional[int] = None) -> QuestionKey:
+    """Ключ кэша вопроса; top_n - из extract_top_n_from_question"""
+    text = re.sub(r"\s+", " ", (question or "").strip().lower())
+    params: Dict[str, Any] = {}
+
+    iso = _ISO_PERIOD_RE.search(text)
+    month = _MONTH_RE.search(text)
+    year = _YEAR_RE.search(text)
+    if iso:
+        params["period"] = iso.group(0)
+        text = text[:iso.start()] + "<период>" + text[iso.end():]
+    elif month and year:
+        params["period"] = f"{year.group(1)}-{_month_number(month.group(0))}"
+        # Сначала правый фрагмент, чтобы не сдвинуть позиции левого
+        for span in sorted((month.span(), year.span()), reverse=True):
+            text = text[:span[0]] + "<период>" + text[span[1]:]
+        text = re.sub(r"<период>(\s*<период>)+", "<период>", text)
+
+    if top_n:
+        params["top_n"] = top_n
+        text = re.sub(rf"(?<!\d){top_n}(?!\d)", "N", text, count=1)
+
+    literals = tuple(m.group(0) for m in _LITERAL_RE.finditer(text))
+    return QuestionKey(text, params, literals)
+
+
+def make_template(sql: str, params: Dict[str, Any]) -> Optional[str]:
+    """SQL с метками вместо периода и N; None - параметры в SQL не найдены или заданы не только литералами"""
+    template = sql
+    period = params.get("period")
+    if period:
+        literal = f"'{period}'"
+        if literal not in template:
+            return None
+        template = template.replace(literal, f"'{_PERIOD_MARK}'")
+        if _SQL_YEAR_RE.search(template):
+            return None
+    top_n = params.get("top_n")
+    if top_n:
+        template, count = re.subn(
+            rf"\b(FETCH\s+(?:FIRST|NEXT)\s+){top_n}(\s+ROWS\b)|\b(ROWNUM\s*<=\s*){top_n}\b",
+            lambda m: f"{m.group(1)}{_TOP_N_MARK}{m.group(2)}" if m.group(1) else f"{m.group(3)}{_TOP_N_MARK}",
+            template,
+            flags=re.IGNORECASE,
+        )
+        if not count:
+            return None
+    return template
+
+
+def render_template(template: str, params: Dict[str, Any]) -> str:
+    sql = template
+    if "period" in params:
+        sql = sql.replace(_PERIOD_MARK, params["period"])
+    if "top_n" in params:
+        sql = sql.replace(_TOP_N_MARK, str(params["top_n"]))
+    return sql
+
+
+class SQLAnswerCache:
+    """Кэш SQL по эмбеддингу нормализованного вопроса (в памяти процесса, доступ под блокировкой)"""
+
+    def __init__(
+        self,
+        similarity: float = DEFAULT_SIMILARITY,
+        ttl: int = DEFAULT_TTL,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        self.similarity = similarity
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # Похожий вопрос найден, но параметры не подставить - ушли в LLM
+        self.rejected = 0
+        self._entries: List[Dict[str, Any]] = []
+        self._kb_version = table_index.kb_version()
+        self._lock = threading.Lock()
+
+    def _drop_stale(self) -> None:
+        current = table_index.kb_version()
+        if current != self._kb_version:
+            if self._entries:
+                logger.info("Кэш SQL: KB перезагружена, сброшено %s записей", len(self._entries))
+            self._entries = []
+            self._kb_version = current
+            return
+        deadline = time.monotonic() - self.ttl
+        self._entries = [e for e in self._entries if e["created_at"] > deadline]
+
+    def lookup(self, scope: str, vector, key: QuestionKey) -> Optional[str]:
+        """SQL похожего вопроса с подставленными параметрами key или None.
+        scope - коллекция и модель LLM: ответы разных моделей не смешиваются."""
+        query = np.asarray(vector, dtype=np.float32)
+        query_norm = float(np.linalg.norm(query)) or 1.0
+        with self._lock:
+            self._drop_stale()
+            candidates = [
+                e for e in self._entries
+                if e["scope"] == scope and e["literals"] == key.literals and e["params"].keys() == key.params.keys()
+            ]
+            best, best_score = None, -1.0
+            for entry in candidates:
+                score = float(np.dot(entry["vector"], query)) / (entry["norm"] * query_norm)
+                if score > best_score:
+                    best, best_score = entry, score
+            if best is None or best_score < self.similarity:
+                self.misses += 1
+                return None
+            if best["params"] == key.params:
+                sql = best["sql"]
+            elif best["template"] is not None:
+                sql = render_template(best["template"], key.params)
+            else:
+                self.rejected += 1
+                self.misses += 1
+                return None
+            best["last_used"] = time.monotonic()
+            self.hits += 1
+            total = self.hits + self.misses
+            logger.info(
+                "Кэш SQL: ответ по сходству %.3f (параметры %s -> %s), hit rate %.2f",
+                best_score, best["params"], key.params, self.hits / total,
+            )
+            return sql
+
+    def store(self, scope: str, vector, key: QuestionKey, sql: str) -> None:
+        vector = np.asarray(vector, dtype=np.float32)
+        entry = {
+            "scope": scope,
+            "vector": vector,
+            "norm": float(np.linalg.norm(vector)) or 1.0,
+            "text": key.text,
+            "params": dict(key.params),
+            "literals": key.literals,
+            "sql": sql,
+            "template": make_template(sql, key.params),
+            "created_at": time.monotonic(),
+            "last_used": time.monotonic(),
+        }
+        with self._lock:
+            self._drop_stale()
+            # Тот же нормализованный вопрос с теми же параметрами - заменяем ответ
+            self._entries = [
+                e for e in self._entries
+                if not (e["scope"] == scope and e["text"] == key.text and e["params"] == key.params)
+            ]
+            self._entries.append(entry)
+            excess = len(self._entries) - self.max_entries
+            if excess > 0:
+                self._entries.sort(key=lambda e: e["last_used"])
+                del self._entries[:excess]
+
+    def stats(self) -> Dict[str, float]:
+        """Счетчики hit/miss процесса и число записей в кэше"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "rejected": self.rejected,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries = []
+            self.hits = self.misses = self.rejected = 0
+
+
+_cache: Optional[SQLAnswerCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_sql_answer_cache() -> Optional[SQLAnswerCache]:
+    """Общий кэш процесса (SQL_CACHE_SIMILARITY, SQL_CACHE_TTL, SQL_CACHE_MAX_ENTRIES).
+    SQL_CACHE=0 - кэш выключен (None)."""
+    global _cache
+    if os.getenv("SQL_CACHE", "1").strip().lower() in ("0", "false", "no", "off"):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = SQLAnswerCache(
+                similarity=float(os.getenv("SQL_CACHE_SIMILARITY", str(DEFAULT_SIMILARITY))),
+                ttl=int(os.getenv("SQL_CACHE_TTL", str(DEFAULT_TTL))),
+                max_entries=int(os.getenv("SQL_CACHE_MAX_ENTRIES", str(DEFAULT_MAX_ENTRIES))),
+            )
+        return _cache
@@ -167,12 +167,25 @@ def show_assistant_tab():
                     
                     if api_key:
                         try:
-                            generated_sql = assistant.generate_sql_with_llm(
+                            # Ответ LLM выводится по мере генерации, SQL извлекается после завершения
+                            llm_events = assistant.stream_sql_with_llm(
                                 question=question,
                                 context=context,
                                 api_key=api_key,
                                 api_base=api_base
                             )
+                            llm_result = {}
+
+                            def _llm_deltas():
+                                for kind, value in llm_events:
+                                    if kind == "delta":
+                                        yield value
+                                    else:
+                                        llm_result["sql"] = value
+
+                            with st.expander("🧠 Ответ LLM", expanded=True):
+                                st.write_stream(_llm_deltas())
+                            generated_sql = llm_result.get("sql")
                             # Сохраняем сгенерированный SQL и вопрос
                             if generated_sql:
                                 st.session_state.last_generated_sql = generated_sql
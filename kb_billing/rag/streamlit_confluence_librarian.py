@@ -666,7 +666,12 @@ def show_confluence_librarian_tab():
                     # Тот же kb_dir, что и для списка документов (confluence_docs_dir), чтобы не разъезжаться при разделении доменов
                     loader = KBLoader(kb_dir=confluence_docs_dir.parent)
                     n = loader.reload_confluence_only()
-                    st.success(f"В Qdrant обновлено **{n}** чанков Confluence. Данные биллинга не изменялись.")
+                    sync = loader.last_confluence_sync
+                    st.success(
+                        f"В Qdrant **{n}** чанков Confluence: загружено {sync.get('upserted', 0)}, "
+                        f"без изменений {sync.get('unchanged', 0)}, удалено {sync.get('deleted', 0)}. "
+                        "Данные биллинга не изменялись."
+                    )
                     if n == 0 and _json_files:
                         st.warning(
                             "Загружено 0 чанков при наличии JSON. Проверьте: 1) все page_id не в outdated.txt? "
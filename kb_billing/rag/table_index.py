@@ -0,0 +1,118 @@
+"""
+Индекс метаданных таблиц и представлений KB в памяти процесса.
+
+Один scroll по точкам type=ddl/documentation/view вместо двух scroll на каждую
+таблицу в get_context_for_sql_generation. Индекс перечитывается после
+загрузки KB в этом процессе (invalidate() из KBLoader) и по TTL - если KB
+перезагружена другим процессом. invalidate() также обновляет файл-отметку
+загрузки KB (kb_stamp()) - по ней загрузку в другом процессе (init_kb,
+kb_expansion_agent) видят кэши, живущие дольше TTL индекса.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from qdrant_client.models import Filter, FieldCondition, MatchAny
+
+logger = logging.getLogger(__name__)
+
+TABLE_INDEX_TTL = int(os.getenv("TABLE_INDEX_TTL", "600"))
+# Отметка загрузки KB, общая для процессов на одной машине (kb_billing/, рядом с KB)
+KB_STAMP_PATH = Path(os.getenv("KB_STAMP_PATH") or Path(__file__).resolve().parent.parent / "kb_loaded.stamp")
+
+# Поколение KB процесса: увеличивается при загрузке KB, индексы с другим поколением перечитываются
+_generation = 0
+_generation_lock = threading.Lock()
+
+
+def invalidate() -> None:
+    """Сбросить индексы KB всех RAGAssistant процесса - таблиц и BM25 (после загрузки KB)."""
+    global _generation
+    with _generation_lock:
+        _generation += 1
+    try:
+        KB_STAMP_PATH.touch()
+    except OSError as e:
+        logger.warning("Не удалось обновить отметку загрузки KB %s: %s", KB_STAMP_PATH, e)
+
+
+def generation() -> int:
+    return _generation
+
+
+def kb_stamp() -> int:
+    """Время последней загрузки KB любым процессом (mtime отметки, нс); 0 - отметки нет."""
+    try:
+        return KB_STAMP_PATH.stat().st_mtime_ns
+    except OSError:
+        return 0
+
+
+def kb_version() -> Tuple[int, int]:
+    """Поколение KB процесса и отметка загрузки KB на диске"""
+    return generation(), kb_stamp()
+
+
+class TableIndex:
+    """table_name/view_name -> {"ddl": payload, "documentation": payload, "view": payload}"""
+
+    def __init__(self, client, collection_name: str, ttl: int = TABLE_INDEX_TTL):
+        self.client = client
+        self.collection_name = collection_name
+        self.ttl = ttl
+        self._entries: Optional[Dict[str, Dict[str, Dict[str, Any]]]] = None
+        self._loaded_at = 0.0
+        self._generation = -1
+        self._lock = threading.Lock()
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._entries is not None
+            and self._generation == generation()
+            and time.monotonic() - self._loaded_at < self.ttl
+        )
+
+    def _load(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        started = time.perf_counter()
+        entries: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=Filter(
+                    must=[FieldCondition(key="type", match=MatchAny(any=["ddl", "documentation", "view"]))]
+                ),
+                limit=1000,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False,
+            )
+            for point in points:
+                payload = point.payload or {}
+                doc_type = payload.get("type")
+                name = payload.get("view_name") if doc_type == "view" else payload.get("table_name")
+                if name:
+                    entries.setdefault(name, {}).setdefault(doc_type, payload)
+            if offset is None:
+                break
+        logger.info(
+            "Индекс таблиц KB: %s таблиц/представлений за %.2f с", len(entries), time.perf_counter() - started
+        )
+        return entries
+
+    def get(self, name: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Записи по имени таблицы/представления (точное имя, затем в верхнем регистре)."""
+        if not self._is_fresh():
+            with self._lock:
+                if not self._is_fresh():
+                    current = generation()
+                    self._entries = self._load()
+                    self._generation = current
+                    self._loaded_at = time.monotonic()
+        entries = self._entries
+        return entries.get(name) or entries.get(name.upper())
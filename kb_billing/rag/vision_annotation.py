@@ -10,12 +10,17 @@
 - GEMINI_BASE_URL (по умолчанию https://api.proxyapi.ru/google)
 - GEMINI_VISION_MODEL или GEMINI_MODEL (например gemini-2.0-flash)
 - USE_GEMINI_FOR_IMAGES=true — включать аннотацию изображений при индексации (если не задано, аннотация всё равно пробуется при наличии ключа)
+- VISION_CACHE=0 — не использовать кэш аннотаций (см. annotation_cache), VISION_CACHE_PATH — путь к БД кэша
+- GEMINI_MAX_CONNECTIONS — соединений в общем HTTP-клиенте (по умолчанию 8)
 """
 import base64
 import logging
 import os
+import threading
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+from kb_billing.rag.annotation_cache import get_annotation_cache
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +42,65 @@ def _load_config():
         pass
 _load_config()
 
+# Версии промптов — часть ключа кэша аннотаций: изменили текст промпта — увеличьте версию
+IMAGE_PROMPT_VERSION = "1"
+DRAWIO_PROMPT_VERSION = "1"
+
+_http_clients: Dict[Tuple[str, str], Any] = {}
+_http_lock = threading.Lock()
+
+
+def _gemini_settings() -> Tuple[Optional[str], str, str]:
+    """(api_key, base_url, model) из окружения."""
+    api_key = os.getenv("GEMINI_API_KEY") or os.getenv("OPENAI_API_KEY")
+    base_url = (os.getenv("GEMINI_BASE_URL") or "https://api.proxyapi.ru/google").rstrip("/")
+    model = os.getenv("GEMINI_VISION_MODEL") or os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+    return api_key, base_url, model
+
+
+def _get_http_client(base_url: str, api_key: str):
+    """Общий httpx.Client на (base_url, ключ): keep-alive соединения переиспользуются между вызовами и потоками."""
+    with _http_lock:
+        client = _http_clients.get((base_url, api_key))
+        if client is None:
+            max_connections = int(os.getenv("GEMINI_MAX_CONNECTIONS", "8"))
+            client = httpx.Client(
+                base_url=base_url,
+                timeout=120.0,
+                headers={
+                    "Authorization": f"Bearer {api_key}",
+                    "Content-Type": "application/json",
+                },
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            )
+            _http_clients[(base_url, api_key)] = client
+        return client
+
+
+def _generate_content(
+    parts: List[Dict[str, Any]], max_tokens: int, api_key: str, base_url: str, model: str
+) -> Optional[str]:
+    """Запрос generateContent; первый непустой текст ответа. Ошибки HTTP пробрасываются."""
+    request_body: Dict[str, Any] = {
+        "contents": [{"parts": parts}],
+        "generationConfig": {
+            "temperature": 0.2,
+            "maxOutputTokens": max_tokens,
+        },
+    }
+    response = _get_http_client(base_url, api_key).post(
+        f"/v1beta/models/{model}:generateContent", json=request_body
+    )
+    response.raise_for_status()
+    resp_data = response.json()
+    for cand in resp_data.get("candidates", []):
+        for part in cand.get("content", {}).get("parts", []):
+            if "text" in part:
+                text = (part.get("text") or "").strip()
+                if text:
+                    return text
+    return None
+
 
 def describe_image(
     data: bytes,
@@ -48,19 +112,23 @@ def describe_image(
     """
     Описание одного изображения/схемы через Gemini Vision (REST, ProxyAPI).
     Возвращает текст с описанием и смысловыми блоками или None при ошибке/отсутствии ключа.
+    Описание берётся из кэша аннотаций, если эти же байты уже описывались той же моделью.
     """
     if not data:
         return None
-    api_key = os.getenv("GEMINI_API_KEY") or os.getenv("OPENAI_API_KEY")
+    api_key, base_url, model = _gemini_settings()
     if not api_key:
         return None
     if not httpx:
         logger.warning("httpx не установлен — аннотация изображений недоступна")
         return None
-    base_url = (os.getenv("GEMINI_BASE_URL") or "https://api.proxyapi.ru/google").rstrip("/")
-    model = os.getenv("GEMINI_VISION_MODEL") or os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
     if os.getenv("USE_GEMINI_FOR_IMAGES", "true").lower() in ("0", "false", "no"):
         return None
+    cache = get_annotation_cache()
+    if cache is not None:
+        cached = cache.get("image", data, model, IMAGE_PROMPT_VERSION)
+        if cached:
+            return cached
     prompt_parts = [
         "Ты помогаешь инженерам спутникового сегмента описывать изображения для базы знаний.",
         "На изображении может быть: схема сети (VSAT, терминалы, антенны, модемы, iDirect, Kingsat и т.д.), диаграмма, скриншот конфигурации или инструкция.",
@@ -76,36 +144,14 @@ def describe_image(
     text_part = {"text": "\n".join(prompt_parts)}
     b64 = base64.b64encode(data).decode("utf-8")
     inline_part = {"inline_data": {"mime_type": mime_type, "data": b64}}
-    request_body: Dict[str, Any] = {
-        "contents": [{"parts": [text_part, inline_part]}],
-        "generationConfig": {
-            "temperature": 0.2,
-            "maxOutputTokens": max_tokens,
-        },
-    }
-    endpoint = f"/v1beta/models/{model}:generateContent"
     try:
-        with httpx.Client(
-            base_url=base_url,
-            timeout=120.0,
-            headers={
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json",
-            },
-        ) as client:
-            response = client.post(endpoint, json=request_body)
-            response.raise_for_status()
-            resp_data = response.json()
+        text = _generate_content([text_part, inline_part], max_tokens, api_key, base_url, model)
     except Exception as e:
         logger.warning("Gemini Vision аннотация изображения не удалась: %s", e)
         return None
-    for cand in resp_data.get("candidates", []):
-        for part in cand.get("content", {}).get("parts", []):
-            if "text" in part:
-                text = (part.get("text") or "").strip()
-                if text:
-                    return text
-    return None
+    if text and cache is not None:
+        cache.put("image", data, model, IMAGE_PROMPT_VERSION, text)
+    return text
 
 
 def is_vision_available() -> bool:
@@ -115,44 +161,30 @@ def is_vision_available() -> bool:
 
 def _gemini_generate_text(prompt: str, max_tokens: int = 2048) -> Optional[str]:
     """Один текстовый запрос к Gemini (generateContent, только text)."""
-    api_key = os.getenv("GEMINI_API_KEY") or os.getenv("OPENAI_API_KEY")
+    api_key, base_url, model = _gemini_settings()
     if not api_key or not httpx:
         return None
-    base_url = (os.getenv("GEMINI_BASE_URL") or "https://api.proxyapi.ru/google").rstrip("/")
-    model = os.getenv("GEMINI_VISION_MODEL") or os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
-    request_body: Dict[str, Any] = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {"temperature": 0.2, "maxOutputTokens": max_tokens},
-    }
-    endpoint = f"/v1beta/models/{model}:generateContent"
     try:
-        with httpx.Client(
-            base_url=base_url,
-            timeout=120.0,
-            headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
-        ) as client:
-            response = client.post(endpoint, json=request_body)
-            response.raise_for_status()
-            resp_data = response.json()
+        return _generate_content([{"text": prompt}], max_tokens, api_key, base_url, model)
     except Exception as e:
         logger.warning("Gemini text запрос не удался: %s", e)
         return None
-    for cand in resp_data.get("candidates", []):
-        for part in cand.get("content", {}).get("parts", []):
-            if "text" in part:
-                text = (part.get("text") or "").strip()
-                if text:
-                    return text
-    return None
 
 
 def describe_drawio_content(raw_drawio_text: str, context_text: Optional[str] = None) -> Optional[str]:
     """
     По извлечённому из draw.io тексту (подписи, узлы, связи) сформировать
     интеллектуальное описание схемы и смысловые блоки через Gemini.
+    Описание берётся из кэша аннотаций, если тот же текст схемы уже описывался той же моделью.
     """
     if not (raw_drawio_text or "").strip():
         return None
+    _, _, model = _gemini_settings()
+    cache = get_annotation_cache()
+    if cache is not None:
+        cached = cache.get("drawio", raw_drawio_text, model, DRAWIO_PROMPT_VERSION)
+        if cached:
+            return cached
     prompt_parts = [
         "Ниже приведён извлечённый из файла draw.io (схема/диаграмма) текст: подписи узлов, блоков, связей.",
         "Ты помогаешь инженерам спутникового сегмента. Сформируй на русском языке:",
@@ -163,4 +195,7 @@ def describe_drawio_content(raw_drawio_text: str, context_text: Optional[str] =
     if context_text:
         prompt_parts.insert(1, f"Контекст (страница/документ): {context_text[:500]}")
     prompt_parts.append("\nТекст из draw.io:\n" + (raw_drawio_text[:12000] or ""))
-    return _gemini_generate_text("\n".join(prompt_parts), max_tokens=2048)
+    text = _gemini_generate_text("\n".join(prompt_parts), max_tokens=2048)
+    if text and cache is not None:
+        cache.put("drawio", raw_drawio_text, model, DRAWIO_PROMPT_VERSION, text)
+    return text
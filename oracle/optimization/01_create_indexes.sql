@@ -76,6 +76,23 @@ CREATE INDEX IDX_SPNET_COMPOSITE_JOIN ON SPNET_TRAFFIC(
     BILL_MONTH
 );
 
+PROMPT ============================================================================
+PROMPT Индексы по файлу-источнику (перезагрузка файла)
+PROMPT ============================================================================
+
+-- Функциональные индексы для WHERE UPPER(SOURCE_FILE) = UPPER(:1)
+-- Используются загрузчиками при удалении старых записей файла и проверке полноты
+-- загрузки: стоимость перезагрузки зависит от размера файла, а не таблицы
+PROMPT Создание IDX_SPNET_SOURCE_FILE_UPPER...
+CREATE INDEX IDX_SPNET_SOURCE_FILE_UPPER ON SPNET_TRAFFIC(
+    UPPER(SOURCE_FILE)
+);
+
+PROMPT Создание IDX_STECCOM_SOURCE_FILE_UPPER...
+CREATE INDEX IDX_STECCOM_SOURCE_FILE_UPPER ON STECCOM_EXPENSES(
+    UPPER(SOURCE_FILE)
+);
+
 PROMPT ============================================================================
 PROMPT Индексы созданы успешно!
 PROMPT ============================================================================
@@ -0,0 +1,39 @@
+-- ============================================================================
+-- SPNET_TRAFFIC_STAGE - Промежуточная таблица для пакетной загрузки SPNet
+-- Назначение: Приём массива строк файла (executemany) перед переносом
+--             в SPNET_TRAFFIC одним INSERT ... SELECT с дедупликацией
+-- База данных: Oracle (production)
+-- ============================================================================
+-- Глобальная временная таблица: данные видны только своей сессии
+-- и очищаются автоматически при COMMIT.
+
+CREATE GLOBAL TEMPORARY TABLE SPNET_TRAFFIC_STAGE (
+    ROW_SEQ NUMBER,
+    TOTAL_ROWS NUMBER,
+    CONTRACT_ID VARCHAR2(50),
+    IMEI VARCHAR2(50),
+    SIM_ICCID VARCHAR2(50),
+    SERVICE VARCHAR2(100),
+    USAGE_TYPE VARCHAR2(100),
+    USAGE_BYTES NUMBER,
+    USAGE_UNIT VARCHAR2(20),
+    TOTAL_AMOUNT NUMBER(10,2),
+    BILL_MONTH NUMBER(6),
+    PLAN_NAME VARCHAR2(100),
+    IMSI VARCHAR2(50),
+    MSISDN VARCHAR2(50),
+    ACTUAL_USAGE NUMBER,
+    CALL_SESSION_COUNT NUMBER,
+    SP_ACCOUNT_NO NUMBER,
+    SP_NAME VARCHAR2(100),
+    SP_REFERENCE VARCHAR2(100),
+    SOURCE_FILE VARCHAR2(200),
+    LOAD_DATE DATE,
+    CREATED_BY VARCHAR2(50)
+) ON COMMIT DELETE ROWS;
+
+-- Комментарии
+COMMENT ON TABLE SPNET_TRAFFIC_STAGE IS 'Промежуточная таблица пакетной загрузки SPNet (GTT, очищается при COMMIT)';
+COMMENT ON COLUMN SPNET_TRAFFIC_STAGE.ROW_SEQ IS 'Порядковый номер строки в файле (для дедупликации внутри файла)';
+
+PROMPT Таблица SPNET_TRAFFIC_STAGE создана успешно!
@@ -0,0 +1,29 @@
+-- ============================================================================
+-- LOAD_MANIFEST - Манифест загруженных файлов (инкрементальная загрузка)
+-- Назначение: SHA-256, размер и количество строк каждого загруженного файла;
+--             неизменившиеся файлы пропускаются без подсчета строк в таблицах,
+--             изменившиеся (тот же SOURCE_FILE, другой хэш) перезагружаются
+-- База данных: Oracle (production)
+-- ============================================================================
+
+CREATE TABLE LOAD_MANIFEST (
+    TABLE_NAME VARCHAR2(50) NOT NULL,
+    SOURCE_FILE VARCHAR2(200) NOT NULL,
+    FILE_SHA256 VARCHAR2(64) NOT NULL,
+    FILE_SIZE NUMBER NOT NULL,
+    RECORDS_IN_FILE NUMBER,
+    RECORDS_LOADED NUMBER,
+    LOADED_AT DATE DEFAULT SYSDATE,
+    LOADED_BY VARCHAR2(50) DEFAULT USER,
+    CONSTRAINT PK_LOAD_MANIFEST PRIMARY KEY (TABLE_NAME, SOURCE_FILE)
+);
+
+-- Комментарии
+COMMENT ON TABLE LOAD_MANIFEST IS 'Манифест загруженных файлов: хэш содержимого для пропуска неизменившихся файлов';
+COMMENT ON COLUMN LOAD_MANIFEST.SOURCE_FILE IS 'Имя файла (как в SOURCE_FILE целевой таблицы)';
+COMMENT ON COLUMN LOAD_MANIFEST.FILE_SHA256 IS 'SHA-256 содержимого файла при последней успешной загрузке';
+COMMENT ON COLUMN LOAD_MANIFEST.FILE_SIZE IS 'Размер файла в байтах';
+COMMENT ON COLUMN LOAD_MANIFEST.RECORDS_IN_FILE IS 'Количество строк в файле';
+COMMENT ON COLUMN LOAD_MANIFEST.RECORDS_LOADED IS 'Количество загруженных записей';
+
+PROMPT Таблица LOAD_MANIFEST создана успешно!
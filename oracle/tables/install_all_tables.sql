@@ -11,21 +11,29 @@ PROMPT ========================================
 PROMPT
 
 -- 1. SPNET_TRAFFIC - основная таблица трафика
-PROMPT [1/4] Создание SPNET_TRAFFIC...
+PROMPT [1/6] Создание SPNET_TRAFFIC...
 @@01_spnet_traffic.sql
 
 -- 2. STECCOM_EXPENSES - таблица расходов
-PROMPT [2/4] Создание STECCOM_EXPENSES...
+PROMPT [2/6] Создание STECCOM_EXPENSES...
 @@02_steccom_expenses.sql
 
 -- 3. TARIFF_PLANS - справочник тарифов
-PROMPT [3/4] Создание TARIFF_PLANS...
+PROMPT [3/6] Создание TARIFF_PLANS...
 @@03_tariff_plans.sql
 
 -- 4. LOAD_LOGS - журнал загрузок
-PROMPT [4/4] Создание LOAD_LOGS...
+PROMPT [4/6] Создание LOAD_LOGS...
 @@04_load_logs.sql
 
+-- 5. SPNET_TRAFFIC_STAGE - промежуточная таблица пакетной загрузки SPNet
+PROMPT [5/6] Создание SPNET_TRAFFIC_STAGE...
+@@06_spnet_traffic_stage.sql
+
+-- 6. LOAD_MANIFEST - манифест загруженных файлов (хэш содержимого)
+PROMPT [6/6] Создание LOAD_MANIFEST...
+@@07_load_manifest.sql
+
 PROMPT
 PROMPT ========================================
 PROMPT Проверка созданных таблиц
@@ -36,7 +44,7 @@ SELECT
     num_rows,
     TO_CHAR(last_analyzed, 'YYYY-MM-DD HH24:MI') as last_analyzed
 FROM user_tables
-WHERE table_name IN ('SPNET_TRAFFIC', 'STECCOM_EXPENSES', 'TARIFF_PLANS', 'LOAD_LOGS')
+WHERE table_name IN ('SPNET_TRAFFIC', 'STECCOM_EXPENSES', 'TARIFF_PLANS', 'LOAD_LOGS', 'SPNET_TRAFFIC_STAGE', 'LOAD_MANIFEST')
 ORDER BY table_name;
 
 PROMPT
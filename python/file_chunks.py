@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Потоковое чтение CSV/XLSX файлов загрузчиков порциями (ограниченная память)
+
+CSV читается через pd.read_csv(chunksize=...) с форматом из file_format,
+XLSX - через openpyxl в режиме read_only; каждая порция - DataFrame со
+строковыми значениями, как при чтении всего файла с dtype=str, na_filter=False.
+prefetch() читает следующую порцию в фоновом потоке, пока текущая
+обрабатывается и вставляется в Oracle.
+"""
+
+import queue
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+# Порция по умолчанию для потокового режима
+DEFAULT_CHUNK_SIZE = 50000
+
+
+def iter_csv_chunks(file_path, encoding, sep, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Порции CSV файла (DataFrame, все значения - строки)"""
+    reader = pd.read_csv(file_path, sep=sep, encoding=encoding, dtype=str,
+                         na_filter=False, quotechar='"', chunksize=chunk_size)
+    with reader:
+        for chunk in reader:
+            yield chunk
+
+
+def _xlsx_cell_to_str(value):
+    """Значение ячейки как в pd.read_excel(dtype=str, na_filter=False)"""
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, datetime):
+        return str(pd.Timestamp(value))
+    return str(value)
+
+
+def _xlsx_header(values):
+    """Имена колонок первой строки листа (пустые и повторяющиеся - как в pandas)"""
+    columns = []
+    seen = {}
+    for i, value in enumerate(values):
+        name = f'Unnamed: {i}' if value is None else _xlsx_cell_to_str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f'{name}.{seen[name]}'
+        else:
+            seen[name] = 0
+        columns.append(name)
+    return columns
+
+
+def iter_xlsx_chunks(file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Порции первого листа XLSX файла (openpyxl read_only, без загрузки книги в память)"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = _xlsx_header(header)
+        width = len(columns)
+
+        chunk = []
+        pending_empty = []
+        for values in rows:
+            values = list(values[:width]) + [None] * (width - len(values))
+            row = [_xlsx_cell_to_str(v) for v in values]
+            # Пустые строки в конце листа pandas отбрасывает, в середине - сохраняет
+            if all(v is None for v in values):
+                pending_empty.append(row)
+                continue
+            chunk.extend(pending_empty)
+            pending_empty = []
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield pd.DataFrame(chunk[:chunk_size], columns=columns)
+                chunk = chunk[chunk_size:]
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns)
+    finally:
+        workbook.close()
+
+
+def prefetch(chunks, depth=1):
+    """Чтение следующих порций в фоновом потоке (не больше depth впереди)
+
+    Ошибка чтения пробрасывается в вызывающий поток на месте очередной порции.
+    """
+    done = object()
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def _put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _reader():
+        try:
+            for chunk in chunks:
+                if not _put(chunk):
+                    return
+            _put(done)
+        except BaseException as e:
+            _put(e)
+
+    thread = threading.Thread(target=_reader, name='file-chunks-prefetch', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join(timeout=5)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Определение формата CSV файлов (кодировка, разделитель) по первым килобайтам
+
+Вместо перебора 4 кодировок x 3 разделителей с полным разбором файла
+кодировка определяется по BOM и статистике байтов, разделитель - через
+csv.Sniffer. Результат (и количество строк файла) кэшируется по
+пути + mtime + размеру, поэтому загрузчики, подсчет строк на вкладке
+«Загрузка» и проверки полноты загрузки разбирают файл один раз.
+"""
+
+import codecs
+import csv
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+import pandas as pd
+
+# Допустимые разделители (порядок - приоритет при равенстве)
+CSV_SEPARATORS = [';', '\t', ',']
+
+# Сколько байт читать для определения формата
+SNIFF_BYTES = 64 * 1024
+
+# Кодировки для повторной попытки, если ошибка декодирования встретилась дальше образца
+_FALLBACK_ENCODINGS = ['cp1252', 'latin-1']
+
+_CACHE_SIZE = 1024
+
+CsvFormat = namedtuple('CsvFormat', ['encoding', 'sep'])
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cache_key(file_path, kind):
+    st = os.stat(file_path)
+    return (os.path.abspath(file_path), st.st_mtime_ns, st.st_size, kind)
+
+
+def _cache_get(key):
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return True, _cache[key]
+    return False, None
+
+
+def _cache_put(key, value):
+    with _cache_lock:
+        _cache[key] = value
+        _cache.move_to_end(key)
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def clear_cache():
+    """Сброс кэша форматов и количества строк"""
+    with _cache_lock:
+        _cache.clear()
+
+
+def sniff_encoding(sample):
+    """Кодировка по BOM и статистике байтов образца"""
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if sample.startswith(codecs.BOM_UTF16_LE) or sample.startswith(codecs.BOM_UTF16_BE):
+        return 'utf-16'
+    try:
+        # final=False: образец может обрываться посреди многобайтового символа
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    # Байты 0x80-0x9F в latin-1 - управляющие символы, в cp1252 - €, кавычки, тире
+    if any(0x80 <= b <= 0x9F for b in sample):
+        try:
+            sample.decode('cp1252')
+            return 'cp1252'
+        except UnicodeDecodeError:
+            pass
+    return 'latin-1'
+
+
+def sniff_separator(text):
+    """Разделитель по первым строкам (csv.Sniffer, иначе - по заголовку)
+
+    Returns:
+        str или None, если в заголовке нет ни одного допустимого разделителя
+    """
+    lines = [line for line in text.splitlines() if line.strip()]
+    if not lines:
+        return None
+    header = lines[0]
+    try:
+        sep = csv.Sniffer().sniff('\n'.join(lines[:50]), delimiters=''.join(CSV_SEPARATORS)).delimiter
+        if header.count(sep) > 0:
+            return sep
+    except csv.Error:
+        pass
+    counts = {sep: header.count(sep) for sep in CSV_SEPARATORS}
+    sep = max(CSV_SEPARATORS, key=lambda s: counts[s])
+    return sep if counts[sep] > 0 else None
+
+
+def _sniff(file_path):
+    with open(file_path, 'rb') as f:
+        sample = f.read(SNIFF_BYTES)
+    truncated = len(sample) == SNIFF_BYTES
+    encoding = sniff_encoding(sample)
+    text = codecs.getincrementaldecoder(encoding)(errors='replace').decode(sample, final=not truncated)
+    if truncated and '\n' in text:
+        # Последняя строка образца может быть неполной
+        text = text[:text.rindex('\n')]
+    sep = sniff_separator(text)
+    return CsvFormat(encoding, sep) if sep else None
+
+
+def detect_csv_format(file_path):
+    """Формат CSV файла (кэшируется по пути + mtime + размеру)
+
+    Returns:
+        CsvFormat(encoding, sep) или None, если файл не похож на CSV с несколькими колонками
+    """
+    key = _cache_key(file_path, 'format')
+    found, value = _cache_get(key)
+    if not found:
+        value = _sniff(file_path)
+        _cache_put(key, value)
+    return value
+
+
+def mark_decode_error(file_path):
+    """Переключение кэшированного формата на следующую 8-битную кодировку
+    (ошибка декодирования встретилась за пределами образца)
+
+    Returns:
+        CsvFormat с новой кодировкой или None, если вариантов не осталось
+    """
+    current = detect_csv_format(file_path)
+    if current is None:
+        return None
+    candidates = _FALLBACK_ENCODINGS
+    if current.encoding in _FALLBACK_ENCODINGS:
+        candidates = _FALLBACK_ENCODINGS[_FALLBACK_ENCODINGS.index(current.encoding) + 1:]
+    if not candidates:
+        return None
+    value = CsvFormat(candidates[0], current.sep)
+    _cache_put(_cache_key(file_path, 'format'), value)
+    return value
+
+
+def _read_csv(file_path, csv_format, kwargs):
+    """Разбор с разделителем формата, при ошибке разбора или одной колонке - с остальными
+    разделителями CSV_SEPARATORS (Sniffer мог ошибиться); сработавший формат кэшируется"""
+    candidates = [csv_format] + [CsvFormat(csv_format.encoding, sep) for sep in CSV_SEPARATORS if sep != csv_format.sep]
+    for candidate in candidates:
+        try:
+            df = pd.read_csv(file_path, sep=candidate.sep, encoding=candidate.encoding,
+                             dtype=str, na_filter=False, quotechar='"', **kwargs)
+        except pd.errors.ParserError:
+            continue
+        # С usecols колонок столько, сколько запрошено - по ним разделитель не проверить
+        if len(df.columns) <= 1 and 'usecols' not in kwargs:
+            continue
+        if candidate != csv_format:
+            _cache_put(_cache_key(file_path, 'format'), candidate)
+        return df, candidate
+    return None, None
+
+
+def read_csv_file(file_path, **kwargs):
+    """Чтение CSV целиком с определенным форматом (все значения - строки)
+
+    Returns:
+        tuple: (DataFrame или None, CsvFormat или None)
+    """
+    csv_format = detect_csv_format(file_path)
+    while csv_format is not None:
+        try:
+            return _read_csv(file_path, csv_format, kwargs)
+        except UnicodeDecodeError:
+            csv_format = mark_decode_error(file_path)
+    return None, None
+
+
+def _count_xlsx_records(file_path):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        next(rows, None)  # заголовок
+        return sum(
+            1 for values in rows
+            if any(v is not None and str(v).strip() != '' for v in values)
+        )
+    finally:
+        workbook.close()
+
+
+def count_file_records(file_path):
+    """Количество записей в CSV/XLSX файле (кэшируется по пути + mtime + размеру)
+
+    Для XLSX пустые строки не считаются.
+
+    Returns:
+        int или None, если файл не удалось прочитать
+    """
+    key = _cache_key(file_path, 'records')
+    found, value = _cache_get(key)
+    if found:
+        return value
+    try:
+        if str(file_path).lower().endswith('.xlsx'):
+            value = _count_xlsx_records(file_path)
+        else:
+            # Для подсчета достаточно первой колонки - разбор строк тот же, памяти меньше
+            df, _ = read_csv_file(file_path, usecols=[0])
+            value = len(df) if df is not None else None
+    except Exception:
+        return None
+    _cache_put(key, value)
+    return value
+
+
+def remember_record_count(file_path, records):
+    """Сохранение количества строк, подсчитанного при загрузке файла"""
+    _cache_put(_cache_key(file_path, 'records'), records)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Структура таблицы LOAD_LOGS (общая для загрузчиков SPNet/STECCOM и
+restore_load_history.py)
+
+В разных установках столбец файла называется FILE_NAME или SOURCE_FILE,
+а столбец пользователя - LOADED_BY или CREATED_BY. Вместо пробных
+SELECT ... WHERE ROWNUM = 1 на каждый файл структура читается один раз
+на подключение из USER_TAB_COLUMNS (если LOAD_LOGS в другой схеме и
+доступна через синоним - из описания пустого SELECT) и кэшируется.
+"""
+
+import logging
+import threading
+import weakref
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+LoadLogsColumns = namedtuple('LoadLogsColumns', ['file_col', 'loaded_by_col', 'columns'])
+
+# Варианты в порядке приоритета
+FILE_COLUMNS = ['FILE_NAME', 'SOURCE_FILE']
+LOADED_BY_COLUMNS = ['LOADED_BY', 'CREATED_BY']
+
+_cache = weakref.WeakKeyDictionary()
+_cache_lock = threading.Lock()
+
+
+def _read_columns(connection):
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            "SELECT COLUMN_NAME FROM USER_TAB_COLUMNS WHERE TABLE_NAME = 'LOAD_LOGS' ORDER BY COLUMN_ID"
+        )
+        columns = [row[0] for row in cursor.fetchall()]
+        if not columns:
+            # Таблица другой схемы (синоним): столбцы из описания запроса без строк
+            cursor.execute("SELECT * FROM LOAD_LOGS WHERE 1 = 0")
+            columns = [d[0] for d in cursor.description]
+        return columns
+    finally:
+        cursor.close()
+
+
+def detect_load_logs_columns(connection):
+    """Структура LOAD_LOGS для подключения (кэшируется до закрытия подключения)
+
+    Returns:
+        LoadLogsColumns: file_col / loaded_by_col - найденные столбцы или None
+    """
+    with _cache_lock:
+        cached = _cache.get(connection)
+    if cached is not None:
+        return cached
+
+    columns = [c.upper() for c in _read_columns(connection)]
+    value = LoadLogsColumns(
+        next((c for c in FILE_COLUMNS if c in columns), None),
+        next((c for c in LOADED_BY_COLUMNS if c in columns), None),
+        tuple(columns)
+    )
+    with _cache_lock:
+        _cache[connection] = value
+    return value
+
+
+def get_load_logs_columns(connection, default_file_col='SOURCE_FILE', default_loaded_by_col='CREATED_BY'):
+    """Имена столбцов файла и пользователя в LOAD_LOGS (с значениями по умолчанию)
+
+    Returns:
+        tuple: (file_col, loaded_by_col)
+    """
+    try:
+        detected = detect_load_logs_columns(connection)
+    except Exception as e:
+        logger.warning(f"Ошибка при определении структуры LOAD_LOGS: {e}, используем значения по умолчанию")
+        return default_file_col, default_loaded_by_col
+    file_col, loaded_by_col = detected.file_col, detected.loaded_by_col
+    if file_col is None:
+        logger.warning(f"Не удалось определить структуру LOAD_LOGS, используем {default_file_col} по умолчанию")
+        file_col = default_file_col
+    if loaded_by_col is None:
+        logger.warning(f"Не удалось определить столбец для created_by, используем {default_loaded_by_col} по умолчанию")
+        loaded_by_col = default_loaded_by_col
+    return file_col, loaded_by_col
+
+
+def clear_cache(connection=None):
+    """Сброс кэша (например, после ALTER TABLE LOAD_LOGS)"""
+    with _cache_lock:
+        if connection is None:
+            _cache.clear()
+        else:
+            _cache.pop(connection, None)
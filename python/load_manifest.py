@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Манифест загруженных файлов (таблица LOAD_MANIFEST, oracle/tables/07_load_manifest.sql)
+
+Для каждого успешно загруженного файла хранится SHA-256 содержимого, размер,
+количество строк и время загрузки. Проверка файла перед загрузкой - stat +
+хэш + поиск по первичному ключу (TABLE_NAME, SOURCE_FILE), без COUNT(*) по
+целевой таблице и без разбора файла:
+- хэш совпал - файл не изменился, пропускаем;
+- хэш другой - файл с тем же именем изменился, перезагружаем;
+- записи нет - файл новый (или загружен до появления манифеста), решение
+  принимает прежняя проверка по LOAD_LOGS.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Результаты проверки файла по манифесту
+UNCHANGED = 'unchanged'
+CHANGED = 'changed'
+UNKNOWN = 'unknown'
+
+_HASH_BLOCK = 1024 * 1024
+
+FileFingerprint = namedtuple('FileFingerprint', ['sha256', 'size'])
+ManifestEntry = namedtuple('ManifestEntry', ['sha256', 'size', 'records_in_file', 'records_loaded', 'loaded_at'])
+
+# Хэш файла по (путь, mtime, размер): проверка и запись манифеста читают файл один раз
+_fingerprints = {}
+_fingerprints_lock = threading.Lock()
+
+
+def file_fingerprint(file_path):
+    """SHA-256 и размер файла"""
+    st = os.stat(file_path)
+    key = (os.path.abspath(file_path), st.st_mtime_ns, st.st_size)
+    with _fingerprints_lock:
+        if key in _fingerprints:
+            return _fingerprints[key]
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK), b''):
+            digest.update(block)
+    value = FileFingerprint(digest.hexdigest(), st.st_size)
+    with _fingerprints_lock:
+        _fingerprints[key] = value
+    return value
+
+
+class LoadManifest:
+    """Чтение и запись LOAD_MANIFEST через подключение загрузчика"""
+
+    def __init__(self, connection, loaded_by):
+        self.connection = connection
+        self.loaded_by = loaded_by
+        self._table_ready = None
+
+    def _ensure_table(self):
+        """Проверка (и при необходимости создание) LOAD_MANIFEST; результат кэшируется"""
+        if self._table_ready is not None:
+            return self._table_ready
+
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute("SELECT COUNT(*) FROM USER_TABLES WHERE TABLE_NAME = 'LOAD_MANIFEST'")
+            if cursor.fetchone()[0] == 0:
+                ddl_path = Path(__file__).parent.parent / 'oracle' / 'tables' / '07_load_manifest.sql'
+                ddl = ddl_path.read_text(encoding='utf-8')
+                start = ddl.index('CREATE TABLE')
+                cursor.execute(ddl[start:ddl.index(';', start)])
+                logger.info("Создана таблица LOAD_MANIFEST")
+            self._table_ready = True
+        except Exception as e:
+            logger.warning(f"Манифест загрузок недоступен (LOAD_MANIFEST): {e}")
+            self._table_ready = False
+        finally:
+            cursor.close()
+        return self._table_ready
+
+    def get(self, table_name, source_file):
+        """Запись манифеста для файла (ManifestEntry или None)"""
+        if not self.connection or not self._ensure_table():
+            return None
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute("""
+                SELECT FILE_SHA256, FILE_SIZE, RECORDS_IN_FILE, RECORDS_LOADED, LOADED_AT
+                FROM LOAD_MANIFEST
+                WHERE TABLE_NAME = :table_name AND SOURCE_FILE = :source_file
+            """, {'table_name': table_name, 'source_file': source_file})
+            row = cursor.fetchone()
+            return ManifestEntry(*row) if row else None
+        except Exception as e:
+            logger.warning(f"Ошибка чтения LOAD_MANIFEST для {source_file}: {e}")
+            return None
+        finally:
+            cursor.close()
+
+    def check(self, table_name, file_path):
+        """Проверка файла по манифесту
+
+        Returns:
+            tuple: (UNCHANGED | CHANGED | UNKNOWN, ManifestEntry или None)
+        """
+        entry = self.get(table_name, Path(file_path).name)
+        if entry is None:
+            return UNKNOWN, None
+        fingerprint = file_fingerprint(file_path)
+        if entry.size == fingerprint.size and entry.sha256 == fingerprint.sha256:
+            return UNCHANGED, entry
+        return CHANGED, entry
+
+    def record(self, table_name, file_path, records_in_file, records_loaded):
+        """Запись (обновление) манифеста после успешной загрузки файла"""
+        if not self.connection or not self._ensure_table():
+            return
+        fingerprint = file_fingerprint(file_path)
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute("""
+                MERGE INTO LOAD_MANIFEST m
+                USING (SELECT :table_name AS TABLE_NAME, :source_file AS SOURCE_FILE FROM DUAL) s
+                ON (m.TABLE_NAME = s.TABLE_NAME AND m.SOURCE_FILE = s.SOURCE_FILE)
+                WHEN MATCHED THEN UPDATE SET
+                    FILE_SHA256 = :sha256, FILE_SIZE = :file_size,
+                    RECORDS_IN_FILE = :records_in_file, RECORDS_LOADED = :records_loaded,
+                    LOADED_AT = SYSDATE, LOADED_BY = :loaded_by
+                WHEN NOT MATCHED THEN INSERT (
+                    TABLE_NAME, SOURCE_FILE, FILE_SHA256, FILE_SIZE,
+                    RECORDS_IN_FILE, RECORDS_LOADED, LOADED_AT, LOADED_BY
+                ) VALUES (
+                    s.TABLE_NAME, s.SOURCE_FILE, :sha256, :file_size,
+                    :records_in_file, :records_loaded, SYSDATE, :loaded_by
+                )
+            """, {
+                'table_name': table_name,
+                'source_file': Path(file_path).name,
+                'sha256': fingerprint.sha256,
+                'file_size': fingerprint.size,
+                'records_in_file': records_in_file,
+                'records_loaded': records_loaded,
+                'loaded_by': self.loaded_by,
+            })
+            self.connection.commit()
+        except Exception as e:
+            self.connection.rollback()
+            logger.warning(f"Ошибка записи LOAD_MANIFEST для {Path(file_path).name}: {e}")
+        finally:
+            cursor.close()
@@ -12,6 +12,18 @@ from pathlib import Path
 import logging
 from datetime import datetime
 import sys
+import time
+import argparse
+
+try:
+    from python import record_conversion, file_chunks, file_format, parallel_load, load_manifest, load_logs_schema
+except ImportError:
+    import record_conversion
+    import file_chunks
+    import file_format
+    import parallel_load
+    import load_manifest
+    import load_logs_schema
 
 # Настройка логирования
 logging.basicConfig(
@@ -24,35 +36,107 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Размер пакета для executemany в пакетном режиме
+DEFAULT_BATCH_SIZE = 5000
+
+# Промежуточная таблица пакетной загрузки (oracle/tables/06_spnet_traffic_stage.sql)
+STAGE_TABLE = 'SPNET_TRAFFIC_STAGE'
+
+# Колонки SPNET_TRAFFIC в порядке вставки (совпадают с ключами записи)
+SPNET_COLUMNS = [
+    'total_rows', 'contract_id', 'imei', 'sim_iccid', 'service', 'usage_type',
+    'usage_bytes', 'usage_unit', 'total_amount', 'bill_month', 'plan_name',
+    'imsi', 'msisdn', 'actual_usage', 'call_session_count', 'sp_account_no',
+    'sp_name', 'sp_reference', 'source_file', 'load_date', 'created_by'
+]
+
+# Ожидаемые колонки отчетов SPNet (новые форматы Иридиум могут отличаться написанием)
+SPNET_EXPECTED_COLUMNS = [
+    'Total Rows', 'Contract ID', 'IMEI', 'SIM (ICCID)', 'Service', 'Usage Type', 'Usage',
+    'Usage Unit', 'Total Amount', 'Bill Month', 'Plan Name', 'IMSI', 'MSISDN',
+    'Actual Usage', 'Call/Session Count', 'SP Account No', 'SP Name', 'SP Reference'
+]
+
+# Поле записи -> (колонка файла, способ разбора)
+SPNET_FIELDS = [
+    ('total_rows', 'Total Rows', 'number'),
+    ('contract_id', 'Contract ID', 'str'),
+    ('imei', 'IMEI', 'str'),
+    ('sim_iccid', 'SIM (ICCID)', 'str'),
+    ('service', 'Service', 'str'),
+    ('usage_type', 'Usage Type', 'str'),
+    ('usage_bytes', 'Usage', 'number'),
+    ('usage_unit', 'Usage Unit', 'str'),
+    ('total_amount', 'Total Amount', 'number'),
+    ('bill_month', 'Bill Month', 'bill_month'),
+    ('plan_name', 'Plan Name', 'str'),
+    ('imsi', 'IMSI', 'str'),
+    ('msisdn', 'MSISDN', 'str'),
+    ('actual_usage', 'Actual Usage', 'number'),
+    ('call_session_count', 'Call/Session Count', 'number'),
+    ('sp_account_no', 'SP Account No', 'number'),
+    ('sp_name', 'SP Name', 'str'),
+    ('sp_reference', 'SP Reference', 'str'),
+]
+
+def _norm_column_name(s):
+    """Нормализация имени колонки для сопоставления с ожидаемым"""
+    return str(s).upper().replace(' ', '').replace('-', '').replace('/', '').replace('(', '').replace(')', '').replace('_', '')
+
+# Ключ дубликата (тот же, что в check_sql построчного режима)
+SPNET_DEDUP_KEY = [
+    'CONTRACT_ID', 'IMEI', 'BILL_MONTH', 'SERVICE', 'USAGE_TYPE', 'SOURCE_FILE'
+]
+
 class SPNetDataLoader:
-    def __init__(self, oracle_config):
+    def __init__(self, oracle_config, bulk=False, batch_size=DEFAULT_BATCH_SIZE, chunk_size=None, workers=1, atomic_reload=False):
         """
         Инициализация загрузчика данных SPNet
         
         Args:
             oracle_config (dict): Конфигурация подключения к Oracle
+            bulk (bool): Пакетный режим (executemany в промежуточную таблицу +
+                дедупликация на сервере) вместо построчной вставки
+            batch_size (int): Размер пакета executemany в пакетном режиме
+            chunk_size (int): Потоковый режим - файл читается, преобразуется и
+                вставляется порциями по chunk_size строк (None - файл целиком)
+            workers (int): Число параллельно загружаемых файлов (процессы разбора
+                и сессии Oracle); 1 - последовательная загрузка
+            atomic_reload (bool): Перезагрузка файла одной транзакцией - отчеты
+                видят либо прежние, либо новые данные файла, без промежутка
         """
         self.oracle_config = oracle_config
         self.connection = None
         self.gdrive_path = "SPNet reports"
+        self.bulk = bulk
+        self.batch_size = max(1, int(batch_size or DEFAULT_BATCH_SIZE))
+        self._stage_table_ready = None
+        self.chunk_size = chunk_size
+        self.workers = max(1, int(workers or 1))
+        # Одна транзакция на файл: COMMIT выполняет вызывающий код (параллельный режим)
+        self.commit_per_file = False
+        self._manifest = None
+        self.atomic_reload = atomic_reload
         
+    def make_dsn(self):
+        """DSN подключения к Oracle (SID, если задан, иначе SERVICE_NAME)"""
+        if self.oracle_config.get('sid'):
+            return cx_Oracle.makedsn(
+                self.oracle_config['host'],
+                self.oracle_config['port'],
+                sid=self.oracle_config['sid']
+            )
+        service_name = self.oracle_config.get('service_name', 'bm7')
+        return cx_Oracle.makedsn(
+            self.oracle_config['host'],
+            self.oracle_config['port'],
+            service_name=service_name
+        )
+    
     def connect_to_oracle(self):
         """Подключение к Oracle базе данных (с поддержкой SID и SERVICE_NAME)"""
         try:
-            # Используем SID если задан, иначе SERVICE_NAME
-            if self.oracle_config.get('sid'):
-                dsn = cx_Oracle.makedsn(
-                    self.oracle_config['host'],
-                    self.oracle_config['port'],
-                    sid=self.oracle_config['sid']
-                )
-            else:
-                service_name = self.oracle_config.get('service_name', 'bm7')
-                dsn = cx_Oracle.makedsn(
-                    self.oracle_config['host'],
-                    self.oracle_config['port'],
-                    service_name=service_name
-                )
+            dsn = self.make_dsn()
             
             self.connection = cx_Oracle.connect(
                 user=self.oracle_config['username'],
@@ -81,22 +165,54 @@ class SPNetDataLoader:
         skipped_files = 0
         load_start_time = datetime.now()
         
+        files_to_load = []
         for file_path in all_files:
+            file_name = Path(file_path).name
+            # Манифест: неизменившийся файл пропускается по SHA-256, без подсчета записей
+            status, entry = self._get_manifest().check('SPNET_TRAFFIC', file_path)
+            if status == load_manifest.UNCHANGED:
+                logger.info(f"⏭ Пропускаем файл (не изменился с загрузки {entry.loaded_at}): {file_name}")
+                skipped_files += 1
+                continue
+            if status == load_manifest.CHANGED:
+                logger.info(f"🔄 Файл изменился с загрузки {entry.loaded_at} (другой SHA-256): {file_name}")
+                logger.info(f"   Перезагружаем файл...")
+                files_to_load.append(file_path)
+                continue
+            
+            # Файла нет в манифесте: проверяем по LOAD_LOGS и количеству записей
+            # В потоковом режиме файл не перечитывается для подсчета строк
+            count_path = None if self.chunk_size else file_path
+            is_loaded, records_in_file, records_in_db = self.is_file_loaded(file_name, 'SPNET_TRAFFIC', count_path)
+            if is_loaded:
+                logger.info(f"⏭ Пропускаем файл (уже загружен полностью): {file_name}")
+                if records_in_file > 0 and records_in_db > 0:
+                    logger.info(f"   Записей в файле: {records_in_file:,}, в базе: {records_in_db:,}")
+                # Файл загружен до появления манифеста - запоминаем его хэш
+                self._get_manifest().record('SPNET_TRAFFIC', file_path, records_in_file or None, records_in_db)
+                skipped_files += 1
+                continue
+            elif records_in_db > 0:
+                logger.info(f"⚠️ Файл загружен не полностью: {file_name}")
+                logger.info(f"   Записей в файле: {records_in_file:,}, в базе: {records_in_db:,} (не хватает {records_in_file - records_in_db:,})")
+                logger.info(f"   Перезагружаем файл...")
+            files_to_load.append(file_path)
+        
+        if self.workers > 1 and len(files_to_load) > 1:
+            # Параллельный режим: разбор в пуле процессов, вставка через пул сессий Oracle
+            if self.chunk_size:
+                logger.warning("Потоковый режим не используется при параллельной загрузке: файлы разбираются целиком")
+            logger.info(f"Параллельная загрузка {len(files_to_load)} файлов, воркеров: {self.workers}")
+            if self.bulk:
+                # DDL промежуточной таблицы - до транзакций файлов (CREATE выполняет COMMIT)
+                self._ensure_stage_table()
+            results = parallel_load.load_files_parallel(self, files_to_load, 'SPNET_TRAFFIC', self.workers)
+            total_records += sum(r.records_loaded for r in results)
+            files_to_load = []
+        
+        for file_path in files_to_load:
             file_name = Path(file_path).name
             try:
-                # Проверяем, загружен ли файл уже
-                is_loaded, records_in_file, records_in_db = self.is_file_loaded(file_name, 'SPNET_TRAFFIC', file_path)
-                if is_loaded:
-                    logger.info(f"⏭ Пропускаем файл (уже загружен полностью): {file_name}")
-                    if records_in_file > 0 and records_in_db > 0:
-                        logger.info(f"   Записей в файле: {records_in_file:,}, в базе: {records_in_db:,}")
-                    skipped_files += 1
-                    continue
-                elif records_in_db > 0:
-                    logger.info(f"⚠️ Файл загружен не полностью: {file_name}")
-                    logger.info(f"   Записей в файле: {records_in_file:,}, в базе: {records_in_db:,} (не хватает {records_in_file - records_in_db:,})")
-                    logger.info(f"   Перезагружаем файл...")
-                
                 logger.info(f"Обрабатываем файл: {file_name}")
                 file_start_time = datetime.now()
                 records_loaded = self.load_single_file(file_path)
@@ -106,6 +222,7 @@ class SPNetDataLoader:
                 
                 # Логируем успешную загрузку файла
                 self.log_load_success('SPNET_TRAFFIC', file_name, records_loaded, file_start_time, file_end_time, file_duration)
+                self.record_manifest('SPNET_TRAFFIC', file_path, records_loaded)
                 logger.info(f"✓ Загружено {records_loaded} записей из {file_name}")
                 
             except Exception as e:
@@ -126,107 +243,18 @@ class SPNetDataLoader:
     
     def load_single_file(self, file_path):
         """Загрузка одного CSV или XLSX файла"""
+        if self.atomic_reload and not self.commit_per_file:
+            return self.load_single_file_atomic(file_path)
+        if self.chunk_size:
+            return self.load_single_file_streaming(file_path)
         try:
-            file_ext = Path(file_path).suffix.lower()
-            df = None
-            
-            # Читаем XLSX файлы
-            if file_ext == '.xlsx':
-                try:
-                    df = pd.read_excel(file_path, dtype=str, na_filter=False)
-                    logger.info(f"Успешно прочитан XLSX файл {file_path}")
-                except Exception as e:
-                    logger.error(f"Ошибка чтения XLSX файла {file_path}: {e}")
-                    return 0
-            else:
-                # Читаем CSV файлы - пробуем разные кодировки и разделители
-                encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
-                
-                for encoding in encodings:
-                    try:
-                        # Пробуем разные разделители
-                        separators = [';', '\t', ',']
-                        for sep in separators:
-                            try:
-                                df = pd.read_csv(file_path, sep=sep, encoding=encoding, 
-                                               dtype=str,  # Читаем все как строки
-                                               na_filter=False,  # Не конвертируем в NaN
-                                               quotechar='"')  # Кавычки для полей
-                                if len(df.columns) > 1:
-                                    logger.info(f"Успешно прочитан файл {file_path} с разделителем '{sep}' и кодировкой {encoding}")
-                                    break
-                            except Exception as e:
-                                logger.warning(f"Ошибка чтения {file_path} с разделителем '{sep}' и кодировкой {encoding}: {e}")
-                                continue
-                        if len(df.columns) > 1:
-                            break
-                    except Exception as e:
-                        logger.warning(f"Ошибка чтения {file_path} с кодировкой {encoding}: {e}")
-                        continue
-            
-            if df is None or len(df.columns) <= 1:
-                logger.error(f"Не удалось прочитать файл {file_path}")
+            records = self.read_file_records(file_path)
+            if records is None:
                 return 0
             
-            # Нормализация колонок и сопоставление с ожидаемыми именами (новые форматы Иридиум)
-            df.columns = [str(c).strip() for c in df.columns]
-            def _norm(s):
-                return str(s).upper().replace(' ', '').replace('-', '').replace('/', '').replace('(', '').replace(')', '').replace('_', '')
-            spnet_expected = [
-                'Total Rows', 'Contract ID', 'IMEI', 'SIM (ICCID)', 'Service', 'Usage Type', 'Usage',
-                'Usage Unit', 'Total Amount', 'Bill Month', 'Plan Name', 'IMSI', 'MSISDN',
-                'Actual Usage', 'Call/Session Count', 'SP Account No', 'SP Name', 'SP Reference'
-            ]
-            col_map = {}
-            for col in df.columns:
-                n = _norm(col)
-                for exp in spnet_expected:
-                    if _norm(exp) == n:
-                        col_map[exp] = col
-                        break
-            def _get(row, key):
-                if key in row and row[key] is not None and str(row[key]).strip() != '':
-                    return row[key]
-                alt = col_map.get(key)
-                if alt and alt in row and row[alt] is not None and str(row[alt]).strip() != '':
-                    return row[alt]
-                return row.get(key)
-            
             # Идемпотентность: удаляем старые записи этого файла перед загрузкой
             self._delete_records_by_source_file('SPNET_TRAFFIC', Path(file_path).name)
             
-            df['source_file'] = Path(file_path).name
-            df['load_date'] = datetime.now()
-            df['created_by'] = 'SPNET_LOADER'
-            
-            # Подготавливаем данные для вставки
-            records = []
-            for _, row in df.iterrows():
-                record = {
-                    'total_rows': self.parse_number(_get(row, 'Total Rows')),
-                    'contract_id': str(_get(row, 'Contract ID') or '').strip() or None,
-                    'imei': str(_get(row, 'IMEI') or '').strip() or None,
-                    'sim_iccid': str(_get(row, 'SIM (ICCID)') or '').strip() or None,
-                    'service': str(_get(row, 'Service') or '').strip() or None,
-                    'usage_type': str(_get(row, 'Usage Type') or '').strip() or None,
-                    'usage_bytes': self.parse_number(_get(row, 'Usage')),
-                    'usage_unit': str(_get(row, 'Usage Unit') or '').strip() or None,
-                    'total_amount': self.parse_number(_get(row, 'Total Amount')),
-                    'bill_month': self.parse_bill_month(_get(row, 'Bill Month')),
-                    'plan_name': str(_get(row, 'Plan Name') or '').strip() or None,
-                    'imsi': str(_get(row, 'IMSI') or '').strip() or None,
-                    'msisdn': str(_get(row, 'MSISDN') or '').strip() or None,
-                    'actual_usage': self.parse_number(_get(row, 'Actual Usage')),
-                    'call_session_count': self.parse_number(_get(row, 'Call/Session Count')),
-                    'sp_account_no': self.parse_number(_get(row, 'SP Account No')),
-                    'sp_name': str(_get(row, 'SP Name') or '').strip() or None,
-                    'sp_reference': str(_get(row, 'SP Reference') or '').strip() or None,
-                    'source_file': row.get('source_file', None),
-                    'load_date': row.get('load_date', None),
-                    'created_by': row.get('created_by', None)
-                }
-                records.append(record)
-            
             # Вставляем данные в Oracle
             return self.insert_records(records)
             
@@ -234,6 +262,201 @@ class SPNetDataLoader:
             logger.error(f"Ошибка при загрузке файла {file_path}: {e}")
             raise
     
+    def load_single_file_atomic(self, file_path):
+        """Перезагрузка файла одной транзакцией: удаление старых записей файла,
+        вставка новых и один COMMIT в конце
+        
+        До COMMIT отчеты (V_CONSOLIDATED_REPORT_WITH_BILLING и др.) видят прежние
+        данные файла, после - новые; при ошибке ROLLBACK оставляет прежние.
+        """
+        if self.bulk:
+            # DDL промежуточной таблицы выполняет неявный COMMIT - до начала транзакции
+            self._ensure_stage_table()
+        self.commit_per_file = True
+        try:
+            records_loaded = self.load_single_file(file_path)
+            self.connection.commit()
+            return records_loaded
+        except Exception:
+            self.connection.rollback()
+            raise
+        finally:
+            self.commit_per_file = False
+    
+    def read_file_records(self, file_path):
+        """Чтение CSV или XLSX файла и преобразование в записи (без Oracle)
+        
+        Returns:
+            list[dict] или None, если файл не удалось прочитать
+        """
+        file_ext = Path(file_path).suffix.lower()
+        df = None
+        
+        # Читаем XLSX файлы
+        if file_ext == '.xlsx':
+            try:
+                df = pd.read_excel(file_path, dtype=str, na_filter=False)
+                logger.info(f"Успешно прочитан XLSX файл {file_path}")
+            except Exception as e:
+                logger.error(f"Ошибка чтения XLSX файла {file_path}: {e}")
+                return None
+        else:
+            # Читаем CSV файлы - кодировка и разделитель определяются по началу файла
+            df, csv_format = file_format.read_csv_file(file_path)
+            if df is not None:
+                logger.info(f"Успешно прочитан файл {file_path} с разделителем '{csv_format.sep}' и кодировкой {csv_format.encoding}")
+                file_format.remember_record_count(file_path, len(df))
+        
+        if df is None or len(df.columns) <= 1:
+            logger.error(f"Не удалось прочитать файл {file_path}")
+            return None
+        
+        # Нормализация колонок (сопоставление с ожидаемыми именами - в dataframe_to_records)
+        df.columns = [str(c).strip() for c in df.columns]
+        
+        # Подготавливаем данные для вставки
+        return self.dataframe_to_records(df, Path(file_path).name)
+    
+    def load_single_file_streaming(self, file_path):
+        """Потоковая загрузка одного CSV или XLSX файла порциями по chunk_size строк
+        
+        Чтение следующей порции идет в фоне, пока текущая преобразуется и
+        вставляется в Oracle; в памяти не больше двух порций. Количество строк
+        файла считается в том же проходе.
+        """
+        try:
+            source_file = Path(file_path).name
+            is_xlsx = Path(file_path).suffix.lower() == '.xlsx'
+            csv_format = None
+            if not is_xlsx:
+                csv_format = file_format.detect_csv_format(file_path)
+                if csv_format is None:
+                    logger.error(f"Не удалось прочитать файл {file_path}")
+                    return 0
+            
+            while True:
+                if is_xlsx:
+                    chunks = file_chunks.iter_xlsx_chunks(file_path, self.chunk_size)
+                else:
+                    logger.info(f"Потоковое чтение {file_path} с разделителем '{csv_format.sep}' и кодировкой {csv_format.encoding}")
+                    chunks = file_chunks.iter_csv_chunks(file_path, csv_format.encoding, csv_format.sep, self.chunk_size)
+                try:
+                    return self._load_chunks(chunks, file_path, source_file)
+                except UnicodeDecodeError:
+                    # Кодировка не подошла дальше образца - повтор с начала файла
+                    # (перед первой порцией записи файла снова удаляются)
+                    csv_format = file_format.mark_decode_error(file_path) if csv_format else None
+                    if csv_format is None:
+                        raise
+                    logger.warning(f"Ошибка декодирования {file_path}, повтор с кодировкой {csv_format.encoding}")
+            
+        except Exception as e:
+            logger.error(f"Ошибка при потоковой загрузке файла {file_path}: {e}")
+            raise
+    
+    def _load_chunks(self, chunks, file_path, source_file):
+        """Вставка порций файла; возвращает количество вставленных записей"""
+        load_date = datetime.now()
+        rows_in_file = 0
+        inserted_count = 0
+        for chunk_no, df in enumerate(file_chunks.prefetch(chunks), 1):
+            if len(df.columns) <= 1:
+                logger.error(f"Не удалось прочитать файл {file_path}")
+                return inserted_count
+            df.columns = [str(c).strip() for c in df.columns]
+            
+            # Идемпотентность: удаляем старые записи этого файла перед первой порцией
+            if chunk_no == 1:
+                self._delete_records_by_source_file('SPNET_TRAFFIC', source_file)
+            
+            records = self.dataframe_to_records(df, source_file, load_date)
+            inserted_count += self.insert_records(records)
+            rows_in_file += len(df)
+            logger.info(f"  Порция {chunk_no}: {len(df):,} строк (прочитано {rows_in_file:,}, вставлено {inserted_count:,})")
+        
+        file_format.remember_record_count(file_path, rows_in_file)
+        logger.info(f"Записей в файле: {rows_in_file:,}, загружено: {inserted_count:,}")
+        return inserted_count
+    
+    def dataframe_to_records(self, df, source_file, load_date=None):
+        """Преобразование DataFrame в записи для вставки (по колонкам, без iterrows)
+        
+        Сопоставление колонок выполняется один раз, числа и BILL_MONTH
+        разбираются векторно. Результат совпадает с _dataframe_to_records_rowwise.
+        """
+        if load_date is None:
+            load_date = datetime.now()
+        col_map = record_conversion.resolve_columns(df.columns, SPNET_EXPECTED_COLUMNS, _norm_column_name)
+        
+        bind_arrays = {}
+        for field, column, kind in SPNET_FIELDS:
+            values = record_conversion.column_values(df, column, col_map)
+            if kind == 'number':
+                bind_arrays[field] = record_conversion.parse_numbers(values, self.parse_number)
+            elif kind == 'bill_month':
+                bind_arrays[field] = record_conversion.parse_by_unique(values, self.parse_bill_month)
+            else:
+                bind_arrays[field] = record_conversion.str_or_none(values)
+        
+        bind_arrays['source_file'] = record_conversion.constant(source_file, len(df))
+        bind_arrays['load_date'] = record_conversion.constant(pd.Timestamp(load_date), len(df))
+        bind_arrays['created_by'] = record_conversion.constant('SPNET_LOADER', len(df))
+        
+        return record_conversion.bind_arrays_to_records(bind_arrays)
+    
+    def _dataframe_to_records_rowwise(self, df, source_file, load_date=None):
+        """Построчное преобразование DataFrame в записи (исходная реализация,
+        эталон для проверки dataframe_to_records)"""
+        if load_date is None:
+            load_date = datetime.now()
+        col_map = record_conversion.resolve_columns(df.columns, SPNET_EXPECTED_COLUMNS, _norm_column_name)
+        def _get(row, key):
+            if key in row and row[key] is not None and str(row[key]).strip() != '':
+                return row[key]
+            alt = col_map.get(key)
+            if alt and alt in row and row[alt] is not None and str(row[alt]).strip() != '':
+                return row[alt]
+            return row.get(key)
+        
+        df = df.copy()
+        df['source_file'] = source_file
+        df['load_date'] = load_date
+        df['created_by'] = 'SPNET_LOADER'
+        
+        records = []
+        for _, row in df.iterrows():
+            record = {
+                'total_rows': self.parse_number(_get(row, 'Total Rows')),
+                'contract_id': str(_get(row, 'Contract ID') or '').strip() or None,
+                'imei': str(_get(row, 'IMEI') or '').strip() or None,
+                'sim_iccid': str(_get(row, 'SIM (ICCID)') or '').strip() or None,
+                'service': str(_get(row, 'Service') or '').strip() or None,
+                'usage_type': str(_get(row, 'Usage Type') or '').strip() or None,
+                'usage_bytes': self.parse_number(_get(row, 'Usage')),
+                'usage_unit': str(_get(row, 'Usage Unit') or '').strip() or None,
+                'total_amount': self.parse_number(_get(row, 'Total Amount')),
+                'bill_month': self.parse_bill_month(_get(row, 'Bill Month')),
+                'plan_name': str(_get(row, 'Plan Name') or '').strip() or None,
+                'imsi': str(_get(row, 'IMSI') or '').strip() or None,
+                'msisdn': str(_get(row, 'MSISDN') or '').strip() or None,
+                'actual_usage': self.parse_number(_get(row, 'Actual Usage')),
+                'call_session_count': self.parse_number(_get(row, 'Call/Session Count')),
+                'sp_account_no': self.parse_number(_get(row, 'SP Account No')),
+                'sp_name': str(_get(row, 'SP Name') or '').strip() or None,
+                'sp_reference': str(_get(row, 'SP Reference') or '').strip() or None,
+                'source_file': row.get('source_file', None),
+                'load_date': row.get('load_date', None),
+                'created_by': row.get('created_by', None)
+            }
+            records.append(record)
+        return records
+    
+    def _commit(self):
+        """COMMIT после удаления/вставки (в режиме одной транзакции на файл -
+        выполняется вызывающим кодом после загрузки всего файла)"""
+        if not self.commit_per_file:
+            self.connection.commit()
+    
     def _delete_records_by_source_file(self, table_name, source_file):
         """Удаляет из таблицы все записи с данным SOURCE_FILE (идемпотентная перезагрузка)."""
         if not self.connection or not source_file:
@@ -245,11 +468,14 @@ class SPNetDataLoader:
                 (source_file,)
             )
             deleted = cursor.rowcount
-            self.connection.commit()
+            self._commit()
             if deleted > 0:
                 logger.info(f"Удалено {deleted} старых записей по файлу {source_file} перед загрузкой")
         except Exception as e:
             self.connection.rollback()
+            if self.commit_per_file:
+                # В транзакции файла вставка без удаления дала бы дубликаты
+                raise
             logger.warning(f"Не удалось удалить старые записи по {source_file}: {e}")
         finally:
             cursor.close()
@@ -262,9 +488,15 @@ class SPNetDataLoader:
         if not records:
             return 0
         
+        if self.bulk:
+            if self._ensure_stage_table():
+                return self.insert_records_bulk(records)
+            logger.warning(f"Таблица {STAGE_TABLE} недоступна, используем построчную вставку")
+        
         cursor = self.connection.cursor()
         inserted_count = 0
         skipped_count = 0
+        started = time.perf_counter()
         
         try:
             # SQL для проверки существования записи (по ключевым полям)
@@ -320,11 +552,17 @@ class SPNetDataLoader:
                     logger.warning(f"Ошибка при вставке записи: {e}")
                     continue
             
-            self.connection.commit()
+            self._commit()
             
             if skipped_count > 0:
                 logger.info(f"Пропущено дубликатов: {skipped_count}")
             
+            elapsed = time.perf_counter() - started
+            logger.info(
+                f"Построчная вставка: {len(records):,} строк за {elapsed:.2f} сек "
+                f"({len(records) / elapsed if elapsed > 0 else 0:,.0f} строк/сек)"
+            )
+            
             return inserted_count
             
         except Exception as e:
@@ -334,52 +572,160 @@ class SPNetDataLoader:
         finally:
             cursor.close()
     
-    def _get_load_logs_columns(self):
-        """Определение структуры таблицы LOAD_LOGS (динамически)"""
+    def _ensure_stage_table(self):
+        """Проверка (и при необходимости создание) промежуточной таблицы SPNET_TRAFFIC_STAGE.
+        
+        Результат кэшируется на время жизни загрузчика.
+        """
+        if self._stage_table_ready is not None:
+            return self._stage_table_ready
+        
         cursor = self.connection.cursor()
         try:
-            # Проверяем FILE_NAME vs SOURCE_FILE
-            try:
-                test_query = "SELECT FILE_NAME FROM LOAD_LOGS WHERE ROWNUM = 1"
-                cursor.execute(test_query)
-                file_col = "FILE_NAME"
-            except:
-                try:
-                    test_query = "SELECT SOURCE_FILE FROM LOAD_LOGS WHERE ROWNUM = 1"
-                    cursor.execute(test_query)
-                    file_col = "SOURCE_FILE"
-                except:
-                    logger.warning("Не удалось определить структуру LOAD_LOGS, используем SOURCE_FILE по умолчанию")
-                    file_col = "SOURCE_FILE"
-            
-            # Проверяем LOADED_BY vs CREATED_BY
-            try:
-                test_query = "SELECT LOADED_BY FROM LOAD_LOGS WHERE ROWNUM = 1"
-                cursor.execute(test_query)
-                loaded_by_col = "LOADED_BY"
-            except:
-                try:
-                    test_query = "SELECT CREATED_BY FROM LOAD_LOGS WHERE ROWNUM = 1"
-                    cursor.execute(test_query)
-                    loaded_by_col = "CREATED_BY"
-                except:
-                    logger.warning("Не удалось определить столбец для created_by, используем CREATED_BY по умолчанию")
-                    loaded_by_col = "CREATED_BY"
-            
-            return file_col, loaded_by_col
+            cursor.execute("SELECT COUNT(*) FROM USER_TABLES WHERE TABLE_NAME = :1", (STAGE_TABLE,))
+            if cursor.fetchone()[0] == 0:
+                ddl_path = Path(__file__).parent.parent / 'oracle' / 'tables' / '06_spnet_traffic_stage.sql'
+                ddl = ddl_path.read_text(encoding='utf-8')
+                start = ddl.index('CREATE GLOBAL TEMPORARY TABLE')
+                create_sql = ddl[start:ddl.index(';', start)]
+                cursor.execute(create_sql)
+                logger.info(f"Создана промежуточная таблица {STAGE_TABLE}")
+            self._stage_table_ready = True
+        except Exception as e:
+            logger.warning(f"Не удалось подготовить таблицу {STAGE_TABLE}: {e}")
+            self._stage_table_ready = False
+        finally:
+            cursor.close()
+        return self._stage_table_ready
+    
+    def insert_records_bulk(self, records):
+        """Пакетная вставка записей через промежуточную таблицу
+        
+        1. Все строки файла отправляются в SPNET_TRAFFIC_STAGE пакетами executemany
+           (batcherrors: ошибочные строки собираются, а не прерывают загрузку).
+        2. Один INSERT ... SELECT переносит строки в SPNET_TRAFFIC, отбрасывая
+           дубликаты внутри файла и уже существующие в таблице (anti-join
+           по тому же ключу, что и построчная проверка).
+        3. COMMIT очищает промежуточную таблицу (ON COMMIT DELETE ROWS); в режиме
+           одной транзакции на файл она очищается явно после переноса.
+        
+        Returns:
+            int: количество вставленных в SPNET_TRAFFIC записей
+        """
+        columns = ['row_seq'] + SPNET_COLUMNS
+        stage_sql = f"""
+            INSERT INTO {STAGE_TABLE} ({', '.join(c.upper() for c in columns)})
+            VALUES ({', '.join(':' + c for c in columns)})
+        """
+        
+        # Дубликатом считается строка с совпадающим непустым ключом: в построчном
+        # режиме сравнение через "=" никогда не находит строки с NULL в ключе.
+        key_not_null = ' AND '.join(f"s.{c} IS NOT NULL" for c in SPNET_DEDUP_KEY)
+        key_match = ' AND '.join(f"t.{c} = s.{c}" for c in SPNET_DEDUP_KEY)
+        target_cols = ', '.join(c.upper() for c in SPNET_COLUMNS)
+        merge_sql = f"""
+            INSERT INTO SPNET_TRAFFIC ({target_cols})
+            SELECT {', '.join('s.' + c.upper() for c in SPNET_COLUMNS)}
+            FROM (
+                SELECT st.*,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY {', '.join(SPNET_DEDUP_KEY)}, NVL(USAGE_BYTES, -999999)
+                           ORDER BY ROW_SEQ
+                       ) AS RN
+                FROM {STAGE_TABLE} st
+            ) s
+            WHERE (s.RN = 1 OR NOT ({key_not_null}))
+              AND NOT EXISTS (
+                  SELECT 1 FROM SPNET_TRAFFIC t
+                  WHERE {key_match}
+                    AND NVL(t.USAGE_BYTES, -999999) = NVL(s.USAGE_BYTES, -999999)
+              )
+        """
+        
+        cursor = self.connection.cursor()
+        started = time.perf_counter()
+        staged_count = 0
+        error_count = 0
+        
+        try:
+            total_batches = (len(records) + self.batch_size - 1) // self.batch_size
+            for batch_no, offset in enumerate(range(0, len(records), self.batch_size), 1):
+                batch = [
+                    dict(record, row_seq=offset + i)
+                    for i, record in enumerate(records[offset:offset + self.batch_size])
+                ]
+                batch_started = time.perf_counter()
+                cursor.executemany(stage_sql, batch, batcherrors=True)
+                batch_errors = cursor.getbatcherrors()
+                batch_elapsed = time.perf_counter() - batch_started
+                
+                for error in batch_errors:
+                    logger.warning(f"Ошибка в строке {offset + error.offset + 1}: {error.message}")
+                error_count += len(batch_errors)
+                staged_count += len(batch) - len(batch_errors)
+                
+                logger.info(
+                    f"  Пакет {batch_no}/{total_batches}: {len(batch):,} строк за {batch_elapsed:.2f} сек "
+                    f"({len(batch) / batch_elapsed if batch_elapsed > 0 else 0:,.0f} строк/сек)"
+                    + (f", ошибок: {len(batch_errors)}" if batch_errors else "")
+                )
+            
+            merge_started = time.perf_counter()
+            cursor.execute(merge_sql)
+            inserted_count = cursor.rowcount
+            merge_elapsed = time.perf_counter() - merge_started
+            
+            if self.commit_per_file:
+                # COMMIT будет в конце файла - очищаем перенесенные строки сейчас,
+                # чтобы следующая порция не перенесла их повторно
+                cursor.execute(f"DELETE FROM {STAGE_TABLE}")
+            self._commit()
+            
+            elapsed = time.perf_counter() - started
+            skipped_count = staged_count - inserted_count
+            if skipped_count > 0:
+                logger.info(f"Пропущено дубликатов: {skipped_count}")
+            if error_count > 0:
+                logger.warning(f"Строк с ошибками (не загружены): {error_count}")
+            logger.info(
+                f"Пакетная вставка: {len(records):,} строк за {elapsed:.2f} сек "
+                f"({len(records) / elapsed if elapsed > 0 else 0:,.0f} строк/сек), "
+                f"перенос из {STAGE_TABLE}: {merge_elapsed:.2f} сек"
+            )
+            
+            return inserted_count
+            
         except Exception as e:
-            logger.warning(f"Ошибка при определении структуры LOAD_LOGS: {e}, используем значения по умолчанию")
-            return "SOURCE_FILE", "CREATED_BY"
+            self.connection.rollback()
+            logger.error(f"Ошибка при пакетной вставке данных: {e}")
+            raise
         finally:
             cursor.close()
     
+    def _get_load_logs_columns(self):
+        """Определение структуры таблицы LOAD_LOGS (один раз на подключение, USER_TAB_COLUMNS)"""
+        return load_logs_schema.get_load_logs_columns(self.connection)
+    
+    def _get_manifest(self):
+        """Манифест загруженных файлов (LOAD_MANIFEST) на основном подключении"""
+        if self._manifest is None or self._manifest.connection is not self.connection:
+            self._manifest = load_manifest.LoadManifest(self.connection, 'SPNET_LOADER')
+        return self._manifest
+    
+    def record_manifest(self, table_name, file_path, records_loaded):
+        """Запись хэша успешно загруженного файла в манифест"""
+        if records_loaded > 0:
+            # Количество строк уже в кэше file_format (подсчитано при чтении файла)
+            self._get_manifest().record(table_name, file_path, file_format.count_file_records(file_path), records_loaded)
+    
     def is_file_loaded(self, file_name, table_name='SPNET_TRAFFIC', file_path=None):
         """Проверка, загружен ли файл уже и полностью ли загружен
         
         Args:
             file_name: имя файла
             table_name: имя таблицы
-            file_path: путь к файлу (опционально, для проверки количества записей)
+            file_path: путь к файлу (опционально, для проверки количества записей;
+                без него сравнение идет с RECORDS_LOADED последней успешной загрузки)
         
         Returns:
             tuple: (is_loaded: bool, records_in_file: int, records_in_db: int)
@@ -411,19 +757,23 @@ class SPNetDataLoader:
             
             # Если есть путь к файлу, проверяем количество записей в файле
             if file_path and Path(file_path).exists():
-                try:
-                    file_ext = Path(file_path).suffix.lower()
-                    if file_ext == '.xlsx':
-                        import pandas as pd
-                        df = pd.read_excel(file_path, dtype=str, na_filter=False, engine='openpyxl')
-                    else:
-                        import pandas as pd
-                        df = pd.read_csv(file_path, dtype=str, na_filter=False, 
-                                       quotechar='"')
-                    df = df.dropna(how='all')
-                    records_in_file = len(df)
-                except Exception as e:
-                    logger.warning(f"Не удалось подсчитать записи в файле {file_name}: {e}")
+                # Количество строк кэшируется (путь + mtime + размер) - файл не перечитывается
+                counted = file_format.count_file_records(file_path)
+                if counted is None:
+                    logger.warning(f"Не удалось подсчитать записи в файле {file_name}")
+                records_in_file = counted or 0
+            elif has_log_entry:
+                # Файл не подсчитывается (потоковый режим): сравниваем с количеством
+                # записей последней успешной загрузки
+                cursor.execute(f"""
+                    SELECT RECORDS_LOADED FROM LOAD_LOGS
+                    WHERE UPPER({file_col}) = UPPER(:1)
+                    AND UPPER(TABLE_NAME) = UPPER(:2)
+                    AND LOAD_STATUS = 'SUCCESS'
+                    ORDER BY LOAD_START_TIME DESC
+                """, (file_name, table_name))
+                row = cursor.fetchone()
+                records_in_file = int(row[0] or 0) if row else 0
             
             # Файл считается загруженным, если:
             # 1. Есть запись в load_logs
@@ -543,7 +893,8 @@ class SPNetDataLoader:
             cursor.close()
     
     def parse_bill_month(self, value):
-        """Парсинг и преобразование BILL_MONTH из формата MMYYYY в YYYYMM"""
+        """Парсинг и преобразование BILL_MONTH из формата MMYYYY в YYYYMM
+        (значения уже в формате YYYYMM возвращаются как есть)"""
         if pd.isna(value) or value is None or str(value).strip() == '':
             return None
         
@@ -557,6 +908,12 @@ class SPNetDataLoader:
             year = int(bill_month) % 10000  # Последние 4 цифры = год
             month = int(bill_month) // 10000  # Первые цифры = месяц
             
+            # Новые выгрузки могут содержать YYYYMM (202509): MMYYYY с годом 2000-2100
+            # начинается с 1..12, поэтому форматы не пересекаются
+            if year < 2000 or year > 2100 or month < 1 or month > 12:
+                year = int(bill_month) // 100
+                month = int(bill_month) % 100
+            
             # Проверяем валидность
             if year < 2000 or year > 2100 or month < 1 or month > 12:
                 logger.warning(f"Некорректный BILL_MONTH: {bill_month} (год={year}, месяц={month})")
@@ -603,12 +960,34 @@ class SPNetDataLoader:
             self.connection.close()
             logger.info("Подключение к Oracle закрыто")
 
+def parse_args(argv=None):
+    """Разбор аргументов командной строки"""
+    parser = argparse.ArgumentParser(description="Загрузка отчетов SPNet в SPNET_TRAFFIC")
+    parser.add_argument('file_path', nargs='?', help="Путь к одному CSV/XLSX файлу (по умолчанию - все файлы директории)")
+    parser.add_argument('--bulk', action='store_true',
+                        help="Пакетный режим: executemany в SPNET_TRAFFIC_STAGE + дедупликация на сервере")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"Размер пакета executemany (по умолчанию {DEFAULT_BATCH_SIZE})")
+    parser.add_argument('--chunk-size', type=int, nargs='?', const=file_chunks.DEFAULT_CHUNK_SIZE, default=None,
+                        help=f"Потоковый режим: чтение и вставка порциями (по умолчанию {file_chunks.DEFAULT_CHUNK_SIZE} строк)")
+    parser.add_argument('--atomic-reload', action='store_true',
+                        help="Перезагрузка каждого файла одной транзакцией (отчеты не видят частичных данных)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Параллельная загрузка файлов: число процессов разбора и сессий Oracle (по умолчанию 1)")
+    return parser.parse_args(argv)
+
 def main():
     """Основная функция
     Использование:
         python load_spnet_traffic.py                    # Импорт всех файлов из директории
         python load_spnet_traffic.py /path/to/file.csv # Импорт одного файла
+        python load_spnet_traffic.py --bulk [--batch-size 10000]  # Пакетный режим
+        python load_spnet_traffic.py --chunk-size 50000           # Потоковый режим (большие файлы)
+        python load_spnet_traffic.py --workers 4                  # Параллельная загрузка файлов
+        python load_spnet_traffic.py --atomic-reload              # Файл перезагружается одной транзакцией
     """
+    args = parse_args()
+    
     # Конфигурация Oracle (прямое подключение из интранет)
     oracle_config = {
         'host': os.getenv('ORACLE_HOST'),  # Из переменной окружения
@@ -626,15 +1005,16 @@ def main():
         return False
     
     # Проверяем, передан ли путь к файлу как аргумент
-    if len(sys.argv) > 1:
+    if args.file_path:
         # Импорт одного файла
-        file_path = sys.argv[1]
+        file_path = args.file_path
         if not Path(file_path).exists():
             logger.error(f"❌ Файл не найден: {file_path}")
             return False
         
         logger.info(f"Импорт одного файла: {file_path}")
-        loader = SPNetDataLoader(oracle_config)
+        loader = SPNetDataLoader(oracle_config, bulk=args.bulk, batch_size=args.batch_size,
+                                 chunk_size=args.chunk_size, atomic_reload=args.atomic_reload)
         
         try:
             if not loader.connect_to_oracle():
@@ -662,7 +1042,9 @@ def main():
         logger.info("Запуск загрузчика данных SPNet...")
         
         # Создаем загрузчик
-        loader = SPNetDataLoader(oracle_config)
+        loader = SPNetDataLoader(oracle_config, bulk=args.bulk, batch_size=args.batch_size,
+                                 chunk_size=args.chunk_size, workers=args.workers,
+                                 atomic_reload=args.atomic_reload)
         
         try:
             # Подключаемся к Oracle
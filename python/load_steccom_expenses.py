@@ -12,6 +12,17 @@ from pathlib import Path
 import logging
 from datetime import datetime
 import sys
+import argparse
+
+try:
+    from python import record_conversion, file_chunks, file_format, parallel_load, load_manifest, load_logs_schema
+except ImportError:
+    import record_conversion
+    import file_chunks
+    import file_format
+    import parallel_load
+    import load_manifest
+    import load_logs_schema
 
 # Настройка логирования
 logging.basicConfig(
@@ -24,16 +35,61 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Ожидаемые колонки инвойсов STECCOM (новые файлы могут отличаться написанием)
+STECCOM_EXPECTED_COLUMNS = [
+    'Invoice Date', 'Company Name', 'Company Number', 'Settling Period',
+    'Fee Type', 'Contract ID', 'IMSI/ISDNA', 'ICC-ID/IMEI', 'Activation Date',
+    'Transaction Date', 'Service', 'Rate Type', 'Plan/Discount', 'Description',
+    'Prorated Days', 'Amount', 'Group'
+]
+
+# Поле записи -> (колонка файла, способ разбора); 'raw' - значение как есть
+STECCOM_FIELDS = [
+    ('invoice_date', 'Invoice Date', 'date'),
+    ('company_name', 'Company Name', 'raw'),
+    ('company_number', 'Company Number', 'number'),
+    ('settling_period', 'Settling Period', 'number'),
+    ('fee_type', 'Fee Type', 'raw'),
+    ('contract_id', 'Contract ID', 'raw'),
+    ('imsi_isdna', 'IMSI/ISDNA', 'raw'),
+    ('icc_id_imei', 'ICC-ID/IMEI', 'raw'),
+    ('activation_date', 'Activation Date', 'date'),
+    ('transaction_date', 'Transaction Date', 'date'),
+    ('service', 'Service', 'raw'),
+    ('rate_type', 'Rate Type', 'raw'),
+    ('plan_discount', 'Plan/Discount', 'raw'),
+    ('description', 'Description', 'raw'),
+    ('prorated_days', 'Prorated Days', 'number'),
+    ('amount', 'Amount', 'amount'),
+    ('group_name', 'Group', 'raw'),
+]
+
+def _norm_column_name(s):
+    """Нормализация имени колонки для сопоставления с ожидаемым"""
+    return str(s).upper().replace(' ', '').replace('-', '').replace('/', '').replace('_', '')
+
 class STECCOMDataLoader:
-    def __init__(self, oracle_config):
+    def __init__(self, oracle_config, chunk_size=None, workers=1, atomic_reload=False):
         """
         Инициализация загрузчика данных STECCOM
         
         Args:
             oracle_config (dict): Конфигурация подключения к Oracle
+            chunk_size (int): Потоковый режим - файл читается, преобразуется и
+                вставляется порциями по chunk_size строк (None - файл целиком)
+            workers (int): Число параллельно загружаемых файлов (процессы разбора
+                и сессии Oracle); 1 - последовательная загрузка
+            atomic_reload (bool): Перезагрузка файла одной транзакцией - отчеты
+                видят либо прежние, либо новые данные файла, без промежутка
         """
         self.oracle_config = oracle_config
         self.connection = None
+        self.chunk_size = chunk_size
+        self.workers = max(1, int(workers or 1))
+        # Одна транзакция на файл: COMMIT выполняет вызывающий код (параллельный режим)
+        self.commit_per_file = False
+        self._manifest = None
+        self.atomic_reload = atomic_reload
         # Каталог с CSV-инвойсами STECCOM относительно корня проекта.
         # Ищем в двух вариантах:
         #   1) STECCOMLLCRussiaSBD.AccessFees_reports
@@ -53,23 +109,25 @@ class STECCOMDataLoader:
             # Если каталог не найден, оставляем дефолт и далее будет warning "CSV файлы STECCOM не найдены"
             self.gdrive_path = base_paths[0]
         
+    def make_dsn(self):
+        """DSN подключения к Oracle (SID, если задан, иначе SERVICE_NAME)"""
+        if self.oracle_config.get('sid'):
+            return cx_Oracle.makedsn(
+                self.oracle_config['host'],
+                self.oracle_config['port'],
+                sid=self.oracle_config['sid']
+            )
+        service_name = self.oracle_config.get('service_name', 'bm7')
+        return cx_Oracle.makedsn(
+            self.oracle_config['host'],
+            self.oracle_config['port'],
+            service_name=service_name
+        )
+    
     def connect_to_oracle(self):
         """Подключение к Oracle базе данных (с поддержкой SID и SERVICE_NAME)"""
         try:
-            # Используем SID если задан, иначе SERVICE_NAME
-            if self.oracle_config.get('sid'):
-                dsn = cx_Oracle.makedsn(
-                    self.oracle_config['host'],
-                    self.oracle_config['port'],
-                    sid=self.oracle_config['sid']
-                )
-            else:
-                service_name = self.oracle_config.get('service_name', 'bm7')
-                dsn = cx_Oracle.makedsn(
-                    self.oracle_config['host'],
-                    self.oracle_config['port'],
-                    service_name=service_name
-                )
+            dsn = self.make_dsn()
             
             self.connection = cx_Oracle.connect(
                 user=self.oracle_config['username'],
@@ -95,22 +153,51 @@ class STECCOMDataLoader:
         skipped_files = 0
         load_start_time = datetime.now()
         
+        files_to_load = []
         for file_path in csv_files:
+            file_name = Path(file_path).name
+            # Манифест: неизменившийся файл пропускается по SHA-256, без подсчета записей
+            status, entry = self._get_manifest().check('STECCOM_EXPENSES', file_path)
+            if status == load_manifest.UNCHANGED:
+                logger.info(f"⏭ Пропускаем файл (не изменился с загрузки {entry.loaded_at}): {file_name}")
+                skipped_files += 1
+                continue
+            if status == load_manifest.CHANGED:
+                logger.info(f"🔄 Файл изменился с загрузки {entry.loaded_at} (другой SHA-256): {file_name}")
+                logger.info(f"   Перезагружаем файл...")
+                files_to_load.append(file_path)
+                continue
+            
+            # Файла нет в манифесте: проверяем по LOAD_LOGS и количеству записей
+            # В потоковом режиме файл не перечитывается для подсчета строк
+            count_path = None if self.chunk_size else file_path
+            is_loaded, records_in_file, records_in_db = self.is_file_loaded(file_name, 'STECCOM_EXPENSES', count_path)
+            if is_loaded:
+                logger.info(f"⏭ Пропускаем файл (уже загружен полностью): {file_name}")
+                if records_in_file > 0 and records_in_db > 0:
+                    logger.info(f"   Записей в файле: {records_in_file:,}, в базе: {records_in_db:,}")
+                # Файл загружен до появления манифеста - запоминаем его хэш
+                self._get_manifest().record('STECCOM_EXPENSES', file_path, records_in_file or None, records_in_db)
+                skipped_files += 1
+                continue
+            elif records_in_db > 0:
+                logger.info(f"⚠️ Файл загружен не полностью: {file_name}")
+                logger.info(f"   Записей в файле: {records_in_file:,}, в базе: {records_in_db:,} (не хватает {records_in_file - records_in_db:,})")
+                logger.info(f"   Перезагружаем файл...")
+            files_to_load.append(file_path)
+        
+        if self.workers > 1 and len(files_to_load) > 1:
+            # Параллельный режим: разбор в пуле процессов, вставка через пул сессий Oracle
+            if self.chunk_size:
+                logger.warning("Потоковый режим не используется при параллельной загрузке: файлы разбираются целиком")
+            logger.info(f"Параллельная загрузка {len(files_to_load)} файлов, воркеров: {self.workers}")
+            results = parallel_load.load_files_parallel(self, files_to_load, 'STECCOM_EXPENSES', self.workers)
+            total_records += sum(r.records_loaded for r in results)
+            files_to_load = []
+        
+        for file_path in files_to_load:
             file_name = Path(file_path).name
             try:
-                # Проверяем, загружен ли файл уже
-                is_loaded, records_in_file, records_in_db = self.is_file_loaded(file_name, 'STECCOM_EXPENSES', file_path)
-                if is_loaded:
-                    logger.info(f"⏭ Пропускаем файл (уже загружен полностью): {file_name}")
-                    if records_in_file > 0 and records_in_db > 0:
-                        logger.info(f"   Записей в файле: {records_in_file:,}, в базе: {records_in_db:,}")
-                    skipped_files += 1
-                    continue
-                elif records_in_db > 0:
-                    logger.info(f"⚠️ Файл загружен не полностью: {file_name}")
-                    logger.info(f"   Записей в файле: {records_in_file:,}, в базе: {records_in_db:,} (не хватает {records_in_file - records_in_db:,})")
-                    logger.info(f"   Перезагружаем файл...")
-                
                 logger.info(f"Обрабатываем файл: {file_name}")
                 file_start_time = datetime.now()
                 records_loaded = self.load_single_file(file_path)
@@ -120,6 +207,7 @@ class STECCOMDataLoader:
                 
                 # Логируем успешную загрузку файла
                 self.log_load_success('STECCOM_EXPENSES', file_name, records_loaded, file_start_time, file_end_time, file_duration)
+                self.record_manifest('STECCOM_EXPENSES', file_path, records_loaded)
                 logger.info(f"✓ Загружено {records_loaded} записей из {file_name}")
                 
             except Exception as e:
@@ -140,128 +228,18 @@ class STECCOMDataLoader:
     
     def load_single_file(self, file_path):
         """Загрузка одного CSV файла"""
+        if self.atomic_reload and not self.commit_per_file:
+            return self.load_single_file_atomic(file_path)
+        if self.chunk_size:
+            return self.load_single_file_streaming(file_path)
         try:
-            # Пробуем разные кодировки для чтения файла
-            encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
-            df = None
-            
-            for encoding in encodings:
-                try:
-                    # Пробуем разные разделители
-                    separators = [';', '\t', ',']
-                    for sep in separators:
-                        try:
-                            df = pd.read_csv(file_path, sep=sep, encoding=encoding, 
-                                           dtype=str,  # Читаем все как строки
-                                           na_filter=False,  # Не конвертируем в NaN
-                                           quotechar='"')  # Кавычки для полей
-                            if len(df.columns) > 1:
-                                logger.info(f"Успешно прочитан файл {file_path} с разделителем '{sep}' и кодировкой {encoding}")
-                                break
-                        except Exception as e:
-                            logger.warning(f"Ошибка чтения {file_path} с разделителем '{sep}' и кодировкой {encoding}: {e}")
-                            continue
-                    if len(df.columns) > 1:
-                        break
-                except Exception as e:
-                    logger.warning(f"Ошибка чтения {file_path} с кодировкой {encoding}: {e}")
-                    continue
-            
-            if df is None or len(df.columns) <= 1:
-                logger.error(f"Не удалось прочитать файл {file_path}")
+            records = self.read_file_records(file_path)
+            if records is None:
                 return 0
             
-            # Нормализация названий колонок (пробелы, регистр) для совместимости с разными форматами
-            df.columns = [str(c).strip() for c in df.columns]
-            
-            # Сопоставление возможных имён колонок с ожидаемыми (новые файлы могут отличаться)
-            def _norm(s):
-                return str(s).upper().replace(' ', '').replace('-', '').replace('/', '').replace('_', '')
-            expected = [
-                'Invoice Date', 'Company Name', 'Company Number', 'Settling Period',
-                'Fee Type', 'Contract ID', 'IMSI/ISDNA', 'ICC-ID/IMEI', 'Activation Date',
-                'Transaction Date', 'Service', 'Rate Type', 'Plan/Discount', 'Description',
-                'Prorated Days', 'Amount', 'Group'
-            ]
-            col_aliases = {}
-            for col in df.columns:
-                n = _norm(col)
-                for exp in expected:
-                    if _norm(exp) == n:
-                        col_aliases[exp] = col
-                        break
-            
-            def _get(row, key):
-                if key in row:
-                    v = row[key]
-                    if v is not None and str(v).strip() != '':
-                        return v
-                alt = col_aliases.get(key)
-                if alt and alt in row:
-                    v = row[alt]
-                    if v is not None and str(v).strip() != '':
-                        return v
-                return row.get(key)
-            
-            # Если данные в одной колонке, пытаемся разделить
-            if len(df.columns) == 2:
-                main_col = df.columns[0]
-                split_data = df[main_col].str.split(';', expand=True)
-                
-                if len(split_data.columns) >= 17:
-                    column_names = [
-                        'Invoice Date', 'Company Name', 'Company Number', 'Settling Period',
-                        'Fee Type', 'Contract ID', 'IMSI/ISDNA', 'ICC-ID/IMEI', 'Activation Date',
-                        'Transaction Date', 'Service', 'Rate Type', 'Plan/Discount', 'Description',
-                        'Prorated Days', 'Amount', 'Group'
-                    ]
-                    split_data.columns = column_names[:len(split_data.columns)]
-                    df = split_data
-            
-            df['source_file'] = Path(file_path).name
-            df['load_date'] = datetime.now()
-            df['created_by'] = 'STECCOM_LOADER'
-            
             # Идемпотентность: удаляем старые записи этого файла, чтобы повторная загрузка не дублировала данные
             self._delete_records_by_source_file('STECCOM_EXPENSES', Path(file_path).name)
             
-            # Подготавливаем данные для вставки (исключаем только BROADBAND)
-            records = []
-            skipped_broadband = 0
-            for _, row in df.iterrows():
-                # Пропускаем записи с SERVICE = 'BROADBAND'
-                service = str(_get(row, 'Service') or '').strip().upper()
-                if service == 'BROADBAND':
-                    skipped_broadband += 1
-                    continue
-                
-                record = {
-                    'invoice_date': self.parse_date(_get(row, 'Invoice Date')),
-                    'company_name': _get(row, 'Company Name'),
-                    'company_number': self.parse_number(_get(row, 'Company Number')),
-                    'settling_period': self.parse_number(_get(row, 'Settling Period')),
-                    'fee_type': _get(row, 'Fee Type'),
-                    'contract_id': _get(row, 'Contract ID'),
-                    'imsi_isdna': _get(row, 'IMSI/ISDNA'),
-                    'icc_id_imei': _get(row, 'ICC-ID/IMEI'),
-                    'activation_date': self.parse_date(_get(row, 'Activation Date')),
-                    'transaction_date': self.parse_date(_get(row, 'Transaction Date')),
-                    'service': _get(row, 'Service'),
-                    'rate_type': _get(row, 'Rate Type'),
-                    'plan_discount': _get(row, 'Plan/Discount'),
-                    'description': _get(row, 'Description'),
-                    'prorated_days': self.parse_number(_get(row, 'Prorated Days')),
-                    'amount': self.parse_amount(_get(row, 'Amount')),
-                    'group_name': _get(row, 'Group'),
-                    'source_file': row.get('source_file'),
-                    'load_date': row.get('load_date'),
-                    'created_by': row.get('created_by')
-                }
-                records.append(record)
-            
-            if skipped_broadband > 0:
-                logger.info(f"Пропущено {skipped_broadband} записей с SERVICE = 'BROADBAND'")
-            
             # Вставляем данные в Oracle (удаление по SOURCE_FILE уже выполнено выше)
             return self.insert_records(records)
             
@@ -269,6 +247,221 @@ class STECCOMDataLoader:
             logger.error(f"Ошибка при загрузке файла {file_path}: {e}")
             raise
     
+    def load_single_file_atomic(self, file_path):
+        """Перезагрузка файла одной транзакцией: удаление старых записей файла,
+        вставка новых и один COMMIT в конце
+        
+        До COMMIT отчеты (V_CONSOLIDATED_REPORT_WITH_BILLING и др.) видят прежние
+        данные файла, после - новые; при ошибке ROLLBACK оставляет прежние.
+        """
+        self.commit_per_file = True
+        try:
+            records_loaded = self.load_single_file(file_path)
+            self.connection.commit()
+            return records_loaded
+        except Exception:
+            self.connection.rollback()
+            raise
+        finally:
+            self.commit_per_file = False
+    
+    def read_file_records(self, file_path):
+        """Чтение CSV файла и преобразование в записи (без Oracle)
+        
+        Returns:
+            list[dict] или None, если файл не удалось прочитать
+        """
+        # Кодировка и разделитель определяются по началу файла
+        df, csv_format = file_format.read_csv_file(file_path)
+        if df is not None:
+            logger.info(f"Успешно прочитан файл {file_path} с разделителем '{csv_format.sep}' и кодировкой {csv_format.encoding}")
+            file_format.remember_record_count(file_path, len(df))
+        
+        if df is None or len(df.columns) <= 1:
+            logger.error(f"Не удалось прочитать файл {file_path}")
+            return None
+        
+        df = self._prepare_dataframe(df)
+        
+        # Подготавливаем данные для вставки (исключаем только BROADBAND)
+        records, skipped_broadband = self.dataframe_to_records(df, Path(file_path).name)
+        
+        if skipped_broadband > 0:
+            logger.info(f"Пропущено {skipped_broadband} записей с SERVICE = 'BROADBAND'")
+        
+        return records
+    
+    def load_single_file_streaming(self, file_path):
+        """Потоковая загрузка одного CSV файла порциями по chunk_size строк
+        
+        Чтение следующей порции идет в фоне, пока текущая преобразуется и
+        вставляется в Oracle; в памяти не больше двух порций. Количество строк
+        файла считается в том же проходе.
+        """
+        try:
+            source_file = Path(file_path).name
+            csv_format = file_format.detect_csv_format(file_path)
+            if csv_format is None:
+                logger.error(f"Не удалось прочитать файл {file_path}")
+                return 0
+            
+            while True:
+                logger.info(f"Потоковое чтение {file_path} с разделителем '{csv_format.sep}' и кодировкой {csv_format.encoding}")
+                chunks = file_chunks.iter_csv_chunks(file_path, csv_format.encoding, csv_format.sep, self.chunk_size)
+                try:
+                    return self._load_chunks(chunks, file_path, source_file)
+                except UnicodeDecodeError:
+                    # Кодировка не подошла дальше образца - повтор с начала файла
+                    # (перед первой порцией записи файла снова удаляются)
+                    csv_format = file_format.mark_decode_error(file_path)
+                    if csv_format is None:
+                        raise
+                    logger.warning(f"Ошибка декодирования {file_path}, повтор с кодировкой {csv_format.encoding}")
+            
+        except Exception as e:
+            logger.error(f"Ошибка при потоковой загрузке файла {file_path}: {e}")
+            raise
+    
+    def _load_chunks(self, chunks, file_path, source_file):
+        """Вставка порций файла; возвращает количество вставленных записей"""
+        load_date = datetime.now()
+        rows_in_file = 0
+        inserted_count = 0
+        skipped_broadband = 0
+        for chunk_no, df in enumerate(file_chunks.prefetch(chunks), 1):
+            df = self._prepare_dataframe(df)
+            
+            # Идемпотентность: удаляем старые записи этого файла перед первой порцией
+            if chunk_no == 1:
+                self._delete_records_by_source_file('STECCOM_EXPENSES', source_file)
+            
+            records, skipped = self.dataframe_to_records(df, source_file, load_date)
+            skipped_broadband += skipped
+            inserted_count += self.insert_records(records)
+            rows_in_file += len(df)
+            logger.info(f"  Порция {chunk_no}: {len(df):,} строк (прочитано {rows_in_file:,}, вставлено {inserted_count:,})")
+        
+        file_format.remember_record_count(file_path, rows_in_file)
+        if skipped_broadband > 0:
+            logger.info(f"Пропущено {skipped_broadband} записей с SERVICE = 'BROADBAND'")
+        logger.info(f"Записей в файле: {rows_in_file:,}, загружено: {inserted_count:,}")
+        return inserted_count
+    
+    def _prepare_dataframe(self, df):
+        """Нормализация колонок прочитанного файла (или порции)"""
+        # Нормализация названий колонок (пробелы, регистр) для совместимости с разными форматами
+        df.columns = [str(c).strip() for c in df.columns]
+        
+        # Если данные в одной колонке, пытаемся разделить
+        if len(df.columns) == 2:
+            main_col = df.columns[0]
+            split_data = df[main_col].str.split(';', expand=True)
+            
+            if len(split_data.columns) >= 17:
+                split_data.columns = STECCOM_EXPECTED_COLUMNS[:len(split_data.columns)]
+                df = split_data
+        return df
+    
+    def dataframe_to_records(self, df, source_file, load_date=None):
+        """Преобразование DataFrame в записи для вставки (по колонкам, без iterrows)
+        
+        Сопоставление колонок выполняется один раз, числа и суммы разбираются
+        векторно, даты - по уникальным значениям. Результат совпадает с
+        _dataframe_to_records_rowwise.
+        
+        Returns:
+            tuple: (records, skipped_broadband)
+        """
+        if load_date is None:
+            load_date = datetime.now()
+        col_map = record_conversion.resolve_columns(df.columns, STECCOM_EXPECTED_COLUMNS, _norm_column_name)
+        
+        # Пропускаем записи с SERVICE = 'BROADBAND'
+        service = record_conversion.str_or_none(record_conversion.column_values(df, 'Service', col_map))
+        keep = ~pd.Series(service, dtype=object).str.upper().eq('BROADBAND').to_numpy(dtype=bool)
+        skipped_broadband = int((~keep).sum())
+        
+        bind_arrays = {}
+        for field, column, kind in STECCOM_FIELDS:
+            values = record_conversion.column_values(df, column, col_map)[keep]
+            if kind == 'date':
+                bind_arrays[field] = record_conversion.parse_by_unique(values, self.parse_date)
+            elif kind == 'number':
+                bind_arrays[field] = record_conversion.parse_numbers(values, self.parse_number)
+            elif kind == 'amount':
+                bind_arrays[field] = record_conversion.parse_amounts(values, self.parse_amount)
+            else:
+                bind_arrays[field] = values
+        
+        n = int(keep.sum())
+        bind_arrays['source_file'] = record_conversion.constant(source_file, n)
+        bind_arrays['load_date'] = record_conversion.constant(pd.Timestamp(load_date), n)
+        bind_arrays['created_by'] = record_conversion.constant('STECCOM_LOADER', n)
+        
+        return record_conversion.bind_arrays_to_records(bind_arrays), skipped_broadband
+    
+    def _dataframe_to_records_rowwise(self, df, source_file, load_date=None):
+        """Построчное преобразование DataFrame в записи (исходная реализация,
+        эталон для проверки dataframe_to_records)
+        
+        Returns:
+            tuple: (records, skipped_broadband)
+        """
+        if load_date is None:
+            load_date = datetime.now()
+        col_aliases = record_conversion.resolve_columns(df.columns, STECCOM_EXPECTED_COLUMNS, _norm_column_name)
+        
+        def _get(row, key):
+            if key in row:
+                v = row[key]
+                if v is not None and str(v).strip() != '':
+                    return v
+            alt = col_aliases.get(key)
+            if alt and alt in row:
+                v = row[alt]
+                if v is not None and str(v).strip() != '':
+                    return v
+            return row.get(key)
+        
+        df = df.copy()
+        df['source_file'] = source_file
+        df['load_date'] = load_date
+        df['created_by'] = 'STECCOM_LOADER'
+        
+        records = []
+        skipped_broadband = 0
+        for _, row in df.iterrows():
+            # Пропускаем записи с SERVICE = 'BROADBAND'
+            service = str(_get(row, 'Service') or '').strip().upper()
+            if service == 'BROADBAND':
+                skipped_broadband += 1
+                continue
+            
+            record = {
+                'invoice_date': self.parse_date(_get(row, 'Invoice Date')),
+                'company_name': _get(row, 'Company Name'),
+                'company_number': self.parse_number(_get(row, 'Company Number')),
+                'settling_period': self.parse_number(_get(row, 'Settling Period')),
+                'fee_type': _get(row, 'Fee Type'),
+                'contract_id': _get(row, 'Contract ID'),
+                'imsi_isdna': _get(row, 'IMSI/ISDNA'),
+                'icc_id_imei': _get(row, 'ICC-ID/IMEI'),
+                'activation_date': self.parse_date(_get(row, 'Activation Date')),
+                'transaction_date': self.parse_date(_get(row, 'Transaction Date')),
+                'service': _get(row, 'Service'),
+                'rate_type': _get(row, 'Rate Type'),
+                'plan_discount': _get(row, 'Plan/Discount'),
+                'description': _get(row, 'Description'),
+                'prorated_days': self.parse_number(_get(row, 'Prorated Days')),
+                'amount': self.parse_amount(_get(row, 'Amount')),
+                'group_name': _get(row, 'Group'),
+                'source_file': row.get('source_file'),
+                'load_date': row.get('load_date'),
+                'created_by': row.get('created_by')
+            }
+            records.append(record)
+        return records, skipped_broadband
+    
     def parse_date(self, date_str):
         """Парсинг даты"""
         if pd.isna(date_str) or date_str is None or str(date_str).strip() == '':
@@ -335,6 +528,12 @@ class STECCOMDataLoader:
         except:
             return None
     
+    def _commit(self):
+        """COMMIT после удаления/вставки (в режиме одной транзакции на файл -
+        выполняется вызывающим кодом после загрузки всего файла)"""
+        if not self.commit_per_file:
+            self.connection.commit()
+    
     def _delete_records_by_source_file(self, table_name, source_file):
         """Удаляет из таблицы все записи с данным SOURCE_FILE (для идемпотентной перезагрузки)."""
         if not self.connection or not source_file:
@@ -346,11 +545,14 @@ class STECCOMDataLoader:
                 (source_file,)
             )
             deleted = cursor.rowcount
-            self.connection.commit()
+            self._commit()
             if deleted > 0:
                 logger.info(f"Удалено {deleted} старых записей по файлу {source_file} перед загрузкой")
         except Exception as e:
             self.connection.rollback()
+            if self.commit_per_file:
+                # В транзакции файла вставка без удаления дала бы дубликаты
+                raise
             logger.warning(f"Не удалось удалить старые записи по {source_file}: {e}")
         finally:
             cursor.close()
@@ -380,7 +582,7 @@ class STECCOMDataLoader:
             
             # Выполняем вставку
             cursor.executemany(insert_sql, records)
-            self.connection.commit()
+            self._commit()
             
             return len(records)
             
@@ -392,43 +594,20 @@ class STECCOMDataLoader:
             cursor.close()
     
     def _get_load_logs_columns(self):
-        """Определение структуры таблицы LOAD_LOGS (динамически)"""
-        cursor = self.connection.cursor()
-        try:
-            # Проверяем FILE_NAME vs SOURCE_FILE
-            try:
-                test_query = "SELECT FILE_NAME FROM LOAD_LOGS WHERE ROWNUM = 1"
-                cursor.execute(test_query)
-                file_col = "FILE_NAME"
-            except:
-                try:
-                    test_query = "SELECT SOURCE_FILE FROM LOAD_LOGS WHERE ROWNUM = 1"
-                    cursor.execute(test_query)
-                    file_col = "SOURCE_FILE"
-                except:
-                    logger.warning("Не удалось определить структуру LOAD_LOGS, используем SOURCE_FILE по умолчанию")
-                    file_col = "SOURCE_FILE"
-            
-            # Проверяем LOADED_BY vs CREATED_BY
-            try:
-                test_query = "SELECT LOADED_BY FROM LOAD_LOGS WHERE ROWNUM = 1"
-                cursor.execute(test_query)
-                loaded_by_col = "LOADED_BY"
-            except:
-                try:
-                    test_query = "SELECT CREATED_BY FROM LOAD_LOGS WHERE ROWNUM = 1"
-                    cursor.execute(test_query)
-                    loaded_by_col = "CREATED_BY"
-                except:
-                    logger.warning("Не удалось определить столбец для created_by, используем CREATED_BY по умолчанию")
-                    loaded_by_col = "CREATED_BY"
-            
-            return file_col, loaded_by_col
-        except Exception as e:
-            logger.warning(f"Ошибка при определении структуры LOAD_LOGS: {e}, используем значения по умолчанию")
-            return "SOURCE_FILE", "CREATED_BY"
-        finally:
-            cursor.close()
+        """Определение структуры таблицы LOAD_LOGS (один раз на подключение, USER_TAB_COLUMNS)"""
+        return load_logs_schema.get_load_logs_columns(self.connection)
+    
+    def _get_manifest(self):
+        """Манифест загруженных файлов (LOAD_MANIFEST) на основном подключении"""
+        if self._manifest is None or self._manifest.connection is not self.connection:
+            self._manifest = load_manifest.LoadManifest(self.connection, 'STECCOM_LOADER')
+        return self._manifest
+    
+    def record_manifest(self, table_name, file_path, records_loaded):
+        """Запись хэша успешно загруженного файла в манифест"""
+        if records_loaded > 0:
+            # Количество строк уже в кэше file_format (подсчитано при чтении файла)
+            self._get_manifest().record(table_name, file_path, file_format.count_file_records(file_path), records_loaded)
     
     def is_file_loaded(self, file_name, table_name='STECCOM_EXPENSES', file_path=None):
         """Проверка, загружен ли файл уже и полностью ли загружен
@@ -436,7 +615,8 @@ class STECCOMDataLoader:
         Args:
             file_name: имя файла
             table_name: имя таблицы
-            file_path: путь к файлу (опционально, для проверки количества записей)
+            file_path: путь к файлу (опционально, для проверки количества записей;
+                без него сравнение идет с RECORDS_LOADED последней успешной загрузки)
         
         Returns:
             tuple: (is_loaded: bool, records_in_file: int, records_in_db: int)
@@ -468,16 +648,23 @@ class STECCOMDataLoader:
             
             # Если есть путь к файлу, проверяем количество записей в файле
             if file_path and Path(file_path).exists():
-                try:
-                    file_ext = Path(file_path).suffix.lower()
-                    if file_ext == '.xlsx':
-                        df = pd.read_excel(file_path, dtype=str, na_filter=False, engine='openpyxl')
-                    else:
-                        df = pd.read_csv(file_path, dtype=str, na_filter=False, quotechar='"')
-                    df = df.dropna(how='all')
-                    records_in_file = len(df)
-                except Exception as e:
-                    logger.warning(f"Не удалось подсчитать записи в файле {file_name}: {e}")
+                # Количество строк кэшируется (путь + mtime + размер) - файл не перечитывается
+                counted = file_format.count_file_records(file_path)
+                if counted is None:
+                    logger.warning(f"Не удалось подсчитать записи в файле {file_name}")
+                records_in_file = counted or 0
+            elif has_log_entry:
+                # Файл не подсчитывается (потоковый режим): сравниваем с количеством
+                # записей последней успешной загрузки
+                cursor.execute(f"""
+                    SELECT RECORDS_LOADED FROM LOAD_LOGS
+                    WHERE UPPER({file_col}) = UPPER(:1)
+                    AND UPPER(TABLE_NAME) = UPPER(:2)
+                    AND LOAD_STATUS = 'SUCCESS'
+                    ORDER BY LOAD_START_TIME DESC
+                """, (file_name, table_name))
+                row = cursor.fetchone()
+                records_in_file = int(row[0] or 0) if row else 0
             
             # Файл считается загруженным, если:
             # 1. Есть запись в load_logs
@@ -602,8 +789,27 @@ class STECCOMDataLoader:
             self.connection.close()
             logger.info("Подключение к Oracle закрыто")
 
+def parse_args(argv=None):
+    """Разбор аргументов командной строки"""
+    parser = argparse.ArgumentParser(description="Загрузка инвойсов STECCOM в STECCOM_EXPENSES")
+    parser.add_argument('--chunk-size', type=int, nargs='?', const=file_chunks.DEFAULT_CHUNK_SIZE, default=None,
+                        help=f"Потоковый режим: чтение и вставка порциями (по умолчанию {file_chunks.DEFAULT_CHUNK_SIZE} строк)")
+    parser.add_argument('--atomic-reload', action='store_true',
+                        help="Перезагрузка каждого файла одной транзакцией (отчеты не видят частичных данных)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Параллельная загрузка файлов: число процессов разбора и сессий Oracle (по умолчанию 1)")
+    return parser.parse_args(argv)
+
 def main():
-    """Основная функция"""
+    """Основная функция
+    Использование:
+        python load_steccom_expenses.py                    # Импорт всех файлов из директории
+        python load_steccom_expenses.py --chunk-size 50000 # Потоковый режим (большие файлы)
+        python load_steccom_expenses.py --workers 4        # Параллельная загрузка файлов
+        python load_steccom_expenses.py --atomic-reload    # Файл перезагружается одной транзакцией
+    """
+    args = parse_args()
+    
     # Конфигурация Oracle (прямое подключение из интранет)
     oracle_config = {
         'host': os.getenv('ORACLE_HOST'),  # Из переменной окружения
@@ -623,7 +829,8 @@ def main():
     logger.info("Запуск загрузчика данных STECCOM...")
     
     # Создаем загрузчик
-    loader = STECCOMDataLoader(oracle_config)
+    loader = STECCOMDataLoader(oracle_config, chunk_size=args.chunk_size, workers=args.workers,
+                                atomic_reload=args.atomic_reload)
     
     try:
         # Подключаемся к Oracle
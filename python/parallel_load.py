@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Параллельная загрузка файлов SPNet/STECCOM (--workers N)
+
+Разбор файлов (чтение и преобразование в записи) идет в пуле процессов,
+вставка - в пуле потоков, каждый поток берет сессию из пула Oracle
+(не больше N сессий). Каждый файл загружается одной транзакцией:
+удаление старых записей файла + вставка + COMMIT (при ошибке - ROLLBACK,
+в таблице остаются прежние данные файла). Записи LOAD_LOGS пишутся
+основным подключением в порядке списка файлов, вместе с манифестом загрузок.
+"""
+
+import copy
+import logging
+import os
+import threading
+import time
+from collections import deque, namedtuple, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import cx_Oracle
+
+try:
+    from python import file_format
+except ImportError:
+    import file_format
+
+logger = logging.getLogger(__name__)
+
+FileResult = namedtuple('FileResult', [
+    'file_path', 'records_loaded', 'start_time', 'end_time', 'error',
+    'parse_worker', 'parse_seconds', 'insert_worker', 'insert_seconds'
+])
+
+
+def create_session_pool(loader, size):
+    """Пул сессий Oracle для потоков вставки (не больше size сессий)"""
+    config = loader.oracle_config
+    return cx_Oracle.SessionPool(
+        user=config['username'],
+        password=config['password'],
+        dsn=loader.make_dsn(),
+        min=1,
+        max=size,
+        increment=1,
+        getmode=cx_Oracle.SPOOL_ATTRVAL_WAIT
+    )
+
+
+def _parse_file(loader_cls, file_path):
+    """Разбор файла в процессе пула (без подключения к Oracle)"""
+    started = time.perf_counter()
+    records = loader_cls({}).read_file_records(file_path)
+    # Количество строк подсчитано при чтении (кэш file_format процесса разбора)
+    records_in_file = file_format.count_file_records(file_path) if records is not None else None
+    return records, records_in_file, f"pid {os.getpid()}", time.perf_counter() - started
+
+
+def _load_parsed(loader, session_pool, table_name, file_path, parse_future):
+    """Вставка разобранного файла в одной транзакции на сессии из пула"""
+    insert_worker = threading.current_thread().name
+    parse_worker, parse_seconds = None, 0.0
+    start_time = datetime.now()
+    try:
+        records, records_in_file, parse_worker, parse_seconds = parse_future.result()
+        if records_in_file is not None:
+            file_format.remember_record_count(file_path, records_in_file)
+        start_time = datetime.now()
+        if records is None:
+            return FileResult(file_path, 0, start_time, datetime.now(), None,
+                              parse_worker, parse_seconds, insert_worker, 0.0)
+
+        started = time.perf_counter()
+        connection = session_pool.acquire()
+        try:
+            worker = copy.copy(loader)
+            worker.connection = connection
+            worker.commit_per_file = True
+            worker._delete_records_by_source_file(table_name, Path(file_path).name)
+            records_loaded = worker.insert_records(records)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            session_pool.release(connection)
+        return FileResult(file_path, records_loaded, start_time, datetime.now(), None,
+                          parse_worker, parse_seconds, insert_worker, time.perf_counter() - started)
+    except Exception as e:
+        return FileResult(file_path, 0, start_time, datetime.now(), e,
+                          parse_worker, parse_seconds, insert_worker, 0.0)
+
+
+def load_files_parallel(loader, file_paths, table_name, workers):
+    """Параллельная загрузка списка файлов
+
+    Args:
+        loader: загрузчик с основным подключением (для LOAD_LOGS)
+        file_paths: файлы для загрузки (уже без пропущенных)
+        table_name: целевая таблица (SPNET_TRAFFIC / STECCOM_EXPENSES)
+        workers: число процессов разбора и сессий Oracle
+
+    Returns:
+        list[FileResult] в порядке file_paths
+    """
+    results = []
+    session_pool = create_session_pool(loader, workers)
+
+    def _collect(future):
+        # Результаты забираются по порядку файлов - LOAD_LOGS пишется в том же порядке
+        result = future.result()
+        file_name = Path(result.file_path).name
+        if result.error is None:
+            duration = (result.end_time - result.start_time).total_seconds()
+            loader.log_load_success(table_name, file_name, result.records_loaded,
+                                    result.start_time, result.end_time, duration)
+            loader.record_manifest(table_name, result.file_path, result.records_loaded)
+            logger.info(f"✓ Загружено {result.records_loaded} записей из {file_name}")
+        else:
+            logger.error(f"✗ Ошибка при обработке файла {result.file_path}: {result.error}")
+            loader.log_load_error(table_name, file_name, str(result.error))
+        results.append(result)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as parse_pool, \
+                ThreadPoolExecutor(max_workers=workers, thread_name_prefix='oracle') as insert_pool:
+            # Не больше 2*workers разобранных файлов в памяти одновременно
+            pending = deque()
+            for file_path in file_paths:
+                if len(pending) >= 2 * workers:
+                    _collect(pending.popleft())
+                logger.info(f"Обрабатываем файл: {Path(file_path).name}")
+                parse_future = parse_pool.submit(_parse_file, type(loader), file_path)
+                pending.append(insert_pool.submit(
+                    _load_parsed, loader, session_pool, table_name, file_path, parse_future
+                ))
+            while pending:
+                _collect(pending.popleft())
+    finally:
+        session_pool.close()
+
+    log_worker_summary(results)
+    return results
+
+
+def _summarize(results, worker_field, seconds_field):
+    summary = OrderedDict()
+    for result in results:
+        worker = getattr(result, worker_field)
+        if worker is None:
+            continue
+        files, records, seconds = summary.get(worker, (0, 0, 0.0))
+        summary[worker] = (files + 1, records + result.records_loaded, seconds + getattr(result, seconds_field))
+    return summary
+
+
+def log_worker_summary(results):
+    """Сводка производительности по процессам разбора и сессиям вставки"""
+    for title, worker_field, seconds_field in [
+        ("Разбор файлов (процессы)", 'parse_worker', 'parse_seconds'),
+        ("Вставка в Oracle (сессии)", 'insert_worker', 'insert_seconds'),
+    ]:
+        logger.info(title + ":")
+        for worker, (files, records, seconds) in _summarize(results, worker_field, seconds_field).items():
+            logger.info(
+                f"  {worker}: файлов {files}, записей {records:,}, {seconds:.2f} сек "
+                f"({records / seconds if seconds > 0 else 0:,.0f} записей/сек)"
+            )
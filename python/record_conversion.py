@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Колоночное преобразование DataFrame в записи для загрузчиков SPNet и STECCOM
+
+Вместо df.iterrows() и вызова парсеров для каждой ячейки колонки разбираются
+целиком (pandas/NumPy). Результат совпадает с построчным путём загрузчиков:
+- строки в типичном формате разбираются векторно;
+- нетипичные значения (и колонки с пропусками после разбиения строк)
+  передаются в исходные построчные парсеры загрузчика;
+- колонки с малым числом уникальных значений (даты, BILL_MONTH) разбираются
+  по уникальным значениям (factorize) и раскладываются обратно.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Число после очистки parse_number: только цифры, точка, знаки и 'E'
+_NUMBER_RE = r'[+-]?(?:\d+\.?\d*|\.\d+)(?:E[+-]?\d+)?'
+# Сумма после очистки parse_amount (float() принимает и 'e')
+_AMOUNT_RE = r'[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?'
+
+
+def resolve_columns(columns, expected, norm):
+    """Сопоставление ожидаемых имён колонок с фактическими (один раз на файл).
+
+    Returns:
+        dict: ожидаемое имя -> фактическое имя колонки
+    """
+    col_map = {}
+    for col in columns:
+        n = norm(col)
+        for exp in expected:
+            if norm(exp) == n:
+                col_map[exp] = col
+                break
+    return col_map
+
+
+def _as_object(df, name):
+    return df[name].to_numpy(dtype=object)
+
+
+def _has_missing(values):
+    return bool(pd.isna(values).any())
+
+
+def _is_filled(values):
+    """Маска `v is not None and str(v).strip() != ''`"""
+    if _has_missing(values):
+        return np.fromiter(
+            (v is not None and str(v).strip() != '' for v in values),
+            dtype=bool, count=len(values)
+        )
+    return pd.Series(values, dtype=object).str.strip().ne('').to_numpy(dtype=bool)
+
+
+def column_values(df, key, col_map):
+    """Значения колонки по правилам _get загрузчиков: сначала колонка с точным
+    именем, затем найденная по нормализованному имени, иначе исходное значение."""
+    n = len(df)
+    primary = _as_object(df, key) if key in df.columns else None
+    alt_name = col_map.get(key)
+    if alt_name == key:
+        # Колонка найдена под ожидаемым именем - подстановка не нужна
+        alt_name = None
+    alt = _as_object(df, alt_name) if alt_name and alt_name in df.columns else None
+
+    result = primary.copy() if primary is not None else np.full(n, None, dtype=object)
+    if alt is None:
+        return result
+    use_alt = _is_filled(alt)
+    if primary is not None:
+        use_alt = use_alt & ~_is_filled(primary)
+    result[use_alt] = alt[use_alt]
+    return result
+
+
+def str_or_none(values):
+    """Векторный аналог `str(v or '').strip() or None`"""
+    if _has_missing(values):
+        return np.array([str(v or '').strip() or None for v in values], dtype=object)
+    stripped = pd.Series(values, dtype=object).str.strip().to_numpy(dtype=object, copy=True)
+    stripped[stripped == ''] = None
+    return stripped
+
+
+def _parse_cleaned(raw, cleaned, pattern, scalar_parser):
+    """Быстрый путь float() для значений, совпавших с шаблоном числа; прочие
+    непустые значения разбираются исходным построчным парсером."""
+    result = np.full(len(raw), None, dtype=object)
+    fast = cleaned.str.fullmatch(pattern).to_numpy(dtype=bool)
+    if fast.any():
+        result[fast] = cleaned.to_numpy(dtype=object)[fast].astype(float).astype(object)
+    slow = ~fast & cleaned.ne('').to_numpy(dtype=bool)
+    for i in np.flatnonzero(slow):
+        result[i] = scalar_parser(raw[i])
+    return result
+
+
+def parse_numbers(values, scalar_parser):
+    """Векторный аналог parse_number загрузчиков"""
+    if _has_missing(values):
+        return np.array([scalar_parser(v) for v in values], dtype=object)
+    s = pd.Series(values, dtype=object).str.strip()
+    sci = (s.str.contains('E+', regex=False) | s.str.contains('E-', regex=False)).to_numpy(dtype=bool)
+    if sci.any():
+        s = s.where(~sci, s.str.replace(',', '.', regex=False))
+    cleaned = s.str.replace(r'[^\d\.\-\+E]', '', regex=True)
+    # Одиночный '-' после очистки - не число (как и в parse_number)
+    cleaned = cleaned.where(cleaned != '-', '')
+    return _parse_cleaned(values, cleaned, _NUMBER_RE, scalar_parser)
+
+
+def parse_amounts(values, scalar_parser):
+    """Векторный аналог parse_amount (STECCOM)"""
+    if _has_missing(values):
+        return np.array([scalar_parser(v) for v in values], dtype=object)
+    cleaned = pd.Series(values, dtype=object).str.replace(r'[$€ ]', '', regex=True)
+    return _parse_cleaned(values, cleaned, _AMOUNT_RE, scalar_parser)
+
+
+def parse_by_unique(values, scalar_parser):
+    """Разбор колонки с малым числом уникальных значений (даты, BILL_MONTH):
+    парсер вызывается один раз на уникальное значение."""
+    if len(values) == 0:
+        return np.empty(0, dtype=object)
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=True)
+    parsed = np.array([scalar_parser(u) for u in uniques] + [scalar_parser(None)], dtype=object)
+    # Код -1 (пропуск) указывает на последний элемент - результат для None
+    return parsed[codes]
+
+
+def constant(value, n):
+    """Колонка из одного значения (source_file, load_date, created_by)"""
+    result = np.empty(n, dtype=object)
+    result.fill(value)
+    return result
+
+
+def bind_arrays_to_records(bind_arrays):
+    """Массивы привязки {колонка: значения} -> список записей для executemany"""
+    names = list(bind_arrays)
+    columns = [bind_arrays[name].tolist() for name in names]
+    return [dict(zip(names, row)) for row in zip(*columns)]
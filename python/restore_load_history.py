@@ -14,6 +14,11 @@ from pathlib import Path
 from datetime import datetime
 import logging
 
+try:
+    from python import load_logs_schema
+except ImportError:
+    import load_logs_schema
+
 # Настройка логирования
 logging.basicConfig(
     level=logging.INFO,
@@ -117,34 +122,10 @@ def restore_oracle_history(dry_run=False):
         spnet_files = cursor.fetchall()
         logger.info(f"Найдено файлов SPNet: {len(spnet_files)}")
         
-        # Определяем структуру таблицы LOAD_LOGS
-        # Проверяем FILE_NAME vs SOURCE_FILE
-        try:
-            test_query = "SELECT FILE_NAME FROM LOAD_LOGS WHERE ROWNUM = 1"
-            cursor.execute(test_query)
-            file_col = "FILE_NAME"
-        except:
-            try:
-                test_query = "SELECT SOURCE_FILE FROM LOAD_LOGS WHERE ROWNUM = 1"
-                cursor.execute(test_query)
-                file_col = "SOURCE_FILE"
-            except:
-                logger.warning("Не удалось определить структуру LOAD_LOGS, используем FILE_NAME по умолчанию")
-                file_col = "FILE_NAME"
-        
-        # Проверяем LOADED_BY vs CREATED_BY
-        try:
-            test_query = "SELECT LOADED_BY FROM LOAD_LOGS WHERE ROWNUM = 1"
-            cursor.execute(test_query)
-            loaded_by_col = "LOADED_BY"
-        except:
-            try:
-                test_query = "SELECT CREATED_BY FROM LOAD_LOGS WHERE ROWNUM = 1"
-                cursor.execute(test_query)
-                loaded_by_col = "CREATED_BY"
-            except:
-                logger.warning("Не удалось определить столбец для created_by, используем LOADED_BY по умолчанию")
-                loaded_by_col = "LOADED_BY"
+        # Определяем структуру таблицы LOAD_LOGS (FILE_NAME/SOURCE_FILE, LOADED_BY/CREATED_BY)
+        file_col, loaded_by_col = load_logs_schema.get_load_logs_columns(
+            conn, default_file_col='FILE_NAME', default_loaded_by_col='LOADED_BY'
+        )
         
         spnet_inserted = 0
         for file_name, records_count, first_load, last_load in spnet_files:
@@ -297,20 +278,11 @@ def check_missing_logs():
         logger.info("ПРОВЕРКА ОТСУТСТВУЮЩИХ ЗАПИСЕЙ В LOAD_LOGS")
         logger.info("="*80)
         
-        # Проверяем, какой столбец используется в LOAD_LOGS
-        # Сначала пробуем FILE_NAME, если не работает - пробуем SOURCE_FILE
-        try:
-            test_query = "SELECT FILE_NAME FROM LOAD_LOGS WHERE ROWNUM = 1"
-            cursor.execute(test_query)
-            file_col = "FILE_NAME"
-        except:
-            try:
-                test_query = "SELECT SOURCE_FILE FROM LOAD_LOGS WHERE ROWNUM = 1"
-                cursor.execute(test_query)
-                file_col = "SOURCE_FILE"
-            except:
-                logger.error("Не удалось определить структуру таблицы LOAD_LOGS")
-                raise
+        # Проверяем, какой столбец используется в LOAD_LOGS (FILE_NAME или SOURCE_FILE)
+        file_col = load_logs_schema.detect_load_logs_columns(conn).file_col
+        if file_col is None:
+            logger.error("Не удалось определить структуру таблицы LOAD_LOGS")
+            raise RuntimeError("В LOAD_LOGS нет столбца FILE_NAME или SOURCE_FILE")
         
         # SPNet
         cursor.execute(f"""
@@ -15,6 +15,9 @@
   python scripts/sync_confluence_spaces.py --all
   python scripts/sync_confluence_spaces.py --all --limit 30 --exclude DEMO,TEST
   python scripts/sync_confluence_spaces.py --all --personal-only   # только личные (~user)
+
+  # Ночная инкрементальная синхронизация: только страницы/вложения с новой версией
+  python scripts/sync_confluence_spaces.py --all --limit 0 --incremental
 """
 from __future__ import annotations
 
@@ -46,6 +49,7 @@ def main() -> None:
     ap.add_argument("--limit", type=int, default=50, help="Макс. страниц на пространство (0 = без ограничения)")
     ap.add_argument("--exclude", type=str, default="", help="Ключи пространств через запятую, которые пропустить (при --all)")
     ap.add_argument("--personal-only", action="store_true", help="При --all: только личные пространства (type=personal)")
+    ap.add_argument("--incremental", action="store_true", help="Забирать только изменённые страницы и вложения (по version), удалять исчезнувшие")
     ap.add_argument("--output-dir", type=str, default="", help="Каталог confluence_docs (по умолчанию kb_billing/confluence_docs)")
     args = ap.parse_args()
 
@@ -72,12 +76,13 @@ def main() -> None:
             client=client,
             exclude_keys=exclude_list,
             include_only_personal=args.personal_only,
+            incremental=args.incremental,
         )
     else:
         if not args.spaces:
             print("Укажите ключи пространств или используйте --all для синхронизации всех пространств.", file=sys.stderr)
             sys.exit(1)
-        result = sync_spaces(args.spaces, limit=limit, output_dir=output_dir, client=client)
+        result = sync_spaces(args.spaces, limit=limit, output_dir=output_dir, client=client, incremental=args.incremental)
 
     if not result:
         print("Ни одного пространства не синхронизировано.", file=sys.stderr)
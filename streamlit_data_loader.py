@@ -108,42 +108,13 @@ def get_records_in_db(file_name, table_name='SPNET_TRAFFIC', conn=None):
 def count_file_records(file_path):
     """Подсчет количества записей в файле (CSV или XLSX)"""
     try:
-        import pandas as pd
-        file_ext = Path(file_path).suffix.lower()
+        from python import file_format
         
         if not Path(file_path).exists():
             return None
         
-        if file_ext == '.xlsx':
-            try:
-                df = pd.read_excel(file_path, dtype=str, na_filter=False, engine='openpyxl')
-                # Удаляем полностью пустые строки
-                df = df.dropna(how='all')
-                # Удаляем строки, где все значения пустые или пробелы
-                df = df[~df.apply(lambda x: x.astype(str).str.strip().eq('').all(), axis=1)]
-                return len(df)
-            except Exception as e:
-                # Пробуем без указания движка
-                try:
-                    df = pd.read_excel(file_path, dtype=str, na_filter=False)
-                    df = df.dropna(how='all')
-                    return len(df)
-                except:
-                    return None
-        else:
-            # CSV файл
-            try:
-                df = pd.read_csv(file_path, dtype=str, na_filter=False, quotechar='"')
-                return len(df)
-            except Exception as e:
-                # Пробуем разные кодировки
-                for encoding in ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']:
-                    try:
-                        df = pd.read_csv(file_path, dtype=str, na_filter=False, encoding=encoding, quotechar='"')
-                        return len(df)
-                    except:
-                        continue
-                return None
+        # Формат CSV и количество строк кэшируются по пути + mtime + размеру
+        return file_format.count_file_records(file_path)
     except Exception as e:
         return None  # Не удалось прочитать
 
@@ -44,7 +44,7 @@ from tabs.tab_campaigns import show_tab as show_campaigns_tab
 # Подавляем предупреждение pandas о cx_Oracle (работает корректно)
 warnings.filterwarnings('ignore', message='pandas only supports SQLAlchemy')
 
-from utils.db_connection import load_config_env, get_db_connection as get_connection
+from utils.db_connection import load_config_env, get_db_connection as get_connection, get_pool_stats
 from utils.queries import (
     count_file_records, get_records_in_db, get_main_report,
     get_current_period, get_periods, get_plans,
@@ -217,6 +217,22 @@ def show_user_management():
         else:
             st.write("Пользователи не найдены")
 
+    # Состояние пула сессий Oracle
+    with st.sidebar.expander("🔌 Пул подключений Oracle"):
+        stats = get_pool_stats()
+        if not stats['created']:
+            st.write("Пул еще не создан (нет запросов к Oracle)")
+        col1, col2 = st.columns(2)
+        col1.metric("Открыто сессий", f"{stats['opened']} / {stats['max']}")
+        col2.metric("Занято", stats['busy'])
+        col1.metric("Выдано из пула", stats['acquired'])
+        col2.metric("Ожидание, мс", stats['avg_acquire_ms'])
+        st.caption(
+            f"min={stats['min']}, increment={stats['increment']}, "
+            f"ping_interval={stats['ping_interval']} сек, stmtcachesize={stats['stmtcachesize']}; "
+            f"прямых подключений: {stats['direct_connections']}, ошибок пула: {stats['errors']}"
+        )
+
 def main():
     """Основная функция приложения"""
     
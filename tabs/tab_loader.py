@@ -310,7 +310,8 @@ def show_tab(get_connection, count_file_records, get_records_in_db):
                         'port': int(os.getenv('ORACLE_PORT', '1521')),
                         'service_name': os.getenv('ORACLE_SERVICE', 'bm7')
                     }
-                    loader = SPNetDataLoader(oracle_config)
+                    # Перезагрузка файла одной транзакцией: отчеты не видят частичных данных
+                    loader = SPNetDataLoader(oracle_config, atomic_reload=True)
                     if loader.connect_to_oracle():
                         loader.gdrive_path = str(SPNET_DIR)
                         log_capture = io.StringIO()
@@ -353,7 +354,8 @@ def show_tab(get_connection, count_file_records, get_records_in_db):
                         'port': int(os.getenv('ORACLE_PORT', '1521')),
                         'service_name': os.getenv('ORACLE_SERVICE', 'bm7')
                     }
-                    loader = STECCOMDataLoader(oracle_config)
+                    # Перезагрузка файла одной транзакцией: отчеты не видят частичных данных
+                    loader = STECCOMDataLoader(oracle_config, atomic_reload=True)
                     if loader.connect_to_oracle():
                         loader.gdrive_path = str(ACCESS_FEES_DIR)
                         log_capture = io.StringIO()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Кэш аннотаций Gemini Vision: те же байты изображения и тот же текст draw.io
+при повторной синхронизации не отправляются в Gemini, HTTP-клиент общий
+"""
+import httpx
+import pytest
+
+vision_annotation = pytest.importorskip("kb_billing.rag.vision_annotation", exc_type=ImportError)
+from kb_billing.rag import annotation_cache
+
+BASE_URL = "https://proxy/google"
+
+
+@pytest.fixture
+def gemini(monkeypatch, tmp_path):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={"candidates": [{"content": {"parts": [{"text": f"Описание {len(requests)}"}]}}]})
+
+    monkeypatch.setenv("GEMINI_API_KEY", "key")
+    monkeypatch.setenv("GEMINI_BASE_URL", BASE_URL)
+    monkeypatch.setenv("GEMINI_VISION_MODEL", "gemini-test")
+    monkeypatch.setenv("VISION_CACHE_PATH", str(tmp_path / "vision.db"))
+    monkeypatch.delenv("VISION_CACHE", raising=False)
+    monkeypatch.setattr(annotation_cache, "_cache", None)
+    monkeypatch.setattr(vision_annotation, "_http_clients", {
+        (BASE_URL, "key"): httpx.Client(base_url=BASE_URL, transport=httpx.MockTransport(handler)),
+    })
+    return requests
+
+
+def test_image_annotation_cached_by_content(gemini, monkeypatch):
+    first = vision_annotation.describe_image(b"\x89PNG logo", context_text="Страница 1")
+    again = vision_annotation.describe_image(b"\x89PNG logo", context_text="Страница 2")
+    other = vision_annotation.describe_image(b"\x89PNG scheme")
+
+    assert first == again == "Описание 1"
+    assert other == "Описание 2"
+    assert len(gemini) == 2
+    assert annotation_cache.get_annotation_cache().stats()["hits"] == 1
+
+    # Другая модель - другой ключ
+    monkeypatch.setenv("GEMINI_VISION_MODEL", "gemini-other")
+    assert vision_annotation.describe_image(b"\x89PNG logo") == "Описание 3"
+
+
+def test_drawio_annotation_cached_and_errors_not_stored(gemini, monkeypatch):
+    assert vision_annotation.describe_drawio_content("VSAT -> Hub") == "Описание 1"
+    assert vision_annotation.describe_drawio_content("VSAT -> Hub") == "Описание 1"
+    assert len(gemini) == 1
+
+    failing = httpx.Client(base_url=BASE_URL, transport=httpx.MockTransport(lambda r: httpx.Response(500)))
+    monkeypatch.setitem(vision_annotation._http_clients, (BASE_URL, "key"), failing)
+    assert vision_annotation.describe_image(b"\x89PNG new") is None
+    assert annotation_cache.get_annotation_cache().stats()["entries"] == 1
+
+
+def test_cache_disabled(gemini, monkeypatch):
+    monkeypatch.setenv("VISION_CACHE", "0")
+    vision_annotation.describe_image(b"\x89PNG logo")
+    vision_annotation.describe_image(b"\x89PNG logo")
+    assert len(gemini) == 2
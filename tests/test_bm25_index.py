@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Гибридный поиск: BM25 находит точные идентификаторы (таблицы, SUB-...),
+RRF объединяет ранги BM25 и векторного поиска (Qdrant в памяти)
+"""
+import numpy as np
+import pytest
+
+bm25_index = pytest.importorskip("kb_billing.rag.bm25_index", exc_type=ImportError)
+from kb_billing.rag import rag_assistant
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, PointStruct, VectorParams
+
+
+EXAMPLES = [
+    ("5 самых доходных клиентов за февраль", "SELECT CUSTOMER_NAME FROM V_REVENUE_FROM_INVOICES"),
+    ("Начисления по счетам за период", "SELECT SUM(AMOUNT) FROM BM_INVOICE_ITEM"),
+    ("Трафик по договору SUB-1234", "SELECT * FROM SPNET_TRAFFIC WHERE CONTRACT_ID = 'SUB-1234'"),
+]
+
+
+def test_tokenize_keeps_identifiers_and_parts():
+    tokens = bm25_index.tokenize("Строки BM_INVOICE_ITEM по SUB-1234")
+    assert {"bm_invoice_item", "bm", "invoice", "item", "sub-1234", "1234", "строки"} <= set(tokens)
+
+
+def test_bm25_ranks_exact_identifier_first():
+    index = bm25_index.BM25Index(client=None, collection_name="kb")
+    index.build(
+        (i, {"type": "qa_example", "question": q, "sql": sql}) for i, (q, sql) in enumerate(EXAMPLES)
+    )
+    assert [r[0] for r in index.search("что лежит в BM_INVOICE_ITEM", limit=3)][:1] == [1]
+    assert [r[0] for r in index.search("договор SUB-1234", limit=1, types=["qa_example"])] == [2]
+    assert index.search("договор SUB-1234", limit=1, types=["ddl"]) == []
+
+
+def test_rrf_prefers_documents_ranked_high_in_both_lists():
+    fused = bm25_index.rrf_fuse([["a", "b", "c"], ["b", "d"]])
+    assert [point_id for point_id, _ in fused] == ["b", "a", "d", "c"]
+
+
+class _FixedModel:
+    """Вектор вопроса всегда ближе к первому примеру (вектор "не видит" идентификаторы)"""
+
+    def encode(self, text, normalize_embeddings=True, **kwargs):
+        return np.array([1.0, 0.0])
+
+
+def test_hybrid_mode_finds_example_missed_by_vector_search():
+    client = QdrantClient(":memory:")
+    client.create_collection("kb", vectors_config=VectorParams(size=2, distance=Distance.COSINE))
+    vectors = [[1.0, 0.0], [0.0, 1.0], [0.2, 1.0]]
+    client.upsert("kb", points=[
+        PointStruct(id=i, vector=vectors[i], payload={"type": "qa_example", "question": q, "sql": sql})
+        for i, (q, sql) in enumerate(EXAMPLES)
+    ])
+    rag = rag_assistant.RAGAssistant.__new__(rag_assistant.RAGAssistant)
+    rag.client = client
+    rag.collection_name = "kb"
+    rag.model = _FixedModel()
+    rag.embedding_model = "fixed"
+    rag.embedding_cache = None
+    rag.bm25_index = bm25_index.BM25Index(client, "kb")
+
+    question = "трафик по SUB-1234"
+    vector = rag.search_similar_examples(question, limit=1, mode="vector")
+    hybrid = rag.search_similar_examples(question, limit=1, mode="hybrid")
+    assert vector[0]["sql"] == EXAMPLES[0][1]
+    assert hybrid[0]["sql"] == EXAMPLES[2][1]
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Параллельный обход Confluence на локальном стаб-сервере: порядок документов
+в confluence_<space>.json детерминирован, стадии идут параллельно, частота
+запросов к хосту ограничена; инкрементальная синхронизация забирает только
+страницы и вложения с новой версией; скачивание вложения потоковое и
+обрывается на лимите размера
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+generator_mod = pytest.importorskip("kb_billing.rag.confluence_kb_generator", exc_type=ImportError)
+from kb_billing.rag import confluence_client
+from kb_billing.rag.confluence_client import AttachmentTooLarge, ConfluenceClient
+
+PAGES = [str(100 + i) for i in range(8)]
+
+
+class _StubConfluence(BaseHTTPRequestHandler):
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+    request_times = []
+    paths = []
+    pages = {}
+    attachment_versions = {}
+    big_sent = 0
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.request_times.append(time.monotonic())
+            cls.paths.append(self.path)
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+        try:
+            url = urlsplit(self.path)
+            params = parse_qs(url.query)
+            parts = url.path.strip("/").split("/")
+            if url.path == "/rest/api/content":
+                start = int(params.get("start", ["0"])[0])
+                limit = int(params.get("limit", ["50"])[0])
+                with_body = "body.storage" in params.get("expand", [""])[0]
+                self._json({"results": [
+                    cls.page(pid, with_body) for pid in list(cls.pages)[start:start + limit]
+                ]})
+            elif parts[-2:] == ["child", "attachment"]:
+                pid = parts[-3]
+                self._json({"results": [
+                    {
+                        "title": f"note{n}.txt",
+                        "version": {"number": cls.attachment_versions.get((pid, n), 1)},
+                        "extensions": {"mediaType": "text/plain", "fileSize": 16},
+                        "_links": {"download": f"/download/attachments/{pid}/note{n}.txt"},
+                    }
+                    for n in range(2)
+                ]})
+            elif parts[:3] == ["rest", "api", "content"] and len(parts) == 4:
+                self._json(cls.page(parts[3], True))
+            elif parts[:2] == ["download", "big"]:
+                # Большой файл кусками по 64 KB; с length=1 - с Content-Length, иначе до закрытия соединения
+                total = 64 * 1024 * 1024
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                if params.get("length"):
+                    self.send_header("Content-Length", str(total))
+                self.end_headers()
+                chunk = b"\0" * 65536
+                try:
+                    for _ in range(total // len(chunk)):
+                        self.wfile.write(chunk)
+                        cls.big_sent += len(chunk)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+            elif parts[0] == "download":
+                # Первые страницы отвечают медленнее - порядок завершения отличается от порядка страниц
+                pid = parts[2]
+                time.sleep(0.02 * (len(PAGES) - PAGES.index(pid)))
+                body = f"вложение {parts[2]}/{parts[3]}".encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                self.send_error(404)
+        finally:
+            with cls.lock:
+                cls.active -= 1
+
+    @classmethod
+    def page(cls, pid, with_body):
+        version = cls.pages[pid]
+        page = {
+            "id": pid,
+            "title": f"Страница {pid}",
+            "version": {"number": version, "when": f"2025-10-0{version}T00:00:00.000Z"},
+        }
+        if with_body:
+            page["body"] = {"storage": {"value": f"<h1>Раздел {pid}</h1><p>Текст {pid} v{version}</p>"}}
+        return page
+
+
+@pytest.fixture
+def stub_confluence():
+    _StubConfluence.active = _StubConfluence.max_active = 0
+    _StubConfluence.request_times = []
+    _StubConfluence.paths = []
+    _StubConfluence.pages = {pid: 1 for pid in PAGES}
+    _StubConfluence.attachment_versions = {}
+    _StubConfluence.big_sent = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubConfluence)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_sync_space_parallel_keeps_page_order(stub_confluence, tmp_path):
+    client = ConfluenceClient(base_url=stub_confluence, token="t", max_requests_per_second=0)
+    gen = generator_mod.ConfluenceKBGenerator(client=client, output_dir=tmp_path, max_workers=4)
+
+    docs = gen.sync_space("SAT")
+
+    saved = json.loads((tmp_path / "confluence_SAT.json").read_text(encoding="utf-8"))
+    assert [d["source"]["page_id"] for d in saved] == PAGES
+    assert saved == docs
+    first = docs[0]
+    assert [s["title"] for s in first["content"]] == ["Раздел 100", "Вложение: note0.txt", "Вложение: note1.txt"]
+    assert first["content"][1]["text"] == "вложение 100/note0.txt"
+    assert [a["status"] for a in first["attachments_processed"]] == ["indexed", "indexed"]
+    assert _StubConfluence.max_active > 1
+
+
+def test_rate_limit_per_host(stub_confluence, tmp_path):
+    client = ConfluenceClient(base_url=stub_confluence, token="t", max_requests_per_second=50)
+    gen = generator_mod.ConfluenceKBGenerator(client=client, output_dir=tmp_path, max_workers=4)
+
+    docs = gen.sync_space("SAT", limit=3)
+
+    assert [d["source"]["page_id"] for d in docs] == PAGES[:3]
+    times = sorted(_StubConfluence.request_times)
+    # 1 листинг + 3 списка вложений + 6 скачиваний, не чаще 50 в секунду
+    assert len(times) == 10
+    assert times[-1] - times[0] >= 9 / 50 * 0.9
+
+
+def test_incremental_sync_fetches_only_changed(stub_confluence, tmp_path):
+    client = ConfluenceClient(base_url=stub_confluence, token="t", max_requests_per_second=0)
+    gen = generator_mod.ConfluenceKBGenerator(client=client, output_dir=tmp_path, max_workers=4)
+    first = gen.sync_space("SAT", incremental=True)
+    assert first[0]["source"]["version"] == 1
+    assert first[0]["attachments_processed"][0]["version"] == 1
+
+    # Без изменений: только листинг страниц, без тел и вложений
+    _StubConfluence.paths = []
+    assert gen.sync_space("SAT", incremental=True) == first
+    assert len(_StubConfluence.paths) == 1 and "expand=version" in _StubConfluence.paths[0]
+
+    # 101: новая версия страницы и одного вложения; 107 удалена
+    _StubConfluence.pages["101"] = 2
+    _StubConfluence.attachment_versions[("101", 1)] = 2
+    del _StubConfluence.pages["107"]
+    _StubConfluence.paths = []
+    docs = gen.sync_space("SAT", incremental=True)
+
+    assert [d["source"]["page_id"] for d in docs] == PAGES[:-1]
+    assert docs[1]["source"]["version"] == 2
+    assert "Текст 101 v2" in docs[1]["content"][0]["text"]
+    assert [a["version"] for a in docs[1]["attachments_processed"]] == [1, 2]
+    downloads = [p for p in _StubConfluence.paths if p.startswith("/download/")]
+    assert downloads == ["/download/attachments/101/note1.txt"]
+    assert docs[0] == first[0]
+
+
+def test_download_aborts_at_size_limit(stub_confluence):
+    client = ConfluenceClient(base_url=stub_confluence, token="t", max_requests_per_second=0)
+
+    with pytest.raises(AttachmentTooLarge) as exc:
+        client.download_attachment_file({"title": "a.iso", "_links": {"download": "/download/big/a.iso?length=1"}}, max_size=100_000)
+    assert exc.value.size == 64 * 1024 * 1024
+
+    with pytest.raises(AttachmentTooLarge):
+        client.download_attachment_file({"title": "b.iso", "_links": {"download": "/download/big/b.iso"}}, max_size=100_000)
+    time.sleep(0.2)
+    assert _StubConfluence.big_sent < 64 * 1024 * 1024
+
+
+def test_spooled_download_parsed_without_bytes_copy(stub_confluence, monkeypatch):
+    monkeypatch.setattr(confluence_client, "ATTACHMENT_SPOOL_SIZE", 8)
+    client = ConfluenceClient(base_url=stub_confluence, token="t", max_requests_per_second=0)
+    att = {"title": "note0.txt", "_links": {"download": "/download/attachments/100/note0.txt"}}
+
+    f = client.download_attachment_file(att, max_size=1000)
+    with f, f.view() as data:
+        # Больше ATTACHMENT_SPOOL_SIZE - файл на диске, парсер получает memoryview поверх mmap
+        assert f.on_disk and isinstance(data, memoryview)
+        assert generator_mod.parse_attachment(data, "note0.txt", "text/plain") == ("вложение 100/note0.txt", None)
+    assert client.download_attachment(att) == "вложение 100/note0.txt".encode("utf-8")
+
+    monkeypatch.setattr(confluence_client, "ATTACHMENT_SPOOL_SIZE", 1000)
+    with client.download_attachment_file(att) as f, f.view() as data:
+        assert not f.on_disk and bytes(data) == "вложение 100/note0.txt".encode("utf-8")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Поиск чанков Confluence по page_id и заголовку секции - фильтром на сервере
+Qdrant (Qdrant в памяти); KBLoader создает индексы payload для этих фильтров
+"""
+import pytest
+
+rag_assistant = pytest.importorskip("kb_billing.rag.rag_assistant", exc_type=ImportError)
+from kb_billing.rag import kb_loader
+from qdrant_client import QdrantClient
+from qdrant_client.models import PointStruct
+
+
+class _RecordingClient:
+    """QdrantClient в памяти, запоминает фильтры scroll и создаваемые индексы"""
+
+    def __init__(self):
+        self.client = QdrantClient(":memory:")
+        self.scroll_filters = []
+        self.indexes = []
+
+    def scroll(self, **kwargs):
+        self.scroll_filters.append(kwargs.get("scroll_filter"))
+        return self.client.scroll(**kwargs)
+
+    def create_payload_index(self, collection_name, field_name, field_schema):
+        self.indexes.append(field_name)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+def _make(client):
+    loader = kb_loader.KBLoader.__new__(kb_loader.KBLoader)
+    loader.client = client
+    loader.collection_name = "kb"
+    loader.vector_size = 2
+    loader.create_collection()
+
+    rag = rag_assistant.RAGAssistant.__new__(rag_assistant.RAGAssistant)
+    rag.client = client
+    rag.collection_name = "kb"
+    return rag
+
+
+def _chunk(point_id, page_id, section_title):
+    return PointStruct(id=point_id, vector=[1.0, 0.0], payload={
+        "type": "confluence_section", "page_id": page_id, "section_title": section_title,
+        "title": "Схема сети", "content": section_title,
+    })
+
+
+def test_confluence_lookups_filter_on_server():
+    client = _RecordingClient()
+    rag = _make(client)
+    assert client.indexes == ["type", "page_id", "section_title"]
+
+    client.client.upsert("kb", points=[
+        _chunk(1, "100", "Вложение: Спецификация Стар-Т.xlsx"),
+        _chunk(2, "100", "Подключение терминала"),
+        _chunk(3, 200, "Вложение: PageHUBs NMS access"),
+    ])
+
+    assert [c["section_title"] for c in rag.get_confluence_chunks_by_page_id("100")] == [
+        "Вложение: Спецификация Стар-Т.xlsx", "Подключение терминала"
+    ]
+    # page_id числом (загрузка до нормализации) - второй фильтр, без полного scroll
+    assert len(rag.get_confluence_chunks_by_page_id("200")) == 1
+    assert [c["page_id"] for c in rag.get_confluence_chunks_by_section_title_contains("Стар–Т")] == ["100"]
+    assert rag.get_confluence_chunks_by_section_title_contains("iDirect") == []
+    assert all(len(f.must) == 2 for f in client.scroll_filters)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Пул сессий Oracle за get_db_connection (без подключения к Oracle)
+"""
+import pytest
+
+from utils import db_connection
+
+
+class _FakeSession:
+    client_identifier = None
+
+
+class _FakePool:
+    opened = 2
+    busy = 1
+
+    def __init__(self):
+        self.acquired = 0
+
+    def acquire(self):
+        self.acquired += 1
+        session = _FakeSession()
+        session.client_identifier = 'previous-user'
+        return session
+
+
+class _FakeDriver:
+    """oracledb: create_pool падает (БД недоступна), connect - успешно"""
+    POOL_GETMODE_TIMEDWAIT = 2
+
+    def __init__(self):
+        self.pools_created = 0
+        self.connects = 0
+
+    def makedsn(self, host, port, service_name=None):
+        return f'{host}:{port}/{service_name}'
+
+    def create_pool(self, **kwargs):
+        self.pools_created += 1
+        raise RuntimeError('ORA-12170: TNS:Connect timeout occurred')
+
+    def connect(self, **kwargs):
+        self.connects += 1
+        return _FakeSession()
+
+
+@pytest.fixture(autouse=True)
+def _pool_state(monkeypatch):
+    """Пул и счетчики модуля - свои на каждый тест"""
+    monkeypatch.setattr(db_connection, '_pool', None)
+    monkeypatch.setattr(db_connection, '_pool_failed_at', None)
+    monkeypatch.setattr(db_connection, '_pool_counters',
+                        {'acquired': 0, 'acquire_seconds': 0.0, 'direct_connections': 0, 'errors': 0})
+
+
+def test_connections_come_from_pool(monkeypatch):
+    pool = _FakePool()
+    monkeypatch.setattr(db_connection, '_pool', pool)
+    monkeypatch.setattr(db_connection, '_streamlit_username', lambda: 'analyst')
+
+    conn = db_connection.get_db_connection()
+
+    assert pool.acquired == 1
+    assert conn.client_identifier == 'analyst'
+    stats = db_connection.get_pool_stats()
+    assert (stats['created'], stats['opened'], stats['busy'], stats['acquired']) == (True, 2, 1, 1)
+    assert stats['direct_connections'] == 0
+
+
+def test_client_identifier_reset_outside_streamlit(monkeypatch):
+    monkeypatch.setattr(db_connection, '_pool', _FakePool())
+
+    assert db_connection.get_db_connection().client_identifier == ''
+
+
+def test_failed_pool_creation_not_retried_until_interval(monkeypatch):
+    driver = _FakeDriver()
+    monkeypatch.setattr(db_connection, '_oracle_driver', lambda: driver)
+
+    assert db_connection.get_db_connection() is not None
+    assert db_connection.get_db_connection() is not None
+    # Пул создавался один раз, дальше - сразу прямое подключение
+    assert (driver.pools_created, driver.connects) == (1, 2)
+
+    now = db_connection.time.monotonic()
+    monkeypatch.setattr(db_connection.time, 'monotonic', lambda: now + db_connection.POOL_RETRY_INTERVAL + 1)
+    db_connection.get_db_connection()
+    assert driver.pools_created == 2
+
+
+def test_acquire_timeout_does_not_bypass_pool(monkeypatch):
+    class _ExhaustedPool(_FakePool):
+        def acquire(self):
+            raise RuntimeError('DPY-4005: timed out waiting for the connection pool to return a connection')
+
+    driver = _FakeDriver()
+    monkeypatch.setattr(db_connection, '_oracle_driver', lambda: driver)
+    monkeypatch.setattr(db_connection, '_pool', _ExhaustedPool())
+
+    assert db_connection.get_db_connection() is None
+    assert driver.connects == 0
+    assert db_connection.get_pool_stats()['errors'] == 1
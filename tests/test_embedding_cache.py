@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Кэш эмбеддингов: повторные тексты не передаются модели, ключ учитывает
+модель и нормализацию, сверх max_entries вытесняются давно не использованные
+"""
+import numpy as np
+import pytest
+
+# kb_billing.rag/__init__ импортирует KBLoader (sentence-transformers)
+embedding_cache = pytest.importorskip("kb_billing.rag.embedding_cache", exc_type=ImportError)
+EmbeddingCache = embedding_cache.EmbeddingCache
+
+
+class _Model:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return np.array([[len(t), 1.0, 2.0] for t in texts], dtype=np.float32)
+
+
+def test_cache_hits_skip_model_and_keep_order(tmp_path):
+    cache = EmbeddingCache(tmp_path / "emb.db")
+    model = _Model()
+
+    first = cache.encode("e5", True, ["а", "бб", "а"], model)
+    assert model.calls == [["а", "бб"]]
+    assert first.shape == (3, 3) and first[0][0] == 1 and first[1][0] == 2
+
+    second = cache.encode("e5", True, ["бб", "ввв"], model)
+    assert model.calls[-1] == ["ввв"]
+    assert second[0][0] == 2 and second[1][0] == 3
+
+    # Другая модель / нормализация - другой ключ
+    cache.encode("e5-large", True, ["а"], model)
+    cache.encode("e5", False, ["а"], model)
+    assert len(model.calls) == 4
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 5, 5)
+
+    # Кэш на диске переживает перезапуск процесса
+    assert EmbeddingCache(tmp_path / "emb.db").get_many("e5", True, ["ввв"])
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(tmp_path / "emb.db", max_entries=2)
+    model = _Model()
+    cache.encode("e5", True, ["старый"], model)
+    cache.encode("e5", True, ["средний"], model)
+    cache.encode("e5", True, ["старый"], model)  # обращение - старый становится свежим
+    cache.encode("e5", True, ["новый"], model)
+
+    assert cache.stats()["entries"] == 2
+    assert set(cache.get_many("e5", True, ["старый", "средний", "новый"])) == {
+        embedding_cache.text_key("старый"), embedding_cache.text_key("новый")
+    }
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Определение формата CSV (кодировка, разделитель) по началу файла
+и кэш количества строк python.file_format
+"""
+import os
+
+import pytest
+
+from python import file_format
+
+
+@pytest.fixture(autouse=True)
+def _clean_cache():
+    file_format.clear_cache()
+    yield
+    file_format.clear_cache()
+
+
+@pytest.mark.parametrize('content, encoding, expected', [
+    ('Contract ID;Usage\nSUB-1;10\n', 'utf-8', file_format.CsvFormat('utf-8', ';')),
+    ('Contract ID;Usage\nSUB-1;10\n', 'utf-8-sig', file_format.CsvFormat('utf-8-sig', ';')),
+    ('Contract ID\tUsage\nSUB-1\t10\n', 'utf-16', file_format.CsvFormat('utf-16', '\t')),
+    ('Contract ID,Amount\nSUB-1,€12\n', 'cp1252', file_format.CsvFormat('cp1252', ',')),
+    ('Contract ID,Name\nSUB-1,Müller\n', 'latin-1', file_format.CsvFormat('latin-1', ',')),
+])
+def test_detect_csv_format(tmp_path, content, encoding, expected):
+    path = tmp_path / 'data.csv'
+    path.write_bytes(content.encode(encoding))
+
+    assert file_format.detect_csv_format(path) == expected
+
+
+def test_single_column_is_not_csv(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text('just text\nmore text\n', encoding='utf-8')
+
+    assert file_format.detect_csv_format(path) is None
+    assert file_format.read_csv_file(path) == (None, None)
+
+
+def test_decode_error_after_sample_falls_back(tmp_path, monkeypatch):
+    # Образец - чистый UTF-8, байт cp1252 встречается только дальше
+    monkeypatch.setattr(file_format, 'SNIFF_BYTES', 64)
+    lines = ['Contract ID;Amount'] + [f'SUB-{i};{i}' for i in range(20)] + ['SUB-x;€']
+    path = tmp_path / 'data.csv'
+    path.write_bytes('\n'.join(lines).encode('cp1252'))
+
+    df, csv_format = file_format.read_csv_file(path)
+
+    assert csv_format == file_format.CsvFormat('cp1252', ';')
+    assert df.iloc[-1]['Amount'] == '€'
+    assert file_format.detect_csv_format(path) == csv_format
+
+
+def test_record_count_cached_until_file_changes(tmp_path, monkeypatch):
+    path = tmp_path / 'data.csv'
+    path.write_text('a;b\n1;2\n3;4\n', encoding='utf-8')
+    assert file_format.count_file_records(path) == 2
+
+    def _fail(*args, **kwargs):
+        raise AssertionError('файл перечитан')
+
+    monkeypatch.setattr(file_format, '_sniff', _fail)
+    monkeypatch.setattr(file_format.pd, 'read_csv', _fail)
+    assert file_format.count_file_records(path) == 2
+
+    monkeypatch.undo()
+    path.write_text('a;b\n1;2\n3;4\n5;6\n', encoding='utf-8')
+    os.utime(path, ns=(0, 10 ** 9))
+    assert file_format.count_file_records(path) == 3
+
+
+def test_wrong_sniffed_separator_falls_back(tmp_path, monkeypatch):
+    # В образце запятые в тексте выглядят как разделитель, дальше строка с другим числом запятых
+    monkeypatch.setattr(file_format, 'SNIFF_BYTES', 64)
+    lines = ['Contract ID;Comment, note'] + [f'SUB-{i};a, b' for i in range(20)] + ['SUB-x;a, b, c']
+    path = tmp_path / 'data.csv'
+    path.write_text('\n'.join(lines), encoding='utf-8')
+    assert file_format.detect_csv_format(path) == file_format.CsvFormat('utf-8', ',')
+
+    df, csv_format = file_format.read_csv_file(path)
+
+    assert csv_format == file_format.CsvFormat('utf-8', ';')
+    assert list(df.columns) == ['Contract ID', 'Comment, note']
+    assert df.iloc[-1]['Comment, note'] == 'a, b, c'
+    assert file_format.detect_csv_format(path) == csv_format
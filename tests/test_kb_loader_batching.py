@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Загрузка KB: эмбеддинги одним батчевым encode на источник, а не на каждый
+документ; перезагрузка Confluence пересчитывает только изменившиеся секции
+(Qdrant в памяти, модель-заглушка вместо sentence-transformers)
+"""
+import json
+
+import numpy as np
+import pytest
+
+kb_loader = pytest.importorskip("kb_billing.rag.kb_loader", exc_type=ImportError)
+from qdrant_client import QdrantClient
+
+
+class _CountingModel:
+    """Модель-заглушка: считает вызовы encode и размеры батчей"""
+
+    def __init__(self, dim=8):
+        self.dim = dim
+        self.calls = []
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False):
+        self.calls.append(len(texts))
+        return np.array([[float(len(t) % 7 + 1)] * self.dim for t in texts])
+
+
+def _make_loader(kb_dir):
+    loader = kb_loader.KBLoader.__new__(kb_loader.KBLoader)
+    loader.client = QdrantClient(":memory:")
+    loader.collection_name = "kb_test"
+    loader.model = _CountingModel()
+    loader.vector_size = loader.model.dim
+    loader.kb_dir = kb_dir
+    loader.embedding_batch_size = 64
+    loader.embedding_workers = 0
+    loader._encode_pool = None
+    loader.embedding_cache = None
+    loader.last_confluence_sync = {}
+    return loader
+
+
+def test_load_all_encodes_each_source_in_one_batch(tmp_path):
+    (tmp_path / "training_data").mkdir()
+    examples = [{"question": f"Вопрос {i}", "sql": f"SELECT {i} FROM DUAL"} for i in range(10)]
+    (tmp_path / "training_data" / "sql_examples.json").write_text(json.dumps(examples), encoding="utf-8")
+    (tmp_path / "tables").mkdir()
+    for i in range(3):
+        table = {"table_name": f"T{i}", "description": "Таблица", "ddl": f"CREATE TABLE T{i} (ID NUMBER)"}
+        (tmp_path / "tables" / f"t{i}.json").write_text(json.dumps(table), encoding="utf-8")
+
+    loader = _make_loader(tmp_path)
+    loader.load_all(recreate=True)
+
+    # 10 вопросов одним encode, 3 DDL + 3 описания таблиц - другим
+    assert loader.model.calls == [10, 6]
+    assert loader.client.get_collection("kb_test").points_count == 16
+
+
+def _write_confluence(kb_dir, sections):
+    docs_dir = kb_dir / "confluence_docs"
+    docs_dir.mkdir(exist_ok=True)
+    doc = {
+        "title": "Схема сети",
+        "source": {"page_id": "12345", "url": "https://confluence/pages/12345"},
+        "content": [{"title": title, "text": text} for title, text in sections],
+    }
+    (docs_dir / "network.json").write_text(json.dumps([doc], ensure_ascii=False), encoding="utf-8")
+
+
+def test_confluence_reload_embeds_only_changed_sections(tmp_path):
+    _write_confluence(tmp_path, [("Шлюз", "Текст 1"), ("Терминал", "Текст 2"), ("Антенна", "Текст 3")])
+    loader = _make_loader(tmp_path)
+    loader.create_collection()
+
+    assert loader.reload_confluence_only() == 3
+    assert loader.model.calls == [3]
+
+    # Id не зависят от процесса: повторный запуск ничего не пересчитывает
+    assert loader.reload_confluence_only() == 3
+    assert loader.model.calls == [3]
+    assert loader.last_confluence_sync == {"unchanged": 3, "upserted": 0, "deleted": 0}
+
+    # Изменилась одна секция, одна удалена
+    _write_confluence(tmp_path, [("Шлюз", "Текст 1"), ("Терминал", "Новый текст")])
+    assert loader.reload_confluence_only() == 2
+    assert loader.model.calls == [3, 1]
+    assert loader.last_confluence_sync == {"unchanged": 1, "upserted": 1, "deleted": 1}
+    assert loader.client.get_collection("kb_test").points_count == 2
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Структура LOAD_LOGS читается один раз на подключение (без подключения к Oracle)
+"""
+from python import load_logs_schema
+
+
+class _SchemaCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = None
+
+    def execute(self, sql, params=None):
+        self.connection.queries.append(sql)
+        self.description = [(c,) for c in self.connection.synonym_columns]
+
+    def fetchall(self):
+        return [(c,) for c in self.connection.own_columns]
+
+    def close(self):
+        pass
+
+
+class _SchemaConnection:
+    def __init__(self, own_columns, synonym_columns=()):
+        self.own_columns = own_columns
+        self.synonym_columns = synonym_columns
+        self.queries = []
+
+    def cursor(self):
+        return _SchemaCursor(self)
+
+
+def test_columns_detected_once_per_connection():
+    conn = _SchemaConnection(['ID', 'TABLE_NAME', 'SOURCE_FILE', 'RECORDS_LOADED', 'LOADED_BY'])
+
+    for _ in range(3):
+        assert load_logs_schema.get_load_logs_columns(conn) == ('SOURCE_FILE', 'LOADED_BY')
+    assert len(conn.queries) == 1
+
+    other = _SchemaConnection(['ID', 'FILE_NAME', 'CREATED_BY'])
+    assert load_logs_schema.get_load_logs_columns(other) == ('FILE_NAME', 'CREATED_BY')
+
+
+def test_synonym_and_defaults():
+    conn = _SchemaConnection([], synonym_columns=['FILE_NAME', 'STATUS'])
+
+    assert load_logs_schema.detect_load_logs_columns(conn).file_col == 'FILE_NAME'
+    assert load_logs_schema.get_load_logs_columns(
+        conn, default_loaded_by_col='LOADED_BY'
+    ) == ('FILE_NAME', 'LOADED_BY')
+    assert len(conn.queries) == 2
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Манифест загруженных файлов: неизменившийся файл пропускается по SHA-256,
+изменившийся с тем же именем - перезагружается (без подключения к Oracle)
+"""
+import os
+
+from python import load_manifest
+
+
+class _ManifestCursor:
+    """Курсор-заглушка: LOAD_MANIFEST как словарь (TABLE_NAME, SOURCE_FILE) -> строка"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.result = None
+
+    def execute(self, sql, params=None):
+        if 'USER_TABLES' in sql:
+            self.result = (1,)
+        elif sql.strip().startswith('SELECT'):
+            self.result = self.rows.get((params['table_name'], params['source_file']))
+        elif sql.strip().startswith('MERGE'):
+            self.rows[(params['table_name'], params['source_file'])] = (
+                params['sha256'], params['file_size'], params['records_in_file'],
+                params['records_loaded'], '2025-10-15'
+            )
+
+    def fetchone(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+class _ManifestConnection:
+    def __init__(self):
+        self.rows = {}
+
+    def cursor(self):
+        return _ManifestCursor(self.rows)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def test_manifest_detects_unchanged_and_changed_files(tmp_path):
+    path = tmp_path / 'spnet.csv'
+    path.write_text('a;b\n1;2\n', encoding='utf-8')
+    manifest = load_manifest.LoadManifest(_ManifestConnection(), 'SPNET_LOADER')
+
+    assert manifest.check('SPNET_TRAFFIC', str(path)) == (load_manifest.UNKNOWN, None)
+
+    manifest.record('SPNET_TRAFFIC', str(path), 1, 1)
+    status, entry = manifest.check('SPNET_TRAFFIC', str(path))
+    assert status == load_manifest.UNCHANGED
+    assert (entry.size, entry.records_in_file) == (path.stat().st_size, 1)
+    assert manifest.check('STECCOM_EXPENSES', str(path))[0] == load_manifest.UNKNOWN
+
+    # Тот же размер и имя, другое содержимое
+    path.write_text('a;b\n1;3\n', encoding='utf-8')
+    os.utime(path, ns=(0, 10 ** 9))
+    assert manifest.check('SPNET_TRAFFIC', str(path))[0] == load_manifest.CHANGED
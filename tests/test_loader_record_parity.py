@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Паритет колоночного и построчного преобразования DataFrame в записи
+и потоковой загрузки порциями для загрузчиков SPNet и STECCOM
+(без подключения к Oracle)
+"""
+import importlib
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+LOAD_DATE = datetime(2025, 10, 15, 12, 30, 45)
+
+SPNET_HEADER = [
+    'Total Rows', 'Contract ID', 'IMEI', 'SIM ICCID', 'Service', 'Usage Type', 'Usage',
+    'Usage Unit', 'Total Amount', 'Bill Month', 'Plan Name', 'IMSI', 'MSISDN',
+    'Actual Usage', 'Call Session Count', 'SP Account No', 'SP Name', 'SP Reference'
+]
+
+SPNET_ROWS = [
+    ['1', 'SUB-61996030217', '300234069209690', '8988169', 'SBD', 'SBD Data Usage', '1024',
+     'BYTES', '$12.50', '92025', 'SBD Tiered 1250 10K', '901037', '881', '1 024', '3', '5001', 'SP', 'REF-1'],
+    ['2', ' SUB-1 ', ' 300234069209691 ', '', 'SBD', 'Mailbox Check', '3,00025E+14',
+     'EVENT', '€0.75', '102025', '  ', '', '', '', '', '', '', ''],
+    ['3', 'SUB-2', '300234069209692', '', 'SBD', 'Registration', 'abc',
+     'EVENT', '-', '202510', 'Plan', '', '', '1.5.2', '-7', '', '', ''],
+    ['', '', '', '', '', '', '', '', '', '13 2025', '', '', '', '', '', '', '', ''],
+    ['5', 'SUB-3', '300234069209693', '', 'SBD', 'SBD Data Usage', '1E-3',
+     'BYTES', '₽ 100', 'bad', 'Plan', '', '', '+.5', '2E+2', '', '', ''],
+]
+
+STECCOM_HEADER = [
+    'Invoice Date', 'Company Name', 'Company Number', 'Settling Period',
+    'Fee Type', 'Contract ID', 'IMSI_ISDNA', 'ICC-ID/IMEI', 'Activation Date',
+    'Transaction Date', 'Service', 'Rate Type', 'Plan/Discount', 'Description',
+    'Prorated Days', 'Amount', 'Group'
+]
+
+STECCOM_ROWS = [
+    ['02.10.2025', 'STECCOM LLC', '1001', '202510', 'Monthly Fee', 'SUB-1', '901037', '300234069209690',
+     '2025-01-15', '01/10/2025', 'SBD', 'Access', 'SBD 12', 'Fee', '31', '$12.50', 'A'],
+    ['02.10.2025', 'STECCOM LLC', '1001', '202510', 'Monthly Fee', 'SUB-2', '', '300234069209691',
+     '', '2025/10/01', ' broadband ', 'Access', '', '', '', '15', 'A'],
+    ['02.10.2025', '  ', '', '', '', '', '', '',
+     'not a date', '01-10-2025', 'SBD', '', '', '', '3,5', '1 234.50', ''],
+    ['2025.10.02', 'STECCOM LLC', '1001', '202510', 'Activation', 'SUB-3', '', '300234069209692',
+     '2025-10-02', '', 'SBD', '', '', '', '', '1e3', ''],
+    ['', '', '', '', '', '', '', '', '', '', '', '', '', '', '', 'abc', ''],
+]
+
+
+@pytest.fixture()
+def loaders(tmp_path, monkeypatch):
+    # Модули загрузчиков пишут лог в текущую директорию
+    monkeypatch.chdir(tmp_path)
+    spnet = importlib.import_module('python.load_spnet_traffic')
+    steccom = importlib.import_module('python.load_steccom_expenses')
+    return spnet.SPNetDataLoader({}), steccom.STECCOMDataLoader({})
+
+
+def _write_csv(path, header, rows, sep=';'):
+    lines = [sep.join(header)] + [sep.join(row) for row in rows]
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return path
+
+
+def _write_xlsx(path, header, rows):
+    pd.DataFrame(rows, columns=header).to_excel(path, index=False)
+    return path
+
+
+def _read(path, sep=';'):
+    if path.suffix == '.xlsx':
+        df = pd.read_excel(path, dtype=str, na_filter=False)
+    else:
+        df = pd.read_csv(path, sep=sep, encoding='utf-8', dtype=str, na_filter=False, quotechar='"')
+    df.columns = [str(c).strip() for c in df.columns]
+    return df
+
+
+def test_spnet_csv_parity(loaders, tmp_path):
+    spnet, _ = loaders
+    df = _read(_write_csv(tmp_path / 'spnet.csv', SPNET_HEADER, SPNET_ROWS))
+
+    expected = spnet._dataframe_to_records_rowwise(df, 'spnet.csv', LOAD_DATE)
+    actual = spnet.dataframe_to_records(df, 'spnet.csv', LOAD_DATE)
+
+    assert repr(actual) == repr(expected)
+    assert [r['bill_month'] for r in actual] == [202509, 202510, 202510, None, None]
+
+
+def test_spnet_xlsx_parity(loaders, tmp_path):
+    spnet, _ = loaders
+    df = _read(_write_xlsx(tmp_path / 'spnet.xlsx', SPNET_HEADER, SPNET_ROWS))
+
+    expected = spnet._dataframe_to_records_rowwise(df, 'spnet.xlsx', LOAD_DATE)
+    actual = spnet.dataframe_to_records(df, 'spnet.xlsx', LOAD_DATE)
+
+    assert repr(actual) == repr(expected)
+
+
+def test_steccom_csv_parity(loaders, tmp_path):
+    _, steccom = loaders
+    df = _read(_write_csv(tmp_path / 'fees.csv', STECCOM_HEADER, STECCOM_ROWS))
+
+    expected = steccom._dataframe_to_records_rowwise(df, 'fees.csv', LOAD_DATE)
+    actual = steccom.dataframe_to_records(df, 'fees.csv', LOAD_DATE)
+
+    assert repr(actual) == repr(expected)
+    assert actual[1] == 1
+
+
+def test_steccom_split_rows_parity(loaders):
+    # После разбиения строк по ';' в колонках появляются пропуски (None/NaN)
+    _, steccom = loaders
+    df = pd.DataFrame({
+        'Invoice Date': ['02.10.2025', None, float('nan')],
+        'Service': ['SBD', None, 'BROADBAND'],
+        'Amount': ['$1.00', None, '2'],
+        'Prorated Days': [None, '3', float('nan')],
+    })
+
+    expected = steccom._dataframe_to_records_rowwise(df, 'split.csv', LOAD_DATE)
+    actual = steccom.dataframe_to_records(df, 'split.csv', LOAD_DATE)
+
+    assert repr(actual) == repr(expected)
+
+
+class _CaptureCursor:
+    """Курсор-заглушка: запоминает записи executemany, SELECT/DELETE пустые"""
+
+    def __init__(self, inserted):
+        self.inserted = inserted
+        self.rowcount = 0
+
+    def execute(self, sql, params=None):
+        self.rowcount = 0
+
+    def executemany(self, sql, records, batcherrors=False):
+        self.inserted.extend(records)
+
+    def getbatcherrors(self):
+        return []
+
+    def fetchone(self):
+        return (0,)
+
+    def close(self):
+        pass
+
+
+class _CaptureConnection:
+    def __init__(self):
+        self.inserted = []
+
+    def cursor(self):
+        return _CaptureCursor(self.inserted)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def _xlsx_chunks(path, chunk_size):
+    file_chunks = importlib.import_module('python.file_chunks')
+    return list(file_chunks.prefetch(file_chunks.iter_xlsx_chunks(path, chunk_size)))
+
+
+def _strip_load_date(records):
+    return [{k: v for k, v in r.items() if k != 'load_date'} for r in records]
+
+
+def test_steccom_streaming_matches_whole_file(loaders, tmp_path):
+    _, steccom = loaders
+    path = _write_csv(tmp_path / 'fees.csv', STECCOM_HEADER, STECCOM_ROWS * 7)
+
+    steccom.connection = _CaptureConnection()
+    whole = steccom.load_single_file(str(path))
+    whole_records = steccom.connection.inserted
+
+    steccom.chunk_size = 4
+    steccom.connection = _CaptureConnection()
+    streamed = steccom.load_single_file(str(path))
+
+    assert streamed == whole == 28
+    assert repr(_strip_load_date(steccom.connection.inserted)) == repr(_strip_load_date(whole_records))
+
+
+def test_spnet_xlsx_streaming_matches_whole_file(loaders, tmp_path):
+    spnet, _ = loaders
+    path = _write_xlsx(tmp_path / 'spnet.xlsx', SPNET_HEADER, SPNET_ROWS * 5)
+    df = _read(path)
+
+    expected = spnet.dataframe_to_records(df, 'spnet.xlsx', LOAD_DATE)
+    streamed = []
+    for chunk in _xlsx_chunks(path, 3):
+        chunk.columns = [str(c).strip() for c in chunk.columns]
+        streamed.extend(spnet.dataframe_to_records(chunk, 'spnet.xlsx', LOAD_DATE))
+
+    assert repr(streamed) == repr(expected)
+
+
+class _TransactionConnection(_CaptureConnection):
+    """Подключение-заглушка с подсчетом COMMIT/ROLLBACK"""
+
+    def __init__(self):
+        super().__init__()
+        self.commits = 0
+        self.rollbacks = 0
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def test_steccom_atomic_reload_commits_once(loaders, tmp_path):
+    _, steccom = loaders
+    path = _write_csv(tmp_path / 'fees.csv', STECCOM_HEADER, STECCOM_ROWS * 7)
+
+    steccom.atomic_reload = True
+    steccom.chunk_size = 4
+    steccom.connection = _TransactionConnection()
+    loaded = steccom.load_single_file(str(path))
+
+    # Удаление и все порции - в одной транзакции
+    assert loaded == 28
+    assert (steccom.connection.commits, steccom.connection.rollbacks) == (1, 0)
+    assert not steccom.commit_per_file
+
+
+def test_steccom_atomic_reload_rolls_back_on_error(loaders, tmp_path, monkeypatch):
+    _, steccom = loaders
+    path = _write_csv(tmp_path / 'fees.csv', STECCOM_HEADER, STECCOM_ROWS)
+
+    def _fail(records):
+        raise RuntimeError('ORA-00001')
+
+    steccom.atomic_reload = True
+    steccom.connection = _TransactionConnection()
+    monkeypatch.setattr(steccom, 'insert_records', _fail)
+    with pytest.raises(RuntimeError):
+        steccom.load_single_file(str(path))
+
+    assert steccom.connection.commits == 0
+    assert steccom.connection.rollbacks == 1
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Параллельная загрузка файлов (--workers N): те же записи, что и при
+последовательной загрузке, LOAD_LOGS в порядке файлов (без подключения к Oracle)
+"""
+import importlib
+
+from tests.test_loader_record_parity import (
+    STECCOM_HEADER, STECCOM_ROWS, _CaptureConnection, _strip_load_date, _write_csv, loaders
+)
+
+
+class _FakeSessionPool:
+    def __init__(self):
+        self.connections = []
+        self.closed = False
+
+    def acquire(self):
+        connection = _CaptureConnection()
+        self.connections.append(connection)
+        return connection
+
+    def release(self, connection):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def test_steccom_parallel_matches_serial(loaders, tmp_path, monkeypatch):
+    _, steccom = loaders
+    parallel_load = importlib.import_module('python.parallel_load')
+    files = [
+        str(_write_csv(tmp_path / f'fees_{i}.csv', STECCOM_HEADER, STECCOM_ROWS * (i + 1)))
+        for i in range(5)
+    ]
+
+    steccom.connection = _CaptureConnection()
+    serial = [steccom.load_single_file(path) for path in files]
+    serial_records = steccom.connection.inserted
+
+    logged = []
+    monkeypatch.setattr(steccom, 'log_load_success',
+                        lambda table, file_name, count, *args: logged.append((file_name, count)))
+    session_pool = _FakeSessionPool()
+    monkeypatch.setattr(parallel_load, 'create_session_pool', lambda loader, size: session_pool)
+
+    results = parallel_load.load_files_parallel(steccom, files, 'STECCOM_EXPENSES', workers=3)
+
+    assert [r.error for r in results] == [None] * 5
+    assert [r.records_loaded for r in results] == serial == [4, 8, 12, 16, 20]
+    assert logged == [(f'fees_{i}.csv', count) for i, count in enumerate(serial)]
+    assert session_pool.closed
+
+    parallel_records = sorted(
+        (r for c in session_pool.connections for r in _strip_load_date(c.inserted)), key=repr
+    )
+    assert parallel_records == sorted(_strip_load_date(serial_records), key=repr)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+PDF-вложения: текст страниц извлекается пулом процессов по диапазонам страниц
+в исходном порядке, одинаковые изображения описываются через Vision один раз,
+мелкие и однотонные не описываются; вызовы PyMuPDF из разных потоков не
+пересекаются; упавший пул процессов пересоздается
+"""
+import os
+import random
+import threading
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+attachment_parsers = pytest.importorskip("kb_billing.rag.attachment_parsers", exc_type=ImportError)
+vision_annotation = pytest.importorskip("kb_billing.rag.vision_annotation", exc_type=ImportError)
+
+
+def _png(width, height, seed=None):
+    if seed is None:
+        samples = bytes(width * height * 3)
+    else:
+        samples = random.Random(seed).randbytes(width * height * 3)
+    return fitz.Pixmap(fitz.csRGB, width, height, samples, False).tobytes("png")
+
+
+def _pdf(pages):
+    logo = _png(120, 60, seed=1)
+    doc = fitz.open()
+    for n in range(1, pages + 1):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {n}")
+        # Логотип вставляется на каждой странице заново (свой xref, те же байты)
+        page.insert_image(fitz.Rect(400, 20, 520, 80), stream=logo)
+        if n == 3:
+            page.insert_image(fitz.Rect(72, 100, 272, 300), stream=_png(200, 200))
+        if n == 4:
+            page.insert_image(fitz.Rect(72, 100, 92, 120), stream=_png(20, 20, seed=4))
+        if n == 5:
+            page.insert_image(fitz.Rect(72, 100, 272, 300), stream=_png(200, 200, seed=5))
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def test_pdf_pages_in_order_and_images_deduplicated(monkeypatch, caplog):
+    calls = []
+    lock = threading.Lock()
+
+    def describe_image(data, mime_type="image/png", filename="", context_text=None, max_tokens=2048):
+        with lock:
+            calls.append(context_text)
+            return f"Описание {len(calls)}"
+
+    monkeypatch.setattr(vision_annotation, "is_vision_available", lambda: True)
+    monkeypatch.setattr(vision_annotation, "describe_image", describe_image)
+    monkeypatch.setattr(attachment_parsers, "PDF_PAGES_PER_TASK", 8)
+    monkeypatch.setattr(attachment_parsers, "PDF_WORKERS", 2)
+
+    text, err = attachment_parsers.extract_text_from_pdf(_pdf(40), "spec.pdf", context_text="Спецификация")
+
+    assert err is None
+    assert "Пул процессов PDF недоступен" not in caplog.text
+    assert attachment_parsers._get_pdf_pool()._mp_context.get_start_method() != "fork"
+    positions = [text.index(f"Стр. {n}:\nPage {n}") for n in range(1, 41)]
+    assert positions == sorted(positions)
+    # Логотип (40 страниц) и схема на стр. 5; однотонная и мелкая картинки пропущены
+    assert len(calls) == 2
+    assert sorted(c.rsplit("стр. ", 1)[1] for c in calls) == ["1", "5"]
+    assert "Изображение на стр. 1 (повторяется ещё на 39 стр.):" in text
+    assert "Изображение на стр. 5:" in text
+    assert text.index("Изображение на стр. 5:") > text.index("Стр. 5:")
+
+
+def test_pdf_without_vision_keeps_text(monkeypatch):
+    monkeypatch.setattr(vision_annotation, "is_vision_available", lambda: False)
+    text, err = attachment_parsers.extract_text_from_pdf(_pdf(2), "a.pdf")
+    assert err is None
+    assert text.startswith("Стр. 1:\nPage 1")
+
+
+def test_pymupdf_calls_serialized_across_threads(monkeypatch):
+    # Вложения парсятся в потоках обхода Confluence: fitz в процессе не вызывается одновременно
+    state = {"active": 0, "max_active": 0}
+    lock = threading.Lock()
+    fitz_open = fitz.open
+
+    def tracking_open(*args, **kwargs):
+        with lock:
+            state["active"] += 1
+            state["max_active"] = max(state["max_active"], state["active"])
+        try:
+            threading.Event().wait(0.01)
+            return fitz_open(*args, **kwargs)
+        finally:
+            with lock:
+                state["active"] -= 1
+
+    monkeypatch.setattr(vision_annotation, "is_vision_available", lambda: False)
+    monkeypatch.setattr(fitz, "open", tracking_open)
+    data = _pdf(3)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(attachment_parsers.extract_text_from_pdf(data, "a.pdf")))
+        for _ in range(6)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 6 and all(err is None for _, err in results)
+    assert state["max_active"] == 1
+
+
+def test_broken_pdf_pool_recreated(monkeypatch, caplog):
+    monkeypatch.setattr(vision_annotation, "is_vision_available", lambda: False)
+    monkeypatch.setattr(attachment_parsers, "PDF_PAGES_PER_TASK", 8)
+    monkeypatch.setattr(attachment_parsers, "PDF_WORKERS", 2)
+    broken = attachment_parsers._get_pdf_pool()
+    with pytest.raises(BrokenProcessPool):
+        broken.submit(os._exit, 1).result()
+
+    # Текст извлекается последовательно, пул сбрасывается
+    text, err = attachment_parsers.extract_text_from_pdf(_pdf(20), "a.pdf")
+    assert err is None and "Стр. 20:\nPage 20" in text
+    assert "Пул процессов PDF сломан" in caplog.text
+
+    caplog.clear()
+    text, err = attachment_parsers.extract_text_from_pdf(_pdf(20), "a.pdf")
+    assert err is None and "Стр. 20:\nPage 20" in text
+    assert attachment_parsers._get_pdf_pool() is not broken
+    assert "Пул процессов PDF" not in caplog.text
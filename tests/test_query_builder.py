@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Переменные привязки в отчетах: число разных текстов SQL не растет с числом
+значений фильтров (один разделяемый курсор на набор фильтров), значения
+в текст запроса не попадают
+"""
+import pytest
+
+from utils.query_builder import BindFilters
+
+
+PERIODS = [f"2025-{m:02d}" for m in range(1, 13)]
+
+
+def test_sql_text_constant_for_any_filter_values():
+    texts = set()
+    for i, period in enumerate(PERIODS):
+        filters = BindFilters()
+        filters.equals("v.BILL_MONTH", "period", period)
+        filters.contains("v.CONTRACT_ID", "contract_id", f"SUB-{i}'--")
+        filters.contains("v.CUSTOMER_NAME", "customer_name", f"Клиент {i}", ignore_case=True)
+        sql = f"SELECT * FROM V_CONSOLIDATED_REPORT_WITH_BILLING v WHERE {filters.where()}"
+        texts.add(sql)
+        assert period not in sql and "SUB-" not in sql
+        assert filters.params["period"] == period
+    assert len(texts) == 1
+
+
+def test_in_list_sizes_bucket_to_powers_of_two():
+    texts = set()
+    for n in range(1, 17):
+        filters = BindFilters().in_list("v.SERVICE_ID", "service_id", range(100, 100 + n))
+        texts.add(filters.where())
+        assert set(filters.params.values()) == set(range(100, 100 + n))
+    # 1, 2, 4, 8, 16 переменных вместо 16 разных текстов
+    assert len(texts) == 5
+
+
+def test_report_builders_share_sql_across_values():
+    queries = pytest.importorskip("utils.queries", exc_type=ImportError)
+
+    main_texts, revenue_texts, analytics_texts = set(), set(), set()
+    for i, period in enumerate(PERIODS):
+        imei = f"30003406{i:07d}"
+        filters = queries.build_main_report_filters(period, None, f"C{i}", imei, f"Org {i}", f"1C-{i}")
+        main_texts.add(filters.and_clauses())
+        assert imei not in filters.and_clauses()
+
+        query, params = queries.build_revenue_report_query(period, f"C{i}", imei, f"Org {i}", f"1C-{i}")
+        revenue_texts.add(query)
+        assert imei not in query and params["imei"] == imei
+
+        query, params = queries.build_analytics_invoice_period_query(period, f"C{i}", imei, None, None, i + 1, i + 1)
+        analytics_texts.add(query)
+    assert (len(main_texts), len(revenue_texts), len(analytics_texts)) == (1, 1, 1)
+
+
+class _Conn:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_analytics_reports_pass_bind_params(monkeypatch):
+    queries = pytest.importorskip("utils.queries", exc_type=ImportError)
+    calls = []
+
+    def read_sql_query(sql, conn, params=None):
+        calls.append((sql, params))
+        return queries.pd.DataFrame()
+
+    monkeypatch.setattr(queries.pd, "read_sql_query", read_sql_query)
+    conn = _Conn()
+
+    assert queries.get_analytics_invoice_period_report(lambda: conn, "2025-10", None, "300034060000001", None, None, 7, None) is not None
+    sql, params = calls[-1]
+    assert params == {"period": "2025-10", "imei": "300034060000001", "tariff_id": 7}
+    assert "2025-10" not in sql and conn.closed
+
+    assert queries.get_analytics_duplicates(lambda: _Conn(), 202510) is not None
+    sql, params = calls[-1]
+    assert params == {"period_id": 202510}
+    assert ":period_id" in sql and "202510" not in sql
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Офлайн-бенчмарк поиска: детерминированное разбиение, релевантность по набору
+таблиц, recall@k/MRR и сравнение наборов строк в SQLite
+"""
+import pytest
+
+retrieval_benchmark = pytest.importorskip("kb_billing.rag.retrieval_benchmark", exc_type=ImportError)
+
+
+def test_split_is_deterministic_and_order_independent():
+    examples = [{"question": f"Вопрос {i}", "sql": "SELECT 1 FROM DUAL"} for i in range(200)]
+    train, holdout = retrieval_benchmark.split_examples(examples, 0.2)
+    train_rev, holdout_rev = retrieval_benchmark.split_examples(list(reversed(examples)), 0.2)
+
+    assert len(train) + len(holdout) == 200
+    assert 20 < len(holdout) < 60
+    assert {e["question"] for e in holdout} == {e["question"] for e in holdout_rev}
+
+
+def test_sql_tables_skip_ctes_schema_and_dual():
+    sql = """WITH t AS (SELECT * FROM billing.BM_INVOICE_ITEM)
+SELECT * FROM t JOIN services s ON s.SERVICE_ID = t.SERVICE_ID, (SELECT 1 FROM DUAL)"""
+    assert retrieval_benchmark.sql_tables(sql) == frozenset({"BM_INVOICE_ITEM", "SERVICES"})
+
+
+class _Assistant:
+    """Поиск-заглушка: возвращает заданные SQL для вопроса"""
+
+    def __init__(self, results):
+        self.results = results
+
+    def _embed_query(self, question):
+        return [1.0]
+
+    def search_similar_examples(self, question, limit=5, mode=None, query_vector=None):
+        return [{"sql": sql} for sql in self.results[question][:limit]]
+
+
+def test_run_benchmark_recall_mrr_and_result_sets():
+    holdout = [
+        {"question": "a", "sql": "SELECT SUM(MONEY) FROM BM_INVOICE_ITEM"},
+        {"question": "b", "sql": "SELECT NAME FROM SERVICES ORDER BY NAME FETCH FIRST 1 ROWS ONLY"},
+        {"question": "c", "sql": "SELECT * FROM V_UNKNOWN"},
+    ]
+    train = [{"question": "x", "sql": "SELECT * FROM BM_INVOICE_ITEM"}, {"question": "y", "sql": "SELECT * FROM SERVICES"}]
+    assistant = _Assistant({
+        "a": ["SELECT SUM(MONEY) FROM BM_INVOICE_ITEM", "SELECT * FROM SERVICES"],
+        "b": ["SELECT * FROM BM_INVOICE_ITEM", "SELECT NVL(NAME, '-') FROM SERVICES ORDER BY NAME FETCH FIRST 1 ROWS ONLY"],
+        "c": ["SELECT * FROM SERVICES"],
+    })
+    conn = retrieval_benchmark.sqlite3.connect(":memory:")
+    conn.executescript("""
+        CREATE TABLE BM_INVOICE_ITEM (MONEY REAL);
+        INSERT INTO BM_INVOICE_ITEM VALUES (10), (5);
+        CREATE TABLE SERVICES (NAME TEXT);
+        INSERT INTO SERVICES VALUES ('b'), ('a');
+    """)
+
+    report = retrieval_benchmark.run_benchmark(assistant, holdout, k_values=(1, 2), modes=("vector",), sample_db=conn, train=train)
+    metrics = report["vector"]
+
+    # c: V_UNKNOWN нет в обучающих примерах - не оценивается
+    assert metrics["evaluated"] == 2 and metrics["no_relevant"] == 1
+    assert metrics["recall@1"] == 0.5 and metrics["recall@2"] == 1.0
+    assert metrics["mrr"] == 0.75
+    assert metrics["result_set_top1"] == {"equal": 1, "different": 1, "not_executable": 1}
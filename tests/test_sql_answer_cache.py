@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Семантический кэш SQL: тот же отчет за другой период / с другим топ-N берется
+из кэша с подстановкой параметров, остальные различия - мимо кэша
+"""
+import pytest
+
+sql_answer_cache = pytest.importorskip("kb_billing.rag.sql_answer_cache", exc_type=ImportError)
+from kb_billing.rag import table_index
+
+SQL = """SELECT imei AS IMEI, rev AS "Доход (руб)"
+FROM (
+  SELECT TRIM(TO_CHAR(s.VSAT)) AS imei, SUM(ii.MONEY) AS rev
+  FROM BM_INVOICE_ITEM ii
+  JOIN BM_PERIOD p ON ii.PERIOD_ID = p.PERIOD_ID
+  JOIN SERVICES s ON ii.SERVICE_ID = s.SERVICE_ID
+  WHERE TO_CHAR(p.START_DATE, 'YYYY-MM') = '2025-10'
+  GROUP BY TRIM(TO_CHAR(s.VSAT))
+  ORDER BY rev DESC
+  FETCH FIRST 5 ROWS ONLY
+)"""
+
+
+def test_question_key_masks_period_and_top_n():
+    october = sql_answer_cache.question_key("Топ 5 IMEI по доходу за октябрь 2025", top_n=5)
+    november = sql_answer_cache.question_key("топ 10 IMEI по доходу за ноябрь 2025", top_n=10)
+
+    assert october.params == {"period": "2025-10", "top_n": 5}
+    assert november.params == {"period": "2025-11", "top_n": 10}
+    assert october.text == november.text == "топ N imei по доходу за <период>"
+    assert october.literals == ()
+
+    assert sql_answer_cache.question_key("Доход за мае 2025").params == {"period": "2025-05"}
+    assert sql_answer_cache.question_key("Трафик с 1 марта 2025").params == {"period": "2025-03"}
+    # Слова, начинающиеся как месяц, - не период
+    for question in ("майнинг 2025", "майский трафик 2025", "маяк 2025", "мартовский отчет 2025"):
+        assert sql_answer_cache.question_key(question).params == {}
+
+    quarter = sql_answer_cache.question_key("Доход за Q3 2024")
+    assert quarter.params == {}
+    assert quarter.literals == ("3", "2024")
+
+
+def test_lookup_substitutes_period_and_top_n():
+    cache = sql_answer_cache.SQLAnswerCache(similarity=0.95)
+    october = sql_answer_cache.question_key("Топ 5 IMEI по доходу за октябрь 2025", top_n=5)
+    cache.store("kb:gpt-4o", [1.0, 0.0], october, SQL)
+
+    november = sql_answer_cache.question_key("Топ 10 IMEI по доходу за ноябрь 2025", top_n=10)
+    sql = cache.lookup("kb:gpt-4o", [0.99, 0.05], november)
+    assert "'2025-11'" in sql and "'2025-10'" not in sql
+    assert "FETCH FIRST 10 ROWS ONLY" in sql
+
+    # Другая модель LLM, непохожий вопрос, нет периода в вопросе - мимо кэша
+    assert cache.lookup("kb:gpt-3.5-turbo", [1.0, 0.0], november) is None
+    assert cache.lookup("kb:gpt-4o", [0.0, 1.0], november) is None
+    no_period = sql_answer_cache.question_key("Топ 10 IMEI по доходу", top_n=10)
+    assert cache.lookup("kb:gpt-4o", [1.0, 0.0], no_period) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 3
+
+
+def test_period_outside_literal_is_not_substituted():
+    cache = sql_answer_cache.SQLAnswerCache()
+    october = sql_answer_cache.question_key("Доход за октябрь 2025")
+    sql = "SELECT SUM(MONEY) FROM BM_INVOICE_ITEM WHERE PERIOD_YYYYMM = '2025-10' AND DATE_FROM >= DATE '2025-10-01'"
+    cache.store("kb:m", [1.0], october, sql)
+
+    assert cache.lookup("kb:m", [1.0], october) == sql
+    assert cache.lookup("kb:m", [1.0], sql_answer_cache.question_key("Доход за ноябрь 2025")) is None
+    assert cache.stats()["rejected"] == 1
+
+
+def test_kb_reload_and_ttl_drop_entries(monkeypatch, tmp_path):
+    monkeypatch.setattr(table_index, "KB_STAMP_PATH", tmp_path / "kb_loaded.stamp")
+    cache = sql_answer_cache.SQLAnswerCache(ttl=60)
+    key = sql_answer_cache.question_key("Доход за октябрь 2025")
+    cache.store("kb:m", [1.0], key, "SELECT * FROM V_PROFITABILITY_BY_PERIOD WHERE PERIOD = '2025-10'")
+    assert cache.lookup("kb:m", [1.0], key)
+
+    table_index.invalidate()
+    assert cache.lookup("kb:m", [1.0], key) is None
+    assert cache.stats()["entries"] == 0
+
+    cache.store("kb:m", [1.0], key, "SELECT * FROM V_PROFITABILITY_BY_PERIOD WHERE PERIOD = '2025-10'")
+    now = sql_answer_cache.time.monotonic()
+    monkeypatch.setattr(sql_answer_cache.time, "monotonic", lambda: now + 61)
+    assert cache.lookup("kb:m", [1.0], key) is None
+
+
+def test_kb_reload_in_other_process_drops_entries(monkeypatch, tmp_path):
+    stamp = tmp_path / "kb_loaded.stamp"
+    monkeypatch.setattr(table_index, "KB_STAMP_PATH", stamp)
+    cache = sql_answer_cache.SQLAnswerCache()
+    key = sql_answer_cache.question_key("Доход за октябрь 2025")
+    cache.store("kb:m", [1.0], key, "SELECT * FROM V_PROFITABILITY_BY_PERIOD WHERE PERIOD = '2025-10'")
+    assert cache.lookup("kb:m", [1.0], key)
+
+    # init_kb в другом процессе: отметка на диске обновлена, поколение этого процесса прежнее
+    generation = table_index.generation()
+    stamp.write_text("")
+    assert table_index.generation() == generation
+    assert cache.lookup("kb:m", [1.0], key) is None
+    assert cache.stats()["entries"] == 0
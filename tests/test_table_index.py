@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Индекс таблиц KB: информация о таблицах для контекста SQL из одного scroll,
+перечитывается после загрузки KB (Qdrant в памяти)
+"""
+import pytest
+
+table_index = pytest.importorskip("kb_billing.rag.table_index", exc_type=ImportError)
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, PointStruct, VectorParams
+
+
+class _CountingClient:
+    """Обертка над QdrantClient: считает вызовы scroll"""
+
+    def __init__(self, client):
+        self.client = client
+        self.scrolls = 0
+
+    def scroll(self, **kwargs):
+        self.scrolls += 1
+        return self.client.scroll(**kwargs)
+
+
+def _point(point_id, payload):
+    return PointStruct(id=point_id, vector=[1.0, 0.0], payload=payload)
+
+
+def test_table_index_single_scroll_and_invalidation():
+    qdrant = QdrantClient(":memory:")
+    qdrant.create_collection("kb", vectors_config=VectorParams(size=2, distance=Distance.COSINE))
+    qdrant.upsert("kb", points=[
+        _point(1, {"type": "ddl", "table_name": "SERVICES", "content": "CREATE TABLE SERVICES"}),
+        _point(2, {"type": "documentation", "table_name": "SERVICES", "content": "Услуги"}),
+        _point(3, {"type": "view", "view_name": "V_REVENUE_FROM_INVOICES", "content": "Доходы"}),
+        _point(4, {"type": "qa_example", "question": "?", "sql": "SELECT 1 FROM DUAL"}),
+    ])
+    client = _CountingClient(qdrant)
+    index = table_index.TableIndex(client, "kb")
+
+    assert index.get("SERVICES")["ddl"]["content"] == "CREATE TABLE SERVICES"
+    assert index.get("services")["documentation"]["content"] == "Услуги"
+    assert index.get("V_REVENUE_FROM_INVOICES")["view"]["content"] == "Доходы"
+    assert index.get("BM_PERIOD") is None
+    assert client.scrolls == 1
+
+    qdrant.upsert("kb", points=[_point(5, {"type": "ddl", "table_name": "BM_PERIOD", "content": "CREATE TABLE BM_PERIOD"})])
+    assert index.get("BM_PERIOD") is None
+    table_index.invalidate()
+    assert index.get("BM_PERIOD")["ddl"]["content"] == "CREATE TABLE BM_PERIOD"
+    assert client.scrolls == 2
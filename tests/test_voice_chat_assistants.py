@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+voice_chat: RAGAssistant создается один раз на процесс даже при параллельных
+запросах /api/chat, время прогрева видно в health()
+"""
+import threading
+import time
+
+import pytest
+
+rag_assistant = pytest.importorskip("kb_billing.rag.rag_assistant", exc_type=ImportError)
+from voice_chat import assistants
+
+
+class _SlowAssistant:
+    created = 0
+
+    def __init__(self, **kwargs):
+        time.sleep(0.05)
+        type(self).created += 1
+
+
+def test_rag_assistant_created_once_for_concurrent_requests(monkeypatch):
+    monkeypatch.setattr(rag_assistant, "RAGAssistant", _SlowAssistant)
+    monkeypatch.setattr(assistants, "_rag", None)
+    monkeypatch.setattr(assistants, "_satellite_agent", None)
+    monkeypatch.setattr(assistants, "_openai_client", None)
+    monkeypatch.setattr(assistants, "_init_seconds", {})
+    monkeypatch.setattr(assistants, "_warmup", {"state": "not_started", "seconds": None, "error": None})
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(assistants.get_rag_assistant())) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert _SlowAssistant.created == 1
+    assert len({id(r) for r in results}) == 1
+
+    assistants.warm_up()
+    info = assistants.health()
+    assert info["warmup"]["state"] == "ready"
+    assert info["init_seconds"]["rag_assistant"] >= 0.05
+    assert info["satellite_agent"] and not info["openai_client"]
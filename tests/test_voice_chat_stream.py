@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+voice_chat: /api/chat со stream=true отдает ответ LLM событиями SSE по мере
+генерации, SQL извлекается из полного ответа в событии done
+"""
+import json
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+openai_client = pytest.importorskip("kb_billing.rag.openai_client", exc_type=ImportError)
+satellite = pytest.importorskip("kb_billing.rag.satellite_librarian_agent", exc_type=ImportError)
+from voice_chat import app as voice_app
+from voice_chat import assistants
+
+
+def _chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+class _StreamingClient:
+    def __init__(self, parts):
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.parts = parts
+
+    def _create(self, **kwargs):
+        self.calls.append(kwargs)
+        assert kwargs["stream"] is True
+        return iter([_chunk(p) for p in self.parts] + [SimpleNamespace(choices=[])])
+
+
+class _Rag:
+    def get_context_for_sql_generation(self, question, max_examples=5):
+        return {}
+
+    def format_context_for_llm(self, context):
+        return ""
+
+
+def _events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_billing_chat_streams_deltas_then_sql(monkeypatch):
+    client = _StreamingClient(["Запрос:\n```sql\nSELECT 1 ", "FROM DUAL\n```"])
+    monkeypatch.setattr(assistants, "get_openai_client", lambda: client)
+    monkeypatch.setattr(assistants, "get_rag_assistant", lambda: _Rag())
+
+    test_client = voice_app.app.test_client()
+    with test_client.session_transaction() as sess:
+        sess["username"] = "director"
+    resp = test_client.post("/api/chat", json={
+        "assistant": "billing",
+        "stream": True,
+        "messages": [{"role": "user", "content": "Выручка за октябрь"}],
+    })
+
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/event-stream"
+    events = _events(resp.get_data(as_text=True))
+    assert [e for e, _ in events] == ["delta", "delta", "done"]
+    assert events[-1][1]["sql"] == "SELECT 1 FROM DUAL"
+    assert events[-1][1]["reply"].startswith("Запрос:")
+
+
+def test_satellite_rest_stream_parses_sse():
+    def handler(request):
+        assert request.url.path.endswith(":streamGenerateContent")
+        assert request.url.params["alt"] == "sse"
+        body = "".join(
+            "data: " + json.dumps({"candidates": [{"content": {"parts": [{"text": t}]}}]}) + "\r\n\r\n"
+            for t in ("Проверьте ", "питание модема")
+        )
+        return httpx.Response(200, text=body, headers={"Content-Type": "text/event-stream"})
+
+    agent = satellite.SatelliteLibrarianAgent(api_key="key", base_url="https://proxy/google")
+    agent._http_client = httpx.Client(base_url=agent.base_url, transport=httpx.MockTransport(handler))
+
+    assert list(agent.ask_stream("Не горит LED", use_rag=False)) == ["Проверьте ", "питание модема"]
@@ -4,6 +4,8 @@
 """
 
 import os
+import threading
+import time
 from pathlib import Path
 from typing import Optional, Dict, Any
 
@@ -37,35 +39,172 @@ def get_oracle_config() -> Dict[str, Any]:
         'username': os.getenv('ORACLE_USER', 'your_user')  # Для совместимости с загрузчиками
     }
 
+# Пул сессий Oracle на процесс (логон через туннель - 300-800 мс, сессии переиспользуются)
+POOL_MIN = int(os.getenv('ORACLE_POOL_MIN', '1'))
+POOL_MAX = int(os.getenv('ORACLE_POOL_MAX', '8'))
+POOL_INCREMENT = int(os.getenv('ORACLE_POOL_INCREMENT', '1'))
+# Проверка сессии перед выдачей, если она простаивала дольше (сек)
+POOL_PING_INTERVAL = int(os.getenv('ORACLE_POOL_PING_INTERVAL', '60'))
+# Ожидание свободной сессии при занятом пуле (мс)
+POOL_WAIT_TIMEOUT = int(os.getenv('ORACLE_POOL_WAIT_TIMEOUT', '30000'))
+STMT_CACHE_SIZE = int(os.getenv('ORACLE_STMT_CACHE_SIZE', '50'))
+# Повторная попытка создать пул после ошибки - не раньше чем через (сек)
+POOL_RETRY_INTERVAL = int(os.getenv('ORACLE_POOL_RETRY_INTERVAL', '60'))
+
+_pool = None
+# Время последней неудачной попытки создать пул (time.monotonic)
+_pool_failed_at = None
+_pool_lock = threading.Lock()
+_pool_counters = {'acquired': 0, 'acquire_seconds': 0.0, 'direct_connections': 0, 'errors': 0}
+
+def _oracle_driver():
+    try:
+        import oracledb as cx_Oracle
+    except ImportError:
+        import cx_Oracle
+    return cx_Oracle
+
+def _make_dsn(cx_Oracle, config):
+    return cx_Oracle.makedsn(
+        config['host'],
+        config['port'],
+        service_name=config['service_name']
+    )
+
+def get_pool():
+    """Пул сессий Oracle (создается при первом обращении, один на процесс)
+
+    Returns:
+        Пул или None, если создать не удалось (следующая попытка -
+        через POOL_RETRY_INTERVAL сек, до нее пул не создается)
+    """
+    global _pool, _pool_failed_at
+    if _pool is not None:
+        return _pool
+    with _pool_lock:
+        if _pool is None:
+            if _pool_failed_at is not None and time.monotonic() - _pool_failed_at < POOL_RETRY_INTERVAL:
+                return None
+            cx_Oracle = _oracle_driver()
+            config = get_oracle_config()
+            try:
+                _pool = cx_Oracle.create_pool(
+                    user=config['user'],
+                    password=config['password'],
+                    dsn=_make_dsn(cx_Oracle, config),
+                    min=POOL_MIN,
+                    max=POOL_MAX,
+                    increment=POOL_INCREMENT,
+                    ping_interval=POOL_PING_INTERVAL,
+                    stmtcachesize=STMT_CACHE_SIZE,
+                    getmode=cx_Oracle.POOL_GETMODE_TIMEDWAIT,
+                    wait_timeout=POOL_WAIT_TIMEOUT
+                )
+                _pool_failed_at = None
+            except Exception as e:
+                print(f"Error creating Oracle session pool: {e}")
+                _pool_failed_at = time.monotonic()
+                _pool_counters['errors'] += 1
+                return None
+    return _pool
+
+def close_pool():
+    """Закрытие пула (сессии, не возвращенные в пул, закрываются принудительно)"""
+    global _pool, _pool_failed_at
+    with _pool_lock:
+        _pool_failed_at = None
+        if _pool is not None:
+            _pool.close(force=True)
+            _pool = None
+
+def _streamlit_username() -> Optional[str]:
+    """Имя пользователя Streamlit текущего запуска скрипта (None вне Streamlit)"""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        if get_script_run_ctx() is None:
+            return None
+        import streamlit as st
+        return st.session_state.get('username')
+    except Exception:
+        return None
+
 def get_db_connection():
     """
-    Создание подключения к базе данных Oracle
-    
+    Подключение к базе данных Oracle из пула сессий
+
+    close() возвращает сессию в пул. CLIENT_IDENTIFIER сессии - имя
+    пользователя Streamlit (видно в V$SESSION и аудите). Если пула нет
+    (создать не удалось) - прямое подключение, как раньше. Если пул есть,
+    но сессию получить не удалось (все заняты дольше POOL_WAIT_TIMEOUT,
+    БД недоступна) - None: подключение в обход пула превысило бы POOL_MAX.
+
     Returns:
         Connection object или None
     """
     try:
+        pool = get_pool()
+    except ImportError:
+        raise ImportError("Oracle driver not installed. Install with: pip install oracledb")
+
+    if pool is not None:
         try:
-            import oracledb as cx_Oracle
-        except ImportError:
-            import cx_Oracle
+            started = time.perf_counter()
+            conn = pool.acquire()
+            with _pool_lock:
+                _pool_counters['acquired'] += 1
+                _pool_counters['acquire_seconds'] += time.perf_counter() - started
+            # Сессия могла обслуживать другого пользователя - перезаписываем всегда
+            conn.client_identifier = _streamlit_username() or ''
+            return conn
+        except Exception as e:
+            print(f"Error acquiring Oracle session from pool: {e}")
+            with _pool_lock:
+                _pool_counters['errors'] += 1
+            return None
+
+    try:
+        cx_Oracle = _oracle_driver()
         config = get_oracle_config()
-        dsn = cx_Oracle.makedsn(
-            config['host'],
-            config['port'],
-            service_name=config['service_name']
-        )
-        return cx_Oracle.connect(
+        conn = cx_Oracle.connect(
             user=config['user'],
             password=config['password'],
-            dsn=dsn
+            dsn=_make_dsn(cx_Oracle, config)
         )
-    except ImportError:
-        raise ImportError("Oracle driver not installed. Install with: pip install oracledb")
+        with _pool_lock:
+            _pool_counters['direct_connections'] += 1
+        return conn
     except Exception as e:
         print(f"Error connecting to Oracle: {e}")
         return None
 
+def get_pool_stats() -> Dict[str, Any]:
+    """Статистика пула сессий (для страницы администратора)"""
+    with _pool_lock:
+        counters = dict(_pool_counters)
+        pool = _pool
+    acquired = counters['acquired']
+    stats = {
+        'created': pool is not None,
+        'min': POOL_MIN,
+        'max': POOL_MAX,
+        'increment': POOL_INCREMENT,
+        'ping_interval': POOL_PING_INTERVAL,
+        'stmtcachesize': STMT_CACHE_SIZE,
+        'opened': 0,
+        'busy': 0,
+        'acquired': acquired,
+        'avg_acquire_ms': round(counters['acquire_seconds'] / acquired * 1000, 1) if acquired else 0.0,
+        'direct_connections': counters['direct_connections'],
+        'errors': counters['errors'],
+    }
+    if pool is not None:
+        try:
+            stats['opened'] = pool.opened
+            stats['busy'] = pool.busy
+        except Exception:
+            pass
+    return stats
+
 def get_data_loader():
     """
     Получение загрузчиков данных для Oracle
@@ -9,6 +9,9 @@ from pathlib import Path
 import streamlit as st
 from datetime import datetime
 
+from python import file_format
+from utils.query_builder import BindFilters
+
 # Укороченный набор колонок для экрана/CSV «Доходы». DDL V_REVENUE_FROM_INVOICES в Oracle не меняем — только список полей в этом SELECT.
 # OPEN_DATE не из v.*: на БД без пересборки 05 колонки v.OPEN_DATE нет (ORA-00904). Скаляр по PK SERVICES — без второго JOIN к той же таблице (меньше нагрузка на сессию).
 _REVENUE_UI_BEFORE_OPEN_DATE = (
@@ -57,27 +60,19 @@ def _revenue_ui_select_sql(alias: str = "v") -> str:
 
 
 def count_file_records(file_path):
-    """Подсчет количества записей в файле (CSV или XLSX). Для CSV — pandas с разными sep/encoding, как в загрузчиках."""
+    """Подсчет количества записей в файле (CSV или XLSX). Формат CSV и результат кэшируются в python.file_format (общий кэш с загрузчиками)."""
     try:
         path = Path(file_path) if not isinstance(file_path, Path) else file_path
-        if str(path).lower().endswith('.csv'):
-            for enc in ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']:
-                for sep in [';', '\t', ',']:
-                    try:
-                        df = pd.read_csv(path, sep=sep, encoding=enc, dtype=str, na_filter=False, quotechar='"')
-                        if len(df.columns) > 1 and len(df) >= 0:
-                            return len(df)
-                    except Exception:
-                        continue
+        if not str(path).lower().endswith(('.csv', '.xlsx')):
+            return None
+        count = file_format.count_file_records(path)
+        if count is None and str(path).lower().endswith('.csv'):
             with open(path, 'r', encoding='utf-8', errors='ignore') as f:
                 return max(0, sum(1 for _ in f) - 1)
-        elif str(path).lower().endswith('.xlsx'):
-            df = pd.read_excel(path)
-            return len(df)
+        return count
     except Exception as e:
         print(f"Ошибка подсчета строк в файле {file_path}: {e}")
         return None
-    return None
 
 def get_records_in_db(get_connection, file_name, table_name='SPNET_TRAFFIC'):
     """Получить количество записей в базе для файла"""
@@ -99,45 +94,33 @@ def get_records_in_db(get_connection, file_name, table_name='SPNET_TRAFFIC'):
         if conn:
             conn.close()
 
-def get_main_report(get_connection, period_filter=None, plan_filter=None, contract_id_filter=None, imei_filter=None, customer_name_filter=None, code_1c_filter=None):
-    """Получение основного отчета"""
-    conn = get_connection()
-    if not conn:
-        return None
-    
-    # Фильтр по периодам
-    period_condition = ""
+def build_main_report_filters(period_filter=None, plan_filter=None, contract_id_filter=None, imei_filter=None, customer_name_filter=None, code_1c_filter=None):
+    """Условия основного отчета (V_CONSOLIDATED_REPORT_WITH_BILLING) с переменными привязки"""
+    filters = BindFilters()
     if period_filter and period_filter != "All Periods":
-        period_condition = f"AND v.FINANCIAL_PERIOD = '{period_filter}'"
-    
-    # Фильтр по тарифам
-    plan_condition = ""
+        filters.equals("v.FINANCIAL_PERIOD", "period", period_filter)
     if plan_filter and plan_filter != "All Plans":
-        plan_condition = f"AND v.PLAN_NAME = '{plan_filter}'"
-    
-    # Фильтр по CONTRACT_ID
-    contract_condition = ""
+        filters.equals("v.PLAN_NAME", "plan_name", plan_filter)
     if contract_id_filter and contract_id_filter.strip():
-        contract_value = contract_id_filter.strip().replace("'", "''")
-        contract_condition = f"AND v.CONTRACT_ID LIKE '%{contract_value}%'"
-    
-    # Фильтр по IMEI (VSAT в БД может быть NUMBER)
-    imei_condition = ""
+        filters.contains("v.CONTRACT_ID", "contract_id", contract_id_filter.strip())
+    # IMEI (VSAT в БД может быть NUMBER)
     if imei_filter and imei_filter.strip():
-        imei_value = imei_filter.strip().replace("'", "''")
-        imei_condition = f"AND TRIM(TO_CHAR(v.IMEI)) = '{imei_value}'"
-    
-    # Фильтр по названию клиента
-    customer_condition = ""
+        filters.equals("TRIM(TO_CHAR(v.IMEI))", "imei", imei_filter.strip())
     if customer_name_filter and customer_name_filter.strip():
-        customer_value = customer_name_filter.strip().replace("'", "''")
-        customer_condition = f"AND UPPER(COALESCE(v.ORGANIZATION_NAME, v.CUSTOMER_NAME, '')) LIKE UPPER('%{customer_value}%')"
-    
-    # Фильтр по коду 1С
-    code_1c_condition = ""
+        filters.contains("COALESCE(v.ORGANIZATION_NAME, v.CUSTOMER_NAME, '')", "customer_name",
+                         customer_name_filter.strip(), ignore_case=True)
     if code_1c_filter and code_1c_filter.strip():
-        code_1c_value = code_1c_filter.strip().replace("'", "''")
-        code_1c_condition = f"AND v.CODE_1C LIKE '%{code_1c_value}%'"
+        filters.contains("v.CODE_1C", "code_1c", code_1c_filter.strip())
+    return filters
+
+def get_main_report(get_connection, period_filter=None, plan_filter=None, contract_id_filter=None, imei_filter=None, customer_name_filter=None, code_1c_filter=None):
+    """Получение основного отчета"""
+    conn = get_connection()
+    if not conn:
+        return None
+    
+    # Фильтры - переменные привязки: текст SQL зависит только от набора фильтров
+    filters = build_main_report_filters(period_filter, plan_filter, contract_id_filter, imei_filter, customer_name_filter, code_1c_filter)
     
     base_query = """
     SELECT 
@@ -169,27 +152,14 @@ def get_main_report(get_connection, period_filter=None, plan_filter=None, contra
         NVL(v.FEE_CREDITED, 0) AS "Credited",
         NVL(v.FEE_PRORATED, 0) AS "Prorated"
     FROM V_CONSOLIDATED_REPORT_WITH_BILLING v
-    WHERE 1=1
-        {plan_condition}
-        {period_condition}
-        {contract_condition}
-        {imei_condition}
-        {customer_condition}
-        {code_1c_condition}
+    WHERE 1=1{conditions}
     ORDER BY v.BILL_MONTH DESC, "Calculated Overage ($)" DESC NULLS LAST
     """
     
-    query = base_query.format(
-        plan_condition=plan_condition,
-        period_condition=period_condition,
-        contract_condition=contract_condition,
-        imei_condition=imei_condition,
-        customer_condition=customer_condition,
-        code_1c_condition=code_1c_condition
-    )
+    query = base_query.format(conditions=filters.and_clauses())
     
     try:
-        df = pd.read_sql_query(query, conn)
+        df = pd.read_sql_query(query, conn, params=filters.params)
         return df
     except Exception as e:
         st.error(f"Ошибка получения отчета: {e}")
@@ -277,56 +247,39 @@ def get_revenue_periods(_get_connection):
     finally:
         if conn: conn.close()
 
-def get_revenue_report(get_connection, period_filter=None, contract_id_filter=None, imei_filter=None, customer_name_filter=None, code_1c_filter=None):
-    """Получение отчета по доходам. Без задвоения IMEI: только услуги с CLOSE_DATE > конец периода или NULL."""
-    conn = get_connection()
-    if not conn:
-        return None
+def build_revenue_report_query(period_filter=None, contract_id_filter=None, imei_filter=None, customer_name_filter=None, code_1c_filter=None, service_ids=None):
+    """SQL отчета по доходам с переменными привязки
     
-    conds = []
-    if period_filter and period_filter != "All Periods": 
-        conds.append(f"v.PERIOD_YYYYMM = '{period_filter}'")
+    Args:
+        service_ids: SERVICE_ID, найденные по VSAT для imei_filter (если есть -
+            фильтр по IN вместо сравнения IMEI по всему view)
+    
+    Returns:
+        tuple: (query, params)
+    """
+    filters = BindFilters()
+    period = period_filter if period_filter and period_filter != "All Periods" else None
+    if period:
+        filters.equals("v.PERIOD_YYYYMM", "period", period)
     if contract_id_filter: 
-        val = contract_id_filter.strip().replace("'", "''")
-        conds.append(f"v.CONTRACT_ID LIKE '%{val}%'")
+        filters.contains("v.CONTRACT_ID", "contract_id", contract_id_filter.strip())
     if imei_filter:
-        raw_imei = imei_filter.strip()
-        imei_sql = raw_imei.replace("'", "''")
-        # Сначала дешёвый поиск SERVICE_ID по VSAT; если есть — только IN (без OR по всему view).
-        sid_list = []
-        try:
-            cur = conn.cursor()
-            cur.execute(
-                "SELECT SERVICE_ID FROM SERVICES WHERE TRIM(TO_CHAR(VSAT)) = :1",
-                [raw_imei],
-            )
-            for row in cur.fetchall():
-                if row and row[0] is not None:
-                    sid_list.append(int(row[0]))
-            cur.close()
-        except Exception:
-            sid_list = []
-        if sid_list:
-            conds.append("v.SERVICE_ID IN (" + ",".join(str(x) for x in sid_list) + ")")
+        if service_ids:
+            filters.in_list("v.SERVICE_ID", "service_id", service_ids)
         else:
-            conds.append(f"TRIM(TO_CHAR(v.IMEI)) = '{imei_sql}'")
+            filters.equals("TRIM(TO_CHAR(v.IMEI))", "imei", imei_filter.strip())
     if customer_name_filter: 
-        val = customer_name_filter.strip().replace("'", "''")
-        conds.append(
-            f"UPPER(COALESCE(v.CUSTOMER_NAME, v.ORGANIZATION_NAME, '')) LIKE UPPER('%{val}%')"
-        )
+        filters.contains("COALESCE(v.CUSTOMER_NAME, v.ORGANIZATION_NAME, '')", "customer_name",
+                         customer_name_filter.strip(), ignore_case=True)
     if code_1c_filter: 
-        conds.append(f"v.CODE_1C LIKE '%{code_1c_filter.strip()}%'")
+        filters.contains("v.CODE_1C", "code_1c", code_1c_filter.strip())
     
-    where = " AND ".join(conds) if conds else "1=1"
+    where = filters.where()
     # Без задвоения: 1) показываем строку если главная услуга активна ИЛИ есть активная услуга с начислениями в периоде;
     # 2) на (IMEI, CONTRACT_ID, PERIOD) оставляем одну строку — приоритет у строки, где главная услуга активна (не клон)
     #
     # Для одного выбранного месяца EXISTS по BM_INVOICE_ITEM заменён на WITH+JOIN (один проход по счетам за период),
     # иначе при «только период» запрос зависал на коррелированном EXISTS по всем строкам view.
-    period_esc = None
-    if period_filter and period_filter != "All Periods":
-        period_esc = period_filter.replace("'", "''")
     exists_sql = f"""
       EXISTS (
         SELECT 1 FROM BM_INVOICE_ITEM ii2
@@ -336,7 +289,7 @@ def get_revenue_report(get_connection, period_filter=None, contract_id_filter=No
           AND TO_CHAR(p.START_DATE,'YYYY-MM') = v.PERIOD_YYYYMM
           AND (s2.CLOSE_DATE IS NULL OR s2.CLOSE_DATE > LAST_DAY(TO_DATE(v.PERIOD_YYYYMM||'-01','YYYY-MM-DD')))
       )"""
-    if period_esc:
+    if period:
         query = f"""WITH inv_cov AS (
   SELECT DISTINCT
     NVL(NULLIF(TRIM(TO_CHAR(s2.VSAT)), ''), NULLIF(TRIM(TO_CHAR(s2.LOGIN)), '')) AS imei_key,
@@ -344,7 +297,7 @@ def get_revenue_report(get_connection, period_filter=None, contract_id_filter=No
   FROM BM_INVOICE_ITEM ii2
   JOIN SERVICES s2 ON ii2.SERVICE_ID = s2.SERVICE_ID
   JOIN BM_PERIOD p ON ii2.PERIOD_ID = p.PERIOD_ID
-  WHERE TO_CHAR(p.START_DATE,'YYYY-MM') = '{period_esc}'
+  WHERE TO_CHAR(p.START_DATE,'YYYY-MM') = :period
     AND (s2.CLOSE_DATE IS NULL OR s2.CLOSE_DATE > LAST_DAY(TO_DATE(TO_CHAR(p.START_DATE,'YYYY-MM')||'-01','YYYY-MM-DD')))
 )
 SELECT * FROM (
@@ -381,9 +334,38 @@ ORDER BY t.BILL_MONTH DESC, t.CONTRACT_ID"""
     )
 ) t WHERE t.rn = 1
 ORDER BY t.BILL_MONTH DESC, t.CONTRACT_ID"""
+    return query, filters.params
+
+def get_revenue_report(get_connection, period_filter=None, contract_id_filter=None, imei_filter=None, customer_name_filter=None, code_1c_filter=None):
+    """Получение отчета по доходам. Без задвоения IMEI: только услуги с CLOSE_DATE > конец периода или NULL."""
+    conn = get_connection()
+    if not conn:
+        return None
+    
+    sid_list = []
+    if imei_filter:
+        raw_imei = imei_filter.strip()
+        # Сначала дешёвый поиск SERVICE_ID по VSAT; если есть — только IN (без OR по всему view).
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT SERVICE_ID FROM SERVICES WHERE TRIM(TO_CHAR(VSAT)) = :1",
+                [raw_imei],
+            )
+            for row in cur.fetchall():
+                if row and row[0] is not None:
+                    sid_list.append(int(row[0]))
+            cur.close()
+        except Exception:
+            sid_list = []
+    
+    query, params = build_revenue_report_query(
+        period_filter, contract_id_filter, imei_filter, customer_name_filter, code_1c_filter,
+        service_ids=sid_list
+    )
     
     try:
-        df = pd.read_sql_query(query, conn)
+        df = pd.read_sql_query(query, conn, params=params)
         if df is not None and not df.empty and "RN" in df.columns:
             df = df.drop(columns=["RN"])
         return df
@@ -439,13 +421,13 @@ def get_analytics_duplicates(get_connection, period_id):
         LISTAGG(AID, ', ') WITHIN GROUP (ORDER BY AID) AS AID_LIST,
         {group_cols}
     FROM ANALYTICS
-    WHERE PERIOD_ID = {period_id}
+    WHERE PERIOD_ID = :period_id
     GROUP BY {group_cols}
     HAVING COUNT(*) > 1
     ORDER BY DUPLICATE_COUNT DESC
     """
     try:
-        return pd.read_sql_query(query, conn)
+        return pd.read_sql_query(query, conn, params={"period_id": period_id})
     except:
         return None
     finally:
@@ -506,35 +488,43 @@ def remove_analytics_duplicates(get_connection, period_id):
                 pass
 
 
-def get_analytics_invoice_period_report(get_connection, period_filter=None, contract_id_filter=None, imei_filter=None, customer_name_filter=None, code_1c_filter=None, tariff_filter=None, zone_filter=None):
-    """Получение отчета по счетам из ANALYTICS"""
-    conn = get_connection()
-    if not conn: return None
+def build_analytics_invoice_period_query(period_filter=None, contract_id_filter=None, imei_filter=None, customer_name_filter=None, code_1c_filter=None, tariff_filter=None, zone_filter=None):
+    """SQL отчета по счетам из ANALYTICS с переменными привязки
     
-    conds = []
+    Returns:
+        tuple: (query, params)
+    """
+    filters = BindFilters()
     if period_filter and period_filter != "All Periods": 
-        conds.append(f"v.PERIOD_YYYYMM = '{period_filter}'")
+        filters.equals("v.PERIOD_YYYYMM", "period", period_filter)
     if contract_id_filter: 
-        val = contract_id_filter.strip().replace("'", "''")
-        conds.append(f"v.CONTRACT_ID LIKE '%{val}%'")
+        filters.contains("v.CONTRACT_ID", "contract_id", contract_id_filter.strip())
     if imei_filter:
-        imei_val = imei_filter.strip().replace("'", "''")
-        conds.append(f"TRIM(TO_CHAR(v.IMEI)) = '{imei_val}'")
+        filters.equals("TRIM(TO_CHAR(v.IMEI))", "imei", imei_filter.strip())
     if customer_name_filter: 
-        val = customer_name_filter.strip().replace("'", "''")
-        conds.append(f"UPPER(COALESCE(v.CUSTOMER_NAME, '')) LIKE UPPER('%{val}%')")
+        filters.contains("COALESCE(v.CUSTOMER_NAME, '')", "customer_name", customer_name_filter.strip(), ignore_case=True)
     if code_1c_filter: 
-        conds.append(f"v.CODE_1C LIKE '%{code_1c_filter.strip()}%'")
+        filters.contains("v.CODE_1C", "code_1c", code_1c_filter.strip())
     if tariff_filter: 
-        conds.append(f"v.TARIFF_ID = {tariff_filter}")
+        filters.equals("v.TARIFF_ID", "tariff_id", tariff_filter)
     if zone_filter: 
-        conds.append(f"v.ZONE_ID = {zone_filter}")
+        filters.equals("v.ZONE_ID", "zone_id", zone_filter)
     
-    where = " AND ".join(conds) if conds else "1=1"
-    query = f"SELECT * FROM V_ANALYTICS_INVOICE_PERIOD v WHERE {where} ORDER BY v.PERIOD_YYYYMM DESC, v.CUSTOMER_NAME"
+    query = f"SELECT * FROM V_ANALYTICS_INVOICE_PERIOD v WHERE {filters.where()} ORDER BY v.PERIOD_YYYYMM DESC, v.CUSTOMER_NAME"
+    return query, filters.params
+
+def get_analytics_invoice_period_report(get_connection, period_filter=None, contract_id_filter=None, imei_filter=None, customer_name_filter=None, code_1c_filter=None, tariff_filter=None, zone_filter=None):
+    """Получение отчета по счетам из ANALYTICS"""
+    conn = get_connection()
+    if not conn: return None
+    
+    query, params = build_analytics_invoice_period_query(
+        period_filter, contract_id_filter, imei_filter, customer_name_filter, code_1c_filter,
+        tariff_filter, zone_filter
+    )
     
     try:
-        return pd.read_sql_query(query, conn)
+        return pd.read_sql_query(query, conn, params=params)
     except:
         return None
     finally:
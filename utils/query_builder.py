@@ -0,0 +1,63 @@
+"""
+Условия WHERE отчетов с переменными привязки
+
+Значения фильтров (период, тариф, CONTRACT_ID, IMEI, клиент, код 1С) передаются
+через :bind, а не подставляются в текст SQL. Текст запроса зависит только от
+набора заданных фильтров, поэтому Oracle разбирает его один раз (разделяемый
+курсор), а кэш выражений клиента (stmtcachesize пула) переиспользует курсор.
+"""
+
+
+def _in_list_size(count):
+    """Размер списка IN, округленный вверх до степени двойки (1, 2, 4, 8, ...)"""
+    size = 1
+    while size < count:
+        size *= 2
+    return size
+
+
+class BindFilters:
+    """Набор условий WHERE и значений переменных привязки"""
+
+    def __init__(self):
+        self.conditions = []
+        self.params = {}
+
+    def add(self, condition, **params):
+        """Произвольное условие со своими переменными привязки"""
+        self.conditions.append(condition)
+        self.params.update(params)
+        return self
+
+    def equals(self, expr, name, value):
+        """expr = :name"""
+        return self.add(f"{expr} = :{name}", **{name: value})
+
+    def contains(self, expr, name, value, ignore_case=False):
+        """expr LIKE '%' || :name || '%' (как прежний LIKE '%значение%')"""
+        if ignore_case:
+            return self.add(f"UPPER({expr}) LIKE UPPER('%' || :{name} || '%')", **{name: value})
+        return self.add(f"{expr} LIKE '%' || :{name} || '%'", **{name: value})
+
+    def in_list(self, expr, name, values):
+        """expr IN (:name_0, ...); число переменных округляется до степени двойки
+        (последнее значение повторяется), чтобы разные длины списка давали
+        несколько текстов SQL, а не по одному на каждую длину"""
+        values = list(values)
+        padded = values + [values[-1]] * (_in_list_size(len(values)) - len(values))
+        names = [f"{name}_{i}" for i in range(len(padded))]
+        return self.add(
+            f"{expr} IN ({', '.join(':' + n for n in names)})",
+            **dict(zip(names, padded))
+        )
+
+    def where(self, default="1=1"):
+        """Условия через AND (для WHERE {where})"""
+        return " AND ".join(self.conditions) if self.conditions else default
+
+    def and_clauses(self, indent="        "):
+        """Условия с префиксом AND (для WHERE 1=1 {conditions})"""
+        return "".join(f"\n{indent}AND {c}" for c in self.conditions)
+
+    def __bool__(self):
+        return bool(self.conditions)
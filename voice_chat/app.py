@@ -10,7 +10,9 @@
 
 Порт по умолчанию: 5001 (чтобы не конфликтовать со Streamlit).
 """
+import json
 import os
+import re
 import sys
 from pathlib import Path
 
@@ -24,9 +26,11 @@ if config_env.exists():
     from dotenv import load_dotenv
     load_dotenv(config_env)
 
-from flask import Flask, request, jsonify, session, redirect, url_for, render_template
+from flask import Flask, Response, request, jsonify, session, redirect, url_for, render_template, stream_with_context
 from functools import wraps
 
+from voice_chat import assistants
+
 app = Flask(__name__, template_folder=Path(__file__).parent / "templates", static_folder=Path(__file__).parent / "static")
 app.secret_key = os.getenv("VOICE_CHAT_SECRET_KEY", "voice-chat-dev-secret-change-in-production")
 app.config["MAX_CONTENT_LENGTH"] = 25 * 1024 * 1024  # 25 MB для аудио
@@ -104,6 +108,14 @@ def chat():
     return render_template("chat.html", username=session.get("username"), script_name=script_name)
 
 
+@app.route("/api/health")
+def api_health():
+    """Состояние процесса: прогрев ассистентов (модель эмбеддингов, Qdrant, LLM-клиенты) и его время."""
+    info = assistants.health()
+    info["status"] = "ok" if info["warmup"]["state"] == "ready" else info["warmup"]["state"]
+    return jsonify(info), (500 if info["warmup"]["state"] == "error" else 200)
+
+
 # --- API: выполнение SQL и выгрузка в Excel ---
 def _get_oracle_conn():
     """Подключение к Oracle (как в streamlit_assistant)."""
@@ -200,6 +212,9 @@ def api_chat():
     if not user_text:
         return jsonify({"error": "Нет сообщения пользователя"}), 400
 
+    if data.get("stream"):
+        return _chat_stream_response(assistant_type, user_text, messages)
+
     try:
         if assistant_type == "satellite":
             reply = _satellite_reply(user_text, messages)
@@ -212,16 +227,45 @@ def api_chat():
     return jsonify({"reply": reply or "Пустой ответ."})
 
 
-def _satellite_reply(user_message: str, messages: list) -> str:
-    """Спутниковый библиотекарь: RAG + Gemini, с историей диалога."""
-    from kb_billing.rag.rag_assistant import RAGAssistant
-    from kb_billing.rag.config_sql4a import SQL4AConfig
-    from kb_billing.rag.satellite_librarian_agent import SatelliteLibrarianAgent, ENGINEER_PROMPT
-
-    qdrant_host = os.getenv("QDRANT_HOST", SQL4AConfig.QDRANT_HOST)
-    qdrant_port = int(os.getenv("QDRANT_PORT", SQL4AConfig.QDRANT_PORT))
-    rag = RAGAssistant(qdrant_host=qdrant_host, qdrant_port=qdrant_port)
-    agent = SatelliteLibrarianAgent(rag_assistant=rag, system_prompt=ENGINEER_PROMPT)
+def _sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def _extract_sql(text: str):
+    """Первый блок ```sql ... ``` ответа ассистента (как extractSql в chat.html)."""
+    m = re.search(r"```sql\s*([\s\S]*?)```", text or "", re.IGNORECASE)
+    return m.group(1).strip() if m else None
+
+
+def _chat_stream_response(assistant_type: str, user_text: str, messages: list) -> Response:
+    """Ответ /api/chat потоком SSE: события delta (часть текста), затем done (весь ответ и SQL) или error."""
+    def events():
+        parts = []
+        try:
+            if assistant_type == "satellite":
+                chunks = _satellite_stream(user_text, messages)
+            else:
+                chunks = _billing_stream(user_text, messages)
+            for chunk in chunks:
+                parts.append(chunk)
+                yield _sse("delta", {"text": chunk})
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            yield _sse("error", {"error": str(e)})
+            return
+        reply = "".join(parts).strip() or "Пустой ответ."
+        yield _sse("done", {"reply": reply, "sql": _extract_sql(reply)})
+
+    # X-Accel-Buffering: nginx (location /voice/) отдает события сразу, без буферизации ответа
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _satellite_history(user_message: str, messages: list) -> list:
     history = []
     for m in messages:
         role = (m.get("role") or "").strip().lower()
@@ -235,28 +279,50 @@ def _satellite_reply(user_message: str, messages: list) -> str:
     # Последнее сообщение уже user_message; не дублируем
     if history and history[-1][0] == "user" and history[-1][1] == user_message:
         history = history[:-1]
+    return history
+
+
+def _satellite_reply(user_message: str, messages: list) -> str:
+    """Спутниковый библиотекарь: RAG + Gemini, с историей диалога."""
+    agent = assistants.get_satellite_agent()
+    history = _satellite_history(user_message, messages)
     return agent.ask(user_message, use_rag=True, history=history if history else None)
 
 
+def _satellite_stream(user_message: str, messages: list):
+    agent = assistants.get_satellite_agent()
+    history = _satellite_history(user_message, messages)
+    return agent.ask_stream(user_message, use_rag=True, history=history if history else None)
+
+
+NO_OPENAI_KEY_REPLY = "Задайте OPENAI_API_KEY в config.env для диалога с биллинг-ассистентом."
+
+
 def _billing_reply(user_message: str, messages: list) -> str:
     """Биллинг-ассистент: диалог с уточнениями или генерация SQL. Контекст из KB + история."""
-    from openai import OpenAI
-    from kb_billing.rag.rag_assistant import RAGAssistant
-    from kb_billing.rag.config_sql4a import SQL4AConfig
-
-    api_key = os.getenv("OPENAI_API_KEY")
-    api_base = os.getenv("OPENAI_BASE_URL") or os.getenv("OPENAI_API_BASE")
-    if not api_key:
-        return "Задайте OPENAI_API_KEY в config.env для диалога с биллинг-ассистентом."
-    client_kw = {"api_key": api_key}
-    if api_base:
-        client_kw["base_url"] = api_base
-    client = OpenAI(**client_kw)
+    client = assistants.get_openai_client()
+    if client is None:
+        return NO_OPENAI_KEY_REPLY
+    resp = client.chat.completions.create(**_billing_completion_kwargs(user_message, messages))
+    text = (resp.choices[0].message.content or "").strip()
+    return text or "Пустой ответ."
+
+
+def _billing_stream(user_message: str, messages: list):
+    client = assistants.get_openai_client()
+    if client is None:
+        yield NO_OPENAI_KEY_REPLY
+        return
+    from kb_billing.rag.openai_client import iter_chat_completion_text
+
+    yield from iter_chat_completion_text(client, **_billing_completion_kwargs(user_message, messages))
+
+
+def _billing_completion_kwargs(user_message: str, messages: list) -> dict:
+    """Параметры chat.completions биллинг-ассистента: промпт с контекстом из KB и историей диалога."""
     model = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
 
-    qdrant_host = os.getenv("QDRANT_HOST", SQL4AConfig.QDRANT_HOST)
-    qdrant_port = int(os.getenv("QDRANT_PORT", SQL4AConfig.QDRANT_PORT))
-    rag = RAGAssistant(qdrant_host=qdrant_host, qdrant_port=qdrant_port)
+    rag = assistants.get_rag_assistant()
     context = rag.get_context_for_sql_generation(user_message, max_examples=5)
     formatted = rag.format_context_for_llm(context) if context else ""
 
@@ -276,7 +342,7 @@ def _billing_reply(user_message: str, messages: list) -> str:
         user_block += ("Пользователь" if r == "user" else "Ассистент") + ": " + c[:2000] + "\n"
     user_block += "\nОтветь на последнее сообщение пользователя: уточняющие вопросы или подтверждение и SQL."
 
-    resp = client.chat.completions.create(
+    return dict(
         model=model,
         messages=[
             {"role": "system", "content": system},
@@ -285,11 +351,13 @@ def _billing_reply(user_message: str, messages: list) -> str:
         temperature=0.2,
         max_tokens=2000,
     )
-    text = (resp.choices[0].message.content or "").strip()
-    return text or "Пустой ответ."
 
 
 if __name__ == "__main__":
     port = int(os.getenv("VOICE_CHAT_PORT", "5001"))
     debug = os.getenv("FLASK_DEBUG", "0") == "1"
+    # Прогрев в фоне: сервер отвечает сразу, первый /api/chat дождется готовой модели.
+    # При debug - только в дочернем процессе перезагрузчика, чтобы модель не грузилась дважды
+    if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        assistants.start_warm_up()
     app.run(host="0.0.0.0", port=port, debug=debug)
@@ -0,0 +1,108 @@
+"""
+Общие на процесс ассистенты voice_chat: RAGAssistant (модель эмбеддингов + клиент Qdrant),
+спутниковый агент (httpx-клиент Gemini) и OpenAI-клиент биллинга.
+
+Создаются один раз (лениво или прогревом при старте) и переиспользуются всеми запросами
+/api/chat: время ответа определяется LLM, а не загрузкой SentenceTransformer.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.RLock()
+_rag = None
+_satellite_agent = None
+_openai_client = None
+# Время создания компонентов (сек) и ход прогрева - для /api/health
+_init_seconds: Dict[str, float] = {}
+_warmup: Dict[str, Any] = {"state": "not_started", "seconds": None, "error": None}
+
+
+def _timed(name: str, factory):
+    started = time.perf_counter()
+    value = factory()
+    _init_seconds[name] = round(time.perf_counter() - started, 2)
+    logger.info("voice_chat: %s создан за %.2f с", name, _init_seconds[name])
+    return value
+
+
+def get_rag_assistant():
+    """RAGAssistant процесса (модель эмбеддингов загружается один раз)."""
+    global _rag
+    if _rag is None:
+        with _lock:
+            if _rag is None:
+                from kb_billing.rag.rag_assistant import RAGAssistant
+                from kb_billing.rag.config_sql4a import SQL4AConfig
+
+                qdrant_host = os.getenv("QDRANT_HOST", SQL4AConfig.QDRANT_HOST)
+                qdrant_port = int(os.getenv("QDRANT_PORT", SQL4AConfig.QDRANT_PORT))
+                _rag = _timed("rag_assistant", lambda: RAGAssistant(qdrant_host=qdrant_host, qdrant_port=qdrant_port))
+    return _rag
+
+
+def get_satellite_agent():
+    """Спутниковый библиотекарь (персона инженера) поверх общего RAGAssistant."""
+    global _satellite_agent
+    if _satellite_agent is None:
+        with _lock:
+            if _satellite_agent is None:
+                from kb_billing.rag.satellite_librarian_agent import SatelliteLibrarianAgent, ENGINEER_PROMPT
+
+                rag = get_rag_assistant()
+                _satellite_agent = _timed(
+                    "satellite_agent",
+                    lambda: SatelliteLibrarianAgent(rag_assistant=rag, system_prompt=ENGINEER_PROMPT),
+                )
+    return _satellite_agent
+
+
+def get_openai_client() -> Optional[Any]:
+    """OpenAI-клиент биллинг-ассистента (None, если OPENAI_API_KEY не задан)."""
+    global _openai_client
+    if _openai_client is None:
+        if not os.getenv("OPENAI_API_KEY"):
+            return None
+        with _lock:
+            if _openai_client is None:
+                from kb_billing.rag.openai_client import build_openai_client
+
+                _openai_client = _timed("openai_client", build_openai_client)
+    return _openai_client
+
+
+def warm_up() -> None:
+    """Создать ассистентов заранее (вызывается в фоне при старте приложения)."""
+    _warmup.update(state="running", error=None)
+    started = time.perf_counter()
+    try:
+        get_rag_assistant()
+        get_satellite_agent()
+        get_openai_client()
+        _warmup["state"] = "ready"
+    except Exception as e:
+        logger.exception("voice_chat: ошибка прогрева ассистентов: %s", e)
+        _warmup.update(state="error", error=str(e))
+    _warmup["seconds"] = round(time.perf_counter() - started, 2)
+    logger.info("voice_chat: прогрев %s за %.2f с", _warmup["state"], _warmup["seconds"])
+
+
+def start_warm_up() -> threading.Thread:
+    thread = threading.Thread(target=warm_up, name="voice-chat-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def health() -> Dict[str, Any]:
+    """Состояние ассистентов для /api/health."""
+    return {
+        "warmup": dict(_warmup),
+        "init_seconds": dict(_init_seconds),
+        "rag_assistant": _rag is not None,
+        "satellite_agent": _satellite_agent is not None,
+        "openai_client": _openai_client is not None,
+    }